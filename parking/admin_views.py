@@ -2,6 +2,9 @@ from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User, Group
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseForbidden
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from django.contrib import messages
 from django.db import transaction
 from django.db import models
@@ -9,6 +12,8 @@ from django.utils import timezone
 from datetime import timedelta
 from .models import ParkingLot, VehicleCategory
 from .forms import ParkingLotCreateForm, ParkingLotEditForm
+from . import business_metrics
+from .metrics import registry as metrics_registry
 
 
 def is_superuser(user):
@@ -261,22 +266,48 @@ def renew_subscription(request, pk):
 
 @superuser_required
 def delete_parking_lot(request, pk):
-    """Eliminar un parqueadero"""
+    """Eliminar un parqueadero (se desactiva de inmediato y se borra en segundo plano)"""
+    from .services import TenantDeletionService
     parking_lot = get_object_or_404(ParkingLot, pk=pk)
     
     if request.method == 'POST':
-        empresa_name = parking_lot.empresa
-        user = parking_lot.user
-        parking_lot.delete()
-        user.delete()
-        messages.success(request, f'Parqueadero "{empresa_name}" eliminado exitosamente.')
-        return redirect('superadmin_dashboard')
+        deletion = TenantDeletionService.request_deletion(parking_lot, requested_by=request.user)
+        messages.success(
+            request,
+            f'Parqueadero "{parking_lot.empresa}" desactivado. Sus datos se están eliminando en segundo plano.'
+        )
+        return redirect('parking_lot_deletion_progress', pk=deletion.pk)
     
     return render(request, 'parking/superadmin/delete_parking_lot.html', {
         'parking_lot': parking_lot
     })
 
 
+@superuser_required
+def parking_lot_deletion_progress(request, pk):
+    """Avance de la eliminación de un parqueadero (HTML o JSON)"""
+    from django.http import JsonResponse
+    from .models import ParkingLotDeletion
+    deletion = get_object_or_404(ParkingLotDeletion, pk=pk)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'id': deletion.id,
+            'empresa': deletion.empresa,
+            'status': deletion.status,
+            'status_display': deletion.get_status_display(),
+            'progress': deletion.progress,
+            'deleted_rows': deletion.deleted_rows,
+            'total_rows': deletion.total_rows,
+            'current_section': deletion.current_section,
+            'error': deletion.error,
+        })
+    
+    return render(request, 'parking/superadmin/deletion_progress.html', {
+        'deletion': deletion
+    })
+
+
 
 @superuser_required
 def payment_management(request):
@@ -466,17 +497,13 @@ def backup_management(request):
 def export_parking_lot(request, pk):
     """Exportar datos de un parqueadero específico"""
     from .backup_service import BackupService
-    import json
-    from django.http import HttpResponse
+    from django.http import StreamingHttpResponse
     
     result = BackupService.export_parking_lot_data(pk)
     
     if result['success']:
-        # Crear respuesta JSON para descarga
-        response = HttpResponse(
-            json.dumps(result['data'], indent=2, ensure_ascii=False),
-            content_type='application/json'
-        )
+        # Enviar el backup comprimido a medida que se genera
+        response = StreamingHttpResponse(result['stream'], content_type='application/gzip')
         response['Content-Disposition'] = f'attachment; filename="{result["filename"]}"'
         return response
     else:
@@ -488,23 +515,21 @@ def export_parking_lot(request, pk):
 def export_full_database(request):
     """Exportar toda la base de datos"""
     from .backup_service import BackupService
-    from django.http import HttpResponse, FileResponse
-    import shutil
+    from django.http import FileResponse
     import os
     
     result = BackupService.export_full_database()
     
     if result['success']:
         if result['type'] == 'sqlite':
-            # Copiar archivo SQLite
-            source_path = result['source_path']
-            
+            # Descargar el snapshot comprimido (tomado con la API de backup de SQLite)
             try:
                 response = FileResponse(
-                    open(source_path, 'rb'),
-                    content_type='application/x-sqlite3'
+                    open(result['path'], 'rb'),
+                    content_type='application/gzip'
                 )
                 response['Content-Disposition'] = f'attachment; filename="{result["filename"]}"'
+                response['X-Checksum-SHA256'] = result['sha256']
                 return response
             except Exception as e:
                 messages.error(request, f'Error al exportar base de datos: {str(e)}')
@@ -537,7 +562,6 @@ def export_full_database(request):
 def restore_parking_lot(request):
     """Restaurar datos de un parqueadero desde un backup"""
     from .backup_service import BackupService
-    import json
     
     if request.method == 'POST':
         try:
@@ -548,23 +572,19 @@ def restore_parking_lot(request):
                 messages.error(request, 'No se seleccionó ningún archivo')
                 return redirect('backup_management')
             
-            # Leer el archivo JSON
-            backup_data = json.loads(backup_file.read().decode('utf-8'))
-            
-            # Restaurar datos
-            result = BackupService.restore_parking_lot_data(backup_data, overwrite=overwrite)
+            # Restaurar datos (el archivo se lee de forma incremental)
+            result = BackupService.restore_parking_lot_data(backup_file, overwrite=overwrite)
             
             if result['success']:
                 messages.success(
                     request, 
                     f'Parqueadero "{result["parking_lot_name"]}" restaurado exitosamente. '
-                    f'Registros restaurados: {result["restored_counts"]}'
+                    f'Registros restaurados: {result["restored_counts"]} '
+                    f'({result["rows_per_second"]:,.0f} registros/s)'
                 )
             else:
                 messages.error(request, f'Error al restaurar: {result["error"]}')
                 
-        except json.JSONDecodeError:
-            messages.error(request, 'El archivo no es un JSON válido')
         except Exception as e:
             messages.error(request, f'Error al restaurar: {str(e)}')
     
@@ -603,11 +623,7 @@ def restore_full_database(request):
                 else:
                     messages.success(
                         request, 
-                        f'{result["message"]}. Backup del archivo anterior guardado en: {result["backup_of_current"]}'
-                    )
-                    messages.warning(
-                        request,
-                        'IMPORTANTE: Reinicia el servidor Django para que los cambios surtan efecto.'
+                        f'{result["message"]}. Backup de la base anterior guardado en: {result["backup_of_current"]}'
                     )
             else:
                 messages.error(request, f'Error al restaurar: {result["error"]}')
@@ -623,3 +639,78 @@ def restore_full_database(request):
                 os.remove(temp_path)
     
     return redirect('backup_management')
+
+
+@superuser_required
+def profile_list(request):
+    """Perfiles de requests guardados (ver parking/profiling.py)"""
+    from . import profiling
+
+    token = None
+    token_user = request.POST.get('username', '').strip()
+    if request.method == 'POST':
+        target = User.objects.filter(username=token_user, is_active=True).first()
+        if target is None:
+            messages.error(request, f'No existe un usuario activo "{token_user}".')
+        else:
+            token = profiling.make_token(request.user, target)
+    context = {
+        'profiles': profiling.list_profiles(),
+        'token': token,
+        'token_user': token_user,
+        'token_minutes': getattr(settings, 'PROFILE_TOKEN_MAX_AGE', profiling.DEFAULT_PROFILE_TOKEN_MAX_AGE) // 60,
+        'header': 'X-Parking-Profile',
+        'param': profiling.PROFILE_PARAM,
+    }
+    return render(request, 'parking/superadmin/profiles.html', context)
+
+
+@superuser_required
+def profile_detail(request, profile_id):
+    """Funciones más costosas y traza SQL de un perfil"""
+    from . import profiling
+    from django.http import Http404
+
+    sort_options = ('cumulative', 'tottime', 'ncalls')
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in sort_options:
+        sort = 'cumulative'
+    try:
+        profile = profiling.load_profile(profile_id)
+        stats = profiling.format_stats(profile_id, sort=sort)
+    except (OSError, ValueError):
+        raise Http404('Perfil no encontrado')
+    context = {
+        'profile': profile,
+        'stats': stats,
+        'sort': sort,
+        'sort_options': sort_options,
+    }
+    return render(request, 'parking/superadmin/profile_detail.html', context)
+
+
+@superuser_required
+def profile_download(request, profile_id):
+    """Descarga el archivo .prof (pstats, snakeviz)"""
+    from . import profiling
+    from django.http import FileResponse, Http404
+
+    try:
+        path = profiling.profile_path(profile_id, '.prof')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof')
+    except OSError:
+        raise Http404('Perfil no encontrado')
+
+
+def metrics(request):
+    """
+    Métricas en formato de texto de Prometheus (ver parking/metrics.py y
+    parking/business_metrics.py)
+    Solo superusuarios; un scraper puede enviar Authorization: Bearer METRICS_TOKEN
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorized = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not (request.user.is_authenticated and request.user.is_superuser):
+        return HttpResponseForbidden()
+    body = metrics_registry.render() + business_metrics.render()
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,755 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots columnares del historial de tickets para analítica ad-hoc
+
+Cada parqueadero tiene un directorio con un archivo binario de ancho fijo por
+columna (leído con np.memmap) y un meta.json con la marca de agua. El snapshot
+solo contiene tickets cerrados de días completos, así que crece por anexión:
+cada construcción agrega los tickets con salida entre la marca de agua y el
+inicio del día actual. Se construye desde la tabla activa y desde los tickets
+archivados (ArchivedTicket), así que sobrevive al archivo de tickets antiguos.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+
+from .models import ArchivedTicket, ParkingTicket
+from .reference_cache import get_reference_data
+
+
+SNAPSHOT_VERSION = 2
+
+# Columnas del snapshot y su tipo NumPy (ancho fijo)
+SNAPSHOT_COLUMNS = {
+    'ticket_id': np.dtype(np.int64),
+    'entry_ts': np.dtype(np.int64),  # microsegundos epoch (UTC)
+    'exit_ts': np.dtype(np.int64),
+    'exit_day': np.dtype(np.int32),  # días desde 1970-01-01 en hora local
+    'entry_hour': np.dtype(np.int8),  # hora local de entrada
+    'amount_cents': np.dtype(np.int64),
+    'category_id': np.dtype(np.int64),
+    'payment_method_id': np.dtype(np.int64),  # -1 = sin especificar
+    'flat_rate': np.dtype(np.int8),  # 1 si se cobró la tarifa mensual
+    'plate_hash': np.dtype(np.uint64),
+    'plate': np.dtype('U20'),
+}
+
+# Columnas que usan las estadísticas de ReportView
+REPORT_COLUMNS = (
+    'entry_ts', 'exit_ts', 'exit_day', 'entry_hour', 'amount_cents',
+    'category_id', 'payment_method_id', 'plate_hash', 'plate',
+)
+
+EPOCH_DAY = date(1970, 1, 1)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+HOUR_US = 3600 * 1000000
+WEEKDAY_LABELS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+
+def get_snapshot_dir(parking_lot_id):
+    """Directorio del snapshot de un parqueadero"""
+    base_dir = getattr(settings, 'ANALYTICS_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'snapshots'))
+    return os.path.join(str(base_dir), f'parking_lot_{parking_lot_id}')
+
+
+def drop_snapshot(parking_lot_id):
+    """
+    Elimina el snapshot de un parqueadero (restaurado o eliminado)
+    Los reportes vuelven a la base de datos hasta la próxima construcción.
+    """
+    shutil.rmtree(get_snapshot_dir(parking_lot_id), ignore_errors=True)
+
+
+def plate_hash(placa):
+    """Hash estable de 64 bits de una placa (para agrupar visitantes)"""
+    digest = hashlib.blake2b((placa or '').upper().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def to_day_number(value):
+    """Convierte una fecha/datetime (local) en días desde 1970-01-01"""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    return (value - EPOCH_DAY).days
+
+
+def _local_time(value):
+    if not isinstance(value, datetime):
+        return None
+    return (timezone.localtime(value) if timezone.is_aware(value) else value).time()
+
+
+def is_local_day_start(value):
+    """Una fecha o un datetime a la medianoche local"""
+    moment = _local_time(value)
+    return moment is None or moment == time.min
+
+
+def is_local_day_end(value):
+    """Una fecha o un datetime en el último segundo del día local"""
+    moment = _local_time(value)
+    return moment is None or moment >= time(23, 59, 59)
+
+
+def from_day_number(day_number):
+    return EPOCH_DAY + timedelta(days=int(day_number))
+
+
+def to_microseconds(delta):
+    """timedelta a microsegundos enteros (sin pasar por float, igual que calculate_fee)"""
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def to_epoch_us(value):
+    """Datetime aware a microsegundos desde epoch (UTC)"""
+    return to_microseconds(value - EPOCH)
+
+
+def _cents_to_decimal(cents):
+    return (Decimal(int(cents)) / 100).quantize(Decimal('0.01'))
+
+
+# Campos de cada ticket con los que se construyen las columnas del snapshot
+TICKET_ROW_FIELDS = (
+    'id', 'entry_time', 'exit_time', 'amount_paid', 'category_id', 'payment_method_id',
+    'category__is_monthly', 'monthly_expiry', 'placa',
+)
+
+
+def closed_ticket_rows(parking_lot_id, fields=TICKET_ROW_FIELDS, **filters):
+    """
+    Tickets cerrados de la tabla activa y del archivo (UNION ALL)
+
+    Retorna un queryset de values_list con los mismos filtros aplicados a
+    ParkingTicket y a ArchivedTicket, para leer el historial completo sin
+    importar si ya fue archivado.
+    """
+    querysets = [
+        model.objects.filter(parking_lot_id=parking_lot_id, exit_time__isnull=False, **filters).values_list(*fields)
+        for model in (ParkingTicket, ArchivedTicket)
+    ]
+    return querysets[0].union(querysets[1], all=True)
+
+
+def ticket_rows_to_columns(rows):
+    """Convierte filas con TICKET_ROW_FIELDS en columnas NumPy del snapshot"""
+    count = len(rows)
+    columns = {name: np.empty(count, dtype=dtype) for name, dtype in SNAPSHOT_COLUMNS.items()}
+
+    for i, (ticket_id, entry_time, exit_time, amount_paid, category_id, payment_method_id,
+            is_monthly, monthly_expiry, placa) in enumerate(rows):
+        local_entry = timezone.localtime(entry_time)
+        columns['ticket_id'][i] = ticket_id
+        columns['entry_ts'][i] = to_epoch_us(entry_time)
+        columns['exit_ts'][i] = to_epoch_us(exit_time)
+        columns['exit_day'][i] = to_day_number(exit_time)
+        columns['entry_hour'][i] = local_entry.hour
+        columns['amount_cents'][i] = int((amount_paid * 100).to_integral_value())
+        columns['category_id'][i] = category_id
+        columns['payment_method_id'][i] = payment_method_id if payment_method_id is not None else -1
+        # Misma condición que ParkingTicket.calculate_fee para la tarifa mensual
+        columns['flat_rate'][i] = int(bool(is_monthly and monthly_expiry and exit_time <= monthly_expiry))
+        columns['plate_hash'][i] = plate_hash(placa)
+        columns['plate'][i] = (placa or '')[:20]
+
+    return columns
+
+
+class TicketSnapshotBuilder:
+    """
+    Construye o extiende el snapshot de un parqueadero desde la marca de agua
+    """
+
+    CHUNK_SIZE = 50000
+
+    def __init__(self, parking_lot_id):
+        self.parking_lot_id = parking_lot_id
+        self.path = get_snapshot_dir(parking_lot_id)
+        self.meta_path = os.path.join(self.path, 'meta.json')
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        if meta.get('version') != SNAPSHOT_VERSION:
+            return None
+        return meta
+
+    def _write_meta(self, meta):
+        tmp_path = f'{self.meta_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_path, self.meta_path)
+
+    def _reset(self):
+        os.makedirs(self.path, exist_ok=True)
+        for column in SNAPSHOT_COLUMNS:
+            open(os.path.join(self.path, f'{column}.bin'), 'wb').close()
+
+    def _truncate_to(self, rows):
+        """Descarta filas escritas por una construcción interrumpida"""
+        for column, dtype in SNAPSHOT_COLUMNS.items():
+            with open(os.path.join(self.path, f'{column}.bin'), 'r+b') as column_file:
+                column_file.truncate(rows * dtype.itemsize)
+
+    def _append(self, columns):
+        for column, values in columns.items():
+            with open(os.path.join(self.path, f'{column}.bin'), 'ab') as column_file:
+                values.tofile(column_file)
+
+    def build(self, rebuild=False):
+        """
+        Agrega al snapshot los tickets cerrados desde la marca de agua hasta ayer
+        Retorna: dict con filas agregadas, total de filas y fecha cubierta
+        """
+        today = timezone.localdate()
+        meta = None if rebuild else self._read_meta()
+
+        if meta is None:
+            self._reset()
+            meta = {
+                'version': SNAPSHOT_VERSION,
+                'parking_lot_id': self.parking_lot_id,
+                'rows': 0,
+                'covered_until': None,
+            }
+        else:
+            self._truncate_to(meta['rows'])
+
+        filters = {
+            'amount_paid__isnull': False,
+            'exit_time__lt': timezone.make_aware(datetime.combine(today, time.min)),
+        }
+        if meta['covered_until']:
+            covered_until = date.fromisoformat(meta['covered_until'])
+            filters['exit_time__gte'] = timezone.make_aware(datetime.combine(covered_until, time.min))
+
+        # Incluye los tickets archivados para que una reconstrucción no los pierda
+        rows_iter = closed_ticket_rows(self.parking_lot_id, **filters).order_by(
+            'exit_time', 'id'
+        ).iterator(chunk_size=self.CHUNK_SIZE)
+
+        added = 0
+        chunk = []
+        for row in rows_iter:
+            chunk.append(row)
+            if len(chunk) >= self.CHUNK_SIZE:
+                self._append(ticket_rows_to_columns(chunk))
+                added += len(chunk)
+                chunk = []
+        if chunk:
+            self._append(ticket_rows_to_columns(chunk))
+            added += len(chunk)
+
+        meta['rows'] += added
+        meta['covered_until'] = today.isoformat()
+        meta['built_at'] = timezone.now().isoformat()
+        self._write_meta(meta)
+
+        return {
+            'rows_added': added,
+            'rows': meta['rows'],
+            'covered_until': today,
+        }
+
+
+class TicketSnapshot:
+    """
+    Lectura de un snapshot mediante arreglos memory-mapped
+
+    Las filas están ordenadas por hora de salida, así que un rango de fechas
+    se resuelve con una búsqueda binaria sobre exit_day.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.rows = meta['rows']
+        self.covered_until = date.fromisoformat(meta['covered_until'])
+        self._columns = {}
+
+    @classmethod
+    def open(cls, parking_lot_id):
+        """Retorna el snapshot del parqueadero o None si no existe"""
+        path = get_snapshot_dir(parking_lot_id)
+        meta_path = os.path.join(path, 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != SNAPSHOT_VERSION or not meta.get('covered_until'):
+            return None
+        return cls(path, meta)
+
+    def column(self, name):
+        if name not in self._columns:
+            dtype = SNAPSHOT_COLUMNS[name]
+            if self.rows == 0:
+                self._columns[name] = np.empty(0, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(
+                    os.path.join(self.path, f'{name}.bin'), dtype=dtype, mode='r', shape=(self.rows,)
+                )
+        return self._columns[name]
+
+    def covers(self, start_date, end_date):
+        """
+        Indica si el rango (fechas inclusivas) está completo en el snapshot
+        El snapshot agrupa por días locales completos: un rango con horas que no
+        son el inicio y el final del día local no se puede responder desde aquí.
+        """
+        if not (is_local_day_start(start_date) and is_local_day_end(end_date)):
+            return False
+        return to_day_number(end_date) < to_day_number(self.covered_until) and start_date <= end_date
+
+    def _slice(self, start_date, end_date):
+        exit_day = self.column('exit_day')
+        start = np.searchsorted(exit_day, to_day_number(start_date), side='left')
+        end = np.searchsorted(exit_day, to_day_number(end_date), side='right')
+        return slice(int(start), int(end))
+
+    def select(self, start_date, end_date, *columns):
+        """Retorna las columnas pedidas restringidas al rango de fechas de salida"""
+        rows = self._slice(start_date, end_date)
+        return [np.asarray(self.column(name)[rows]) for name in columns]
+
+    def group_by(self, key, start_date, end_date, value=None, agg='sum'):
+        """
+        Agregación agrupada genérica
+        key: columna de agrupación (o 'weekday' / 'exit_day')
+        value: columna a agregar (None para contar)
+        agg: 'sum', 'mean' o 'count'
+        Retorna: dict {clave: valor}
+        """
+        if key == 'weekday':
+            (exit_day,) = self.select(start_date, end_date, 'exit_day')
+            # 1970-01-01 fue jueves (weekday 3)
+            keys = (exit_day.astype(np.int64) + 3) % 7
+        else:
+            (keys,) = self.select(start_date, end_date, key)
+
+        if len(keys) == 0:
+            return {}
+
+        labels, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(labels))
+
+        if value is None or agg == 'count':
+            result = counts
+        else:
+            (values,) = self.select(start_date, end_date, value)
+            sums = np.bincount(inverse, weights=values.astype(np.float64), minlength=len(labels))
+            result = sums / counts if agg == 'mean' else sums
+
+        return {label.item(): result[i].item() for i, label in enumerate(labels)}
+
+    def avg_stay_by_hour(self, start_date, end_date):
+        """Estadía promedio (horas) según la hora de entrada"""
+        entry_ts, exit_ts, entry_hour = self.select(start_date, end_date, 'entry_ts', 'exit_ts', 'entry_hour')
+        if len(entry_ts) == 0:
+            return {}
+        stays = (exit_ts - entry_ts) / HOUR_US
+        counts = np.bincount(entry_hour, minlength=24)
+        sums = np.bincount(entry_hour, weights=stays, minlength=24)
+        return {hour: float(sums[hour] / counts[hour]) for hour in range(24) if counts[hour]}
+
+    def revenue_by_weekday(self, start_date, end_date):
+        """Ingresos por día de la semana"""
+        revenue = self.group_by('weekday', start_date, end_date, value='amount_cents')
+        return {WEEKDAY_LABELS[day]: _cents_to_decimal(revenue.get(day, 0)) for day in range(7)}
+
+    def repeat_visitor_rate(self, start_date, end_date):
+        """Proporción de placas distintas con más de una visita en el rango"""
+        (hashes,) = self.select(start_date, end_date, 'plate_hash')
+        if len(hashes) == 0:
+            return 0.0
+        _, visits = np.unique(hashes, return_counts=True)
+        return float(np.count_nonzero(visits > 1)) / len(visits)
+
+    def report_stats(self, parking_lot, start_date, end_date):
+        """
+        Estadísticas de tickets con la misma estructura que las consultas en vivo de ReportView
+        """
+        columns = self.select(start_date, end_date, *REPORT_COLUMNS)
+        return build_report_stats(parking_lot, dict(zip(REPORT_COLUMNS, columns)))
+
+
+def _to_decimal(value):
+    """Monto de una consulta SQL (Decimal en PostgreSQL, float o texto en SQLite) a dos decimales"""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def _hours(duration):
+    """Duración agregada por la base de datos (timedelta) en horas"""
+    return duration.total_seconds() / 3600 if duration is not None else 0.0
+
+
+def _merge_grouped(querysets, key, **aggregates):
+    """
+    Agrupa cada queryset por `key` en la base de datos y suma los resultados
+    Retorna: dict {clave: {agregado: valor}} (una fila por grupo, no por ticket)
+    """
+    merged = {}
+    for queryset in querysets:
+        for row in queryset.values(key).annotate(**aggregates).order_by():
+            totals = merged.setdefault(row[key], dict.fromkeys(aggregates))
+            for name in aggregates:
+                if row[name] is not None:
+                    totals[name] = row[name] if totals[name] is None else totals[name] + row[name]
+    return merged
+
+
+def _frequent_plates(querysets, limit=10):
+    """
+    Placas con más visitas sobre el UNION ALL de la tabla activa y el archivo
+    Se agrupa en la base de datos; solo se leen las `limit` filas del resultado.
+    Cada SELECT se compila por separado porque el union de Django renombra las
+    columnas (col1, col2...) y la consulta externa las necesita por nombre.
+    """
+    selects, params = [], []
+    for queryset in querysets:
+        sql, select_params = queryset.values_list('placa', 'amount_paid').query.sql_with_params()
+        selects.append(sql)
+        params.extend(select_params)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT placa, COUNT(*), SUM(amount_paid) FROM ({" UNION ALL ".join(selects)}) closed '
+            f'GROUP BY placa ORDER BY COUNT(*) DESC, placa LIMIT %s',
+            [*params, limit],
+        )
+        return [
+            {'placa': placa, 'visits': visits, 'total_spent': _to_decimal(spent)}
+            for placa, visits, spent in cursor.fetchall()
+        ]
+
+
+def report_stats_from_database(parking_lot, start_date, end_date):
+    """
+    Estadísticas de ReportView leídas de la tabla activa y del archivo
+
+    Se usa cuando el rango incluye tickets archivados y el snapshot no lo cubre.
+    Cada estadística se agrega en la base de datos (GROUP BY sobre cada tabla,
+    y sobre el UNION ALL para las placas frecuentes) y solo se combinan en
+    Python las filas agrupadas, así que la memoria no depende de la cantidad
+    de tickets del rango.
+    """
+    querysets = [
+        model.objects.filter(
+            parking_lot_id=parking_lot.id, amount_paid__isnull=False, exit_time__range=(start_date, end_date),
+        )
+        for model in (ParkingTicket, ArchivedTicket)
+    ]
+    stay = ExpressionWrapper(F('exit_time') - F('entry_time'), output_field=DurationField())
+
+    references = get_reference_data(parking_lot.id)
+    category_names = {category.id: category.name for category in references.categories}
+    payment_names = {method.id: method.nombre for method in references.payment_methods}
+
+    totals = [
+        queryset.aggregate(count=Count('id'), revenue=Sum('amount_paid'), stay=Sum(stay)) for queryset in querysets
+    ]
+    total = sum(row['count'] for row in totals)
+    revenue = sum((_to_decimal(row['revenue']) for row in totals), Decimal('0'))
+    summary = {
+        'total_vehicles': total,
+        'total_revenue': revenue if total else None,
+        'avg_duration': sum(_hours(row['stay']) for row in totals) / total if total else None,
+        'avg_revenue': _to_decimal(revenue / total) if total else None,
+    }
+
+    categories = _merge_grouped(querysets, 'category_id', count=Count('id'), revenue=Sum('amount_paid'), stay=Sum(stay))
+    category_stats = [
+        {
+            'category__name': category_names.get(category_id, ''),
+            'count': row['count'],
+            'revenue': _to_decimal(row['revenue']),
+            'avg_duration': _hours(row['stay']) / row['count'],
+        }
+        for category_id, row in sorted(categories.items(), key=lambda item: (-item[1]['count'], item[0]))
+    ]
+
+    days = _merge_grouped(
+        [queryset.annotate(day=TruncDate('exit_time')) for queryset in querysets], 'day',
+        count=Count('id'), revenue=Sum('amount_paid'),
+    )
+    daily_stats = [
+        {'date': day, 'count': row['count'], 'revenue': _to_decimal(row['revenue'])}
+        for day, row in sorted(days.items())
+    ]
+
+    methods = _merge_grouped(querysets, 'payment_method_id', count=Count('id'), total=Sum('amount_paid'))
+    payment_summary = [
+        {
+            'payment_method__nombre': payment_names.get(method_id) if method_id is not None else None,
+            'count': row['count'],
+            'total': _to_decimal(row['total']),
+        }
+        for method_id, row in sorted(methods.items(), key=lambda item: -1 if item[0] is None else item[0])
+    ]
+
+    hours = _merge_grouped(
+        [queryset.annotate(hour=ExtractHour('entry_time')) for queryset in querysets], 'hour', count=Count('id'),
+    )
+    ocupacion = [hours.get(hour, {}).get('count') or 0 for hour in range(24)]
+
+    return {
+        'summary': summary,
+        'category_stats': category_stats,
+        'daily_stats': daily_stats,
+        'frequent_vehicles': _frequent_plates(querysets),
+        'payment_summary': payment_summary,
+        'chart_data': _chart_data(ocupacion, category_stats, payment_summary),
+    }
+
+
+def _chart_data(ocupacion, category_stats, payment_summary):
+    """Datos de los gráficos de ReportView (JSON) a partir de las estadísticas agregadas"""
+    categorias_count = {stat['category__name']: stat['count'] for stat in category_stats}
+    pagos_count = {
+        (payment['payment_method__nombre'] or 'Sin especificar'): payment['count'] for payment in payment_summary
+    }
+    return json.dumps({
+        'ocupacion_labels': [f"{h:02d}:00" for h in range(24)],
+        'ocupacion_data': [int(count) for count in ocupacion],
+        'categorias_labels': list(categorias_count.keys()),
+        'categorias_data': list(categorias_count.values()),
+        'pagos_labels': list(pagos_count.keys()),
+        'pagos_data': list(pagos_count.values()),
+    })
+
+
+def build_report_stats(parking_lot, columns):
+    """
+    Calcula las estadísticas de ReportView a partir de columnas NumPy
+    Retorna: dict con summary, category_stats, daily_stats, frequent_vehicles,
+    payment_summary y chart_data
+    """
+    (entry_ts, exit_ts, exit_day, entry_hour, amount_cents,
+     category_id, payment_method_id, plate_hashes, plates) = (columns[name] for name in REPORT_COLUMNS)
+    total = len(amount_cents)
+    stays = (exit_ts - entry_ts) / HOUR_US
+
+    references = get_reference_data(parking_lot.id)
+    category_names = {category.id: category.name for category in references.categories}
+    payment_names = {method.id: method.nombre for method in references.payment_methods}
+
+    summary = {
+        'total_vehicles': total,
+        'total_revenue': _cents_to_decimal(amount_cents.sum()) if total else None,
+        'avg_duration': float(stays.mean()) if total else None,
+        'avg_revenue': _cents_to_decimal(amount_cents.mean()) if total else None,
+    }
+
+    category_stats = []
+    if total:
+        labels, inverse = np.unique(category_id, return_inverse=True)
+        counts = np.bincount(inverse)
+        revenue = np.bincount(inverse, weights=amount_cents)
+        durations = np.bincount(inverse, weights=stays)
+        for i in np.argsort(-counts, kind='stable'):
+            category_stats.append({
+                'category__name': category_names.get(labels[i].item(), ''),
+                'count': int(counts[i]),
+                'revenue': _cents_to_decimal(revenue[i]),
+                'avg_duration': float(durations[i] / counts[i]),
+            })
+
+    daily_stats = []
+    if total:
+        labels, inverse = np.unique(exit_day, return_inverse=True)
+        counts = np.bincount(inverse)
+        revenue = np.bincount(inverse, weights=amount_cents)
+        for i, day in enumerate(labels):
+            daily_stats.append({
+                'date': from_day_number(day),
+                'count': int(counts[i]),
+                'revenue': _cents_to_decimal(revenue[i]),
+            })
+
+    frequent_vehicles = []
+    if total:
+        labels, first_index, inverse = np.unique(plate_hashes, return_index=True, return_inverse=True)
+        visits = np.bincount(inverse)
+        spent = np.bincount(inverse, weights=amount_cents)
+        for i in np.argsort(-visits, kind='stable')[:10]:
+            frequent_vehicles.append({
+                'placa': str(plates[first_index[i]]),
+                'visits': int(visits[i]),
+                'total_spent': _cents_to_decimal(spent[i]),
+            })
+
+    payment_summary = []
+    if total:
+        labels, inverse = np.unique(payment_method_id, return_inverse=True)
+        counts = np.bincount(inverse)
+        revenue = np.bincount(inverse, weights=amount_cents)
+        for i, method_id in enumerate(labels):
+            nombre = payment_names.get(method_id.item()) if method_id >= 0 else None
+            payment_summary.append({
+                'payment_method__nombre': nombre,
+                'count': int(counts[i]),
+                'total': _cents_to_decimal(revenue[i]),
+            })
+
+    ocupacion = np.bincount(entry_hour, minlength=24) if total else np.zeros(24, dtype=np.int64)
+
+    return {
+        'summary': summary,
+        'category_stats': category_stats,
+        'daily_stats': daily_stats,
+        'frequent_vehicles': frequent_vehicles,
+        'payment_summary': payment_summary,
+        'chart_data': _chart_data(ocupacion, category_stats, payment_summary),
+    }
+
+
+class TariffSimulator:
+    """
+    Simulador "qué pasaría si" de tarifas sobre las estadías históricas
+
+    Carga una sola vez las estadías cerradas del parqueadero (desde el snapshot
+    si cubre el rango, o desde la base de datos) y las re-tarifica de forma
+    vectorizada con las mismas reglas de ParkingTicket.calculate_fee: primera
+    hora completa y cada hora adicional iniciada redondeada hacia arriba. Los
+    tickets cobrados con tarifa mensual no dependen de las tarifas por hora y
+    se excluyen de la simulación.
+    """
+
+    def __init__(self, parking_lot, start_date=None, end_date=None):
+        self.parking_lot = parking_lot
+        self.categories = get_reference_data(parking_lot.id).categories
+        self._category_index = {category.id: i for i, category in enumerate(self.categories)}
+
+        snapshot = TicketSnapshot.open(parking_lot.id)
+        range_start = start_date or EPOCH_DAY
+        range_end = end_date or (snapshot.covered_until - timedelta(days=1) if snapshot else timezone.localdate())
+        if snapshot is not None and snapshot.covers(range_start, range_end):
+            self.source = 'snapshot'
+            durations, exit_day, category_id, flat_rate = self._load_snapshot(snapshot, range_start, range_end)
+        else:
+            self.source = 'database'
+            durations, exit_day, category_id, flat_rate = self._load_database(range_start, range_end)
+
+        known = np.isin(category_id, np.fromiter(self._category_index, dtype=np.int64))
+        hourly = (flat_rate == 0) & known
+        self.excluded = int(len(durations) - np.count_nonzero(hourly))
+
+        durations = durations[hourly]
+        lookup = np.full(max(self._category_index, default=0) + 1, -1, dtype=np.int64)
+        for category_pk, index in self._category_index.items():
+            lookup[category_pk] = index
+        self.category = lookup[category_id[hourly]]
+
+        # Horas adicionales cobradas: ceil(horas - 1) cuando la estadía supera una hora
+        over = durations - HOUR_US
+        self.extra_hours = np.where(over > 0, -(-over // HOUR_US), 0)
+
+        months = exit_day[hourly].astype('datetime64[D]').astype('datetime64[M]')
+        self.months, self.month = np.unique(months, return_inverse=True)
+        self.stays = len(durations)
+
+    def _load_snapshot(self, snapshot, start_date, end_date):
+        entry_ts, exit_ts, exit_day, category_id, flat_rate = snapshot.select(
+            start_date, end_date, 'entry_ts', 'exit_ts', 'exit_day', 'category_id', 'flat_rate',
+        )
+        durations = exit_ts - entry_ts
+        return durations, exit_day.astype(np.int64), category_id, flat_rate
+
+    def _load_database(self, start_date, end_date):
+        tickets = closed_ticket_rows(
+            self.parking_lot.id,
+            fields=('entry_time', 'exit_time', 'category_id', 'category__is_monthly', 'monthly_expiry'),
+            exit_time__gte=timezone.make_aware(datetime.combine(start_date, time.min)),
+            exit_time__lt=timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+        )
+
+        durations, exit_days, category_ids, flat_rates = [], [], [], []
+        for entry_time, exit_time, category_id, is_monthly, monthly_expiry in tickets.iterator(chunk_size=10000):
+            durations.append(to_microseconds(exit_time - entry_time))
+            exit_days.append(to_day_number(exit_time))
+            category_ids.append(category_id)
+            flat_rates.append(int(bool(is_monthly and monthly_expiry and exit_time <= monthly_expiry)))
+
+        return (
+            np.array(durations, dtype=np.int64),
+            np.array(exit_days, dtype=np.int64),
+            np.array(category_ids, dtype=np.int64),
+            np.array(flat_rates, dtype=np.int8),
+        )
+
+    def _rate_arrays(self, overrides=None):
+        """Tarifas en centavos por índice de categoría, aplicando los cambios propuestos"""
+        overrides = overrides or {}
+        first = np.empty(len(self.categories), dtype=np.int64)
+        additional = np.empty(len(self.categories), dtype=np.int64)
+        for i, category in enumerate(self.categories):
+            rates = overrides.get(category.id, {})
+            first[i] = int(Decimal(str(rates.get('first_hour_rate', category.first_hour_rate))) * 100)
+            additional[i] = int(Decimal(str(rates.get('additional_hour_rate', category.additional_hour_rate))) * 100)
+        return first, additional
+
+    def _revenue_matrix(self, first, additional):
+        """Ingresos en centavos por (categoría, mes)"""
+        fees = first[self.category] + self.extra_hours * additional[self.category]
+        cells = len(self.categories) * len(self.months)
+        keys = self.category * len(self.months) + self.month
+        revenue = np.bincount(keys, weights=fees, minlength=cells) if cells else np.zeros(0)
+        return revenue.reshape(len(self.categories), len(self.months))
+
+    def simulate(self, scenarios):
+        """
+        Re-tarifica las estadías con uno o varios escenarios
+        scenarios: dict {nombre: {category_id: {'first_hour_rate': ..., 'additional_hour_rate': ...}}}
+                   las categorías no incluidas conservan sus tarifas actuales
+        Retorna: dict {nombre: resultado} con totales y deltas por categoría y por mes
+        """
+        baseline = self._revenue_matrix(*self._rate_arrays())
+        month_labels = [str(month) for month in self.months]
+
+        results = {}
+        for name, overrides in scenarios.items():
+            revenue = self._revenue_matrix(*self._rate_arrays(overrides))
+            delta = revenue - baseline
+            results[name] = {
+                'baseline': _cents_to_decimal(baseline.sum()),
+                'revenue': _cents_to_decimal(revenue.sum()),
+                'delta': _cents_to_decimal(delta.sum()),
+                'by_category': [
+                    {
+                        'category': category.name,
+                        'baseline': _cents_to_decimal(baseline[i].sum()),
+                        'revenue': _cents_to_decimal(revenue[i].sum()),
+                        'delta': _cents_to_decimal(delta[i].sum()),
+                    }
+                    for i, category in enumerate(self.categories)
+                ],
+                'by_month': [
+                    {
+                        'month': label,
+                        'baseline': _cents_to_decimal(baseline[:, j].sum()),
+                        'revenue': _cents_to_decimal(revenue[:, j].sum()),
+                        'delta': _cents_to_decimal(delta[:, j].sum()),
+                    }
+                    for j, label in enumerate(month_labels)
+                ],
+                'by_category_month': {
+                    category.name: {label: _cents_to_decimal(delta[i, j]) for j, label in enumerate(month_labels)}
+                    for i, category in enumerate(self.categories)
+                },
+            }
+        return results
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Archivo de tickets cerrados (almacenamiento frío)
+
+Mueve por lotes los tickets cerrados más antiguos que la antigüedad
+configurada desde ParkingTicket a ArchivedTicket. Cada lote se copia y se
+elimina en una transacción corta. En lugar de una marca de eliminación por
+ticket se guarda una sola por parqueadero y fecha límite (DeletedRecord con
+archived_before), que los backups incrementales replican como un borrado por
+rango de los tickets ya archivados.
+
+Los reportes leen ambas tablas de forma transparente (ver
+parking/analytics.py: closed_ticket_rows y report_stats_from_database).
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedTicket, DeletedRecord, ParkingLot, ParkingTicket
+from .signals import suppress_tombstones
+
+
+logger = logging.getLogger(__name__)
+
+# Antigüedad (días desde la salida) a partir de la cual se archiva un ticket
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+
+# Tickets movidos por transacción
+ARCHIVE_BATCH_SIZE = 1000
+
+# Campos copiados tal cual del ticket (updated_at se asigna al archivar)
+ARCHIVED_FIELDS = [
+    'id', 'parking_lot_id', 'ticket_id', 'category_id', 'cliente_id', 'placa', 'color', 'marca',
+    'cascos', 'entry_time', 'exit_time', 'amount_paid', 'payment_method_id', 'barcode',
+    'monthly_expiry', 'es_mensualidad',
+]
+
+
+def get_archive_cutoff(older_than_days=None):
+    """Fecha de salida límite: se archivan los tickets que salieron antes"""
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'TICKET_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+    return timezone.now() - timedelta(days=older_than_days)
+
+
+class TicketArchiveService:
+    """Servicio para archivar tickets cerrados antiguos"""
+
+    @staticmethod
+    def get_archivable_tickets(parking_lot_id, cutoff):
+        """
+        Tickets cerrados antes del límite que se pueden archivar
+        Se excluyen los tickets referenciados por una mensualidad.
+        """
+        return ParkingTicket.objects.filter(
+            parking_lot_id=parking_lot_id,
+            exit_time__lt=cutoff,
+            mensualidad__isnull=True,
+        )
+
+    @staticmethod
+    def _archive_batch(parking_lot_id, cutoff, batch_size):
+        """Mueve un lote de tickets en una transacción. Retorna la cantidad movida"""
+        with transaction.atomic():
+            rows = list(
+                TicketArchiveService.get_archivable_tickets(parking_lot_id, cutoff)
+                .order_by('exit_time', 'id')
+                .values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return 0
+
+            archived_at = timezone.now()
+            ArchivedTicket.objects.bulk_create([
+                ArchivedTicket(archived_at=archived_at, **row) for row in rows
+            ])
+
+            ids = [row['id'] for row in rows]
+            # Una marca por parqueadero y fecha límite en lugar de una por ticket desde la señal
+            with suppress_tombstones():
+                ParkingTicket.objects.filter(id__in=ids).delete()
+            TicketArchiveService._mark_archived(parking_lot_id, cutoff, archived_at)
+            return len(rows)
+
+    @staticmethod
+    def _mark_archived(parking_lot_id, cutoff, archived_at):
+        """
+        Registra (o actualiza) la marca de archivo del parqueadero para la fecha límite
+        Se actualiza en cada lote para que el próximo backup incremental la exporte.
+        """
+        marker = DeletedRecord.objects.filter(
+            parking_lot_id=parking_lot_id, model=ParkingTicket._meta.label_lower, archived_before=cutoff,
+        )
+        if not marker.update(deleted_at=archived_at):
+            DeletedRecord.objects.create(
+                parking_lot_id=parking_lot_id,
+                model=ParkingTicket._meta.label_lower,
+                archived_before=cutoff,
+                deleted_at=archived_at,
+            )
+
+    @staticmethod
+    def archive_parking_lot(parking_lot_id, older_than_days=None, batch_size=ARCHIVE_BATCH_SIZE, dry_run=False):
+        """
+        Archiva los tickets cerrados antiguos de un parqueadero
+        Retorna: dict con success, tickets archivados y fecha límite
+        """
+        cutoff = get_archive_cutoff(older_than_days)
+
+        if dry_run:
+            return {
+                'success': True,
+                'archived': TicketArchiveService.get_archivable_tickets(parking_lot_id, cutoff).count(),
+                'cutoff': cutoff,
+            }
+
+        archived = 0
+        try:
+            while True:
+                moved = TicketArchiveService._archive_batch(parking_lot_id, cutoff, batch_size)
+                if not moved:
+                    break
+                archived += moved
+        except Exception as e:
+            logger.exception('Error archivando tickets del parqueadero %s', parking_lot_id)
+            return {
+                'success': False,
+                'error': str(e),
+                'archived': archived,
+                'cutoff': cutoff,
+            }
+
+        return {
+            'success': True,
+            'archived': archived,
+            'cutoff': cutoff,
+        }
+
+    @staticmethod
+    def archive_all(older_than_days=None, batch_size=ARCHIVE_BATCH_SIZE, dry_run=False):
+        """
+        Archiva los tickets antiguos de todos los parqueaderos
+        Retorna: dict {parking_lot_id: resultado}
+        """
+        return {
+            parking_lot_id: TicketArchiveService.archive_parking_lot(
+                parking_lot_id, older_than_days=older_than_days, batch_size=batch_size, dry_run=dry_run
+            )
+            for parking_lot_id in ParkingLot.objects.order_by('id').values_list('id', flat=True)
+        }
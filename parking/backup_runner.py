@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Ejecución paralela de backups de todos los parqueaderos
+
+Los backups se guardan en una estructura fechada:
+
+    <raíz>/<AAAA-MM-DD>/parking_lot_<id>.ndjson.gz
+    <raíz>/<AAAA-MM-DD>/summary.json
+
+Cada archivo se escribe como .part y se renombra al terminar, así que un
+parqueadero con su archivo final ya está respaldado: al repetir la ejecución
+del mismo día solo se procesan los pendientes. Este módulo no importa modelos
+a nivel de módulo para poder usarse como destino de procesos 'spawn'.
+
+Después de la retención se eliminan las marcas de eliminación (DeletedRecord)
+anteriores a la marca de agua más antigua de los backups conservados de cada
+parqueadero: ningún incremental que parta de un backup conservado las exporta.
+"""
+
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+
+import django
+from django.apps import apps
+
+
+DATE_DIR_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+BACKUP_FILE_PATTERN = re.compile(r'^parking_lot_(\d+)\.ndjson\.gz$')
+
+
+def init_worker():
+    """
+    Inicializa Django en el proceso hijo (necesario con 'spawn')
+    El proceso padre cierra sus conexiones antes de crear el pool, así que
+    cada hijo abre la suya.
+    """
+    if not apps.ready:
+        django.setup()
+
+
+def backup_parking_lot(parking_lot_id, path):
+    """Respalda un parqueadero en `path` (se ejecuta en un proceso del pool)"""
+    from django.db import connections
+    from .backup_service import BackupService
+
+    started = time.monotonic()
+    try:
+        result = BackupService.write_parking_lot_backup(parking_lot_id, path)
+    finally:
+        connections.close_all()
+
+    return {
+        'parking_lot_id': parking_lot_id,
+        'success': result['success'],
+        'error': result.get('error'),
+        'size': result.get('size', 0),
+        'elapsed': time.monotonic() - started,
+    }
+
+
+def get_run_dir(root, run_date):
+    return os.path.join(root, run_date.isoformat())
+
+
+def get_backup_path(run_dir, parking_lot_id):
+    return os.path.join(run_dir, f'parking_lot_{parking_lot_id}.ndjson.gz')
+
+
+def load_summary(run_dir):
+    path = os.path.join(run_dir, 'summary.json')
+    if not os.path.exists(path):
+        return {'tenants': {}}
+    with open(path, 'r', encoding='utf-8') as summary_file:
+        return json.load(summary_file)
+
+
+def save_summary(run_dir, summary):
+    path = os.path.join(run_dir, 'summary.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def select_retained(run_dates, keep_daily, keep_weekly):
+    """
+    Fechas de ejecución que se conservan: las `keep_daily` más recientes y,
+    de las semanas anteriores, la más reciente de cada una de las últimas
+    `keep_weekly` semanas (ISO)
+    """
+    ordered = sorted(run_dates, reverse=True)
+    retained = set(ordered[:keep_daily])
+
+    weeks_seen = set()
+    for run_date in ordered[keep_daily:]:
+        week = run_date.isocalendar()[:2]
+        if week in weeks_seen:
+            continue
+        if len(weeks_seen) >= keep_weekly:
+            break
+        weeks_seen.add(week)
+        retained.add(run_date)
+
+    return retained
+
+
+def apply_retention(root, keep_daily, keep_weekly, today=None):
+    """
+    Elimina los directorios fechados fuera de la política de retención
+    Retorna: lista de directorios eliminados
+    """
+    import shutil
+
+    today = today or date.today()
+    run_dates = []
+    for name in os.listdir(root):
+        if DATE_DIR_PATTERN.match(name) and os.path.isdir(os.path.join(root, name)):
+            run_dates.append(datetime.strptime(name, '%Y-%m-%d').date())
+
+    retained = select_retained(run_dates, keep_daily, keep_weekly)
+    removed = []
+    for run_date in sorted(run_dates):
+        if run_date in retained or run_date >= today:
+            continue
+        run_dir = get_run_dir(root, run_date)
+        shutil.rmtree(run_dir)
+        removed.append(run_dir)
+    return removed
+
+
+def get_retained_watermarks(root):
+    """
+    Marca de agua más antigua de los backups que quedan en `root`, por parqueadero
+    Solo se lee el encabezado de cada archivo. Un parqueadero con algún archivo
+    ilegible queda con None (no se sabe qué marcas necesita).
+    Retorna: dict {parking_lot_id: datetime o None}
+    """
+    from .backup_service import BackupFormatError, BackupReader
+
+    watermarks = {}
+    for name in os.listdir(root):
+        run_dir = os.path.join(root, name)
+        if not DATE_DIR_PATTERN.match(name) or not os.path.isdir(run_dir):
+            continue
+        for file_name in os.listdir(run_dir):
+            match = BACKUP_FILE_PATTERN.match(file_name)
+            if not match:
+                continue
+            parking_lot_id = int(match.group(1))
+            try:
+                with open(os.path.join(run_dir, file_name), 'rb') as backup_file:
+                    watermark = BackupReader(backup_file).get_datetime('watermark')
+            except (OSError, EOFError, ValueError, BackupFormatError):
+                watermark = None
+            if watermark is None:
+                watermarks[parking_lot_id] = None
+            elif parking_lot_id not in watermarks:
+                watermarks[parking_lot_id] = watermark
+            elif watermarks[parking_lot_id] is not None:
+                watermarks[parking_lot_id] = min(watermarks[parking_lot_id], watermark)
+    return watermarks
+
+
+def prune_tombstones(root):
+    """
+    Elimina las marcas de eliminación que ya no necesita ningún backup conservado
+    Se conservan las marcas desde la marca de agua más antigua de cada
+    parqueadero (menos el margen que usan los incrementales); los parqueaderos
+    sin backups legibles en `root` no se tocan.
+    Retorna: cantidad de marcas eliminadas
+    """
+    from .backup_service import BACKUP_WATERMARK_OVERLAP
+    from .models import DeletedRecord
+
+    pruned = 0
+    for parking_lot_id, watermark in get_retained_watermarks(root).items():
+        if watermark is None:
+            continue
+        pruned += DeletedRecord.objects.filter(
+            parking_lot_id=parking_lot_id,
+            deleted_at__lt=watermark - BACKUP_WATERMARK_OVERLAP,
+        ).delete()[0]
+    return pruned
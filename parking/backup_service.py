@@ -1,70 +1,499 @@
 """
 Servicio de backup y restauración de datos
 """
+import gzip
+import hashlib
 import json
 import os
-from datetime import datetime
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta, time as dt_time
+from itertools import islice
 from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
-from django.db import connection
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models.sql import InsertQuery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .models import (
-    ParkingLot, VehicleCategory, ParkingTicket, 
-    Cliente, Mensualidad, PaymentMethod, UserParkingLot
+    ParkingLot, VehicleCategory, ParkingTicket, ArchivedTicket,
+    Cliente, Mensualidad, PaymentMethod, UserParkingLot, Caja, CashSession, CashMovement, CashBalance,
+    DeletedRecord,
 )
+from . import reference_cache
+from .analytics import drop_snapshot
+from .signals import TRACKED_MODELS, suppress_tombstones
+
+
+BACKUP_FORMAT = 'parking-backup'
+BACKUP_VERSION = '2.0'
+
+# Registros leídos por consulta y tamaño de los bloques gzip enviados
+BACKUP_CHUNK_SIZE = 2000
+BACKUP_STREAM_BLOCK_SIZE = 64 * 1024
+
+# Registros deserializados e insertados por lote al restaurar
+RESTORE_BATCH_SIZE = 1000
+
+# Snapshots SQLite con la API de backup en línea: páginas copiadas por paso y
+# pausa entre pasos (durante la pausa los escritores pueden confirmar)
+SQLITE_BACKUP_STEP_PAGES = 1024
+SQLITE_BACKUP_STEP_SLEEP = 0.005
+SQLITE_BACKUP_MAX_RESTARTS = 3
+SQLITE_BUSY_TIMEOUT = 30
+
+# Secciones del backup en orden de dependencias: (nombre, modelo, filtro por parqueadero)
+BACKUP_SECTIONS = [
+    ('parking_lot', ParkingLot, 'id'),
+    ('categories', VehicleCategory, 'parking_lot_id'),
+    ('payment_methods', PaymentMethod, 'parking_lot_id'),
+    ('clientes', Cliente, 'parking_lot_id'),
+    ('tickets', ParkingTicket, 'parking_lot_id'),
+    ('archived_tickets', ArchivedTicket, 'parking_lot_id'),
+    ('mensualidades', Mensualidad, 'parking_lot_id'),
+    ('cajas', Caja, 'parking_lot_id'),
+    ('cash_sessions', CashSession, 'parking_lot_id'),
+    ('user_assignments', UserParkingLot, 'parking_lot_id'),
+]
+
+# Libro de caja: se deriva de tickets y mensualidades, no va en el backup y se
+# reconstruye al restaurar (CashRegisterService.rebuild_ledger)
+LEDGER_MODELS = [CashMovement, CashBalance]
+
+# Sección adicional de los backups incrementales con las eliminaciones
+TOMBSTONE_SECTION = ('tombstones', DeletedRecord, 'parking_lot_id')
+
+# Filtro por parqueadero de cada modelo restaurable
+SECTION_LOOKUPS = {model: lookup for _, model, lookup in BACKUP_SECTIONS}
+
+# Margen que se resta a la marca de agua para no perder cambios de
+# transacciones que confirmaron después de leer (reaplicarlos es inocuo)
+BACKUP_WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def get_change_field(model):
+    """Campo de última modificación del modelo (None si no lo tiene)"""
+    field_names = {field.name for field in model._meta.concrete_fields}
+    return 'updated_at' if 'updated_at' in field_names else None
+
+
+class BackupJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder sin recortar los microsegundos de fechas y horas"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, dt_time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class BackupFormatError(Exception):
+    """El archivo de backup está dañado o no tiene un formato reconocido"""
+
+
+class BackupReader:
+    """
+    Lectura incremental de un archivo de backup de parqueadero
+
+    Acepta el formato NDJSON (comprimido con gzip o no) y el formato JSON
+    anterior (versión 1.0). En NDJSON las líneas se leen una a una y se
+    verifican el conteo y el SHA-256 de cada sección y el manifiesto final.
+    """
+
+    def __init__(self, backup_file, batch_size=RESTORE_BATCH_SIZE):
+        self.batch_size = batch_size
+        backup_file.seek(0)
+        magic = backup_file.read(2)
+        backup_file.seek(0)
+        if magic == b'\x1f\x8b':
+            backup_file = gzip.GzipFile(fileobj=backup_file, mode='rb')
+        self.file = backup_file
+
+        first_line = self.file.readline()
+        try:
+            header = json.loads(first_line)
+        except ValueError:
+            header = None
+
+        if isinstance(header, dict) and header.get('type') == 'header':
+            self.legacy_data = None
+            self.header = header
+        else:
+            # Formato 1.0: un único documento JSON
+            try:
+                self.legacy_data = json.loads(first_line + self.file.read())
+                metadata = self.legacy_data['metadata']
+            except (ValueError, KeyError, TypeError):
+                raise BackupFormatError('Formato de backup inválido')
+            self.header = {
+                'version': metadata.get('version'),
+                'parking_lot_id': metadata.get('parking_lot_id'),
+                'parking_lot_name': metadata.get('parking_lot_name'),
+            }
+
+    @property
+    def is_incremental(self):
+        return self.header.get('kind') == 'incremental'
+
+    def get_datetime(self, key):
+        value = self.header.get(key)
+        return datetime.fromisoformat(value) if value else None
+
+    def sections(self):
+        """
+        Genera (nombre, modelo, lote de registros) en orden de dependencias
+        """
+        if self.legacy_data is not None:
+            yield from self._legacy_sections()
+        else:
+            yield from self._ndjson_sections()
+
+    def _legacy_sections(self):
+        for name, model, _ in BACKUP_SECTIONS:
+            records = self.legacy_data.get(name)
+            if not records:
+                continue
+            if isinstance(records, dict):
+                records = [records]
+            for start in range(0, len(records), self.batch_size):
+                yield name, model, records[start:start + self.batch_size]
+
+    def _ndjson_sections(self):
+        sections = BACKUP_SECTIONS + [TOMBSTONE_SECTION]
+        positions = {name: i for i, (name, _, _) in enumerate(sections)}
+        models_by_name = {name: model for name, model, _ in sections}
+        last_position = -1
+        current = None
+        checksum = None
+        count = 0
+        batch = []
+
+        for line in self.file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+
+            if 'type' not in entry:
+                if current is None:
+                    raise BackupFormatError('Registro fuera de una sección')
+                checksum.update(line)
+                count += 1
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    yield current, models_by_name[current], batch
+                    batch = []
+
+            elif entry['type'] == 'section':
+                name = entry.get('name')
+                if name not in positions or positions[name] <= last_position:
+                    raise BackupFormatError(f'Sección inesperada: {name}')
+                if entry.get('model') != models_by_name[name]._meta.label_lower:
+                    raise BackupFormatError(f'Modelo inesperado en la sección {name}')
+                last_position = positions[name]
+                current, checksum, count, batch = name, hashlib.sha256(), 0, []
+
+            elif entry['type'] == 'section_end':
+                if current is None or entry.get('name') != current:
+                    raise BackupFormatError('Fin de sección inesperado')
+                if batch:
+                    yield current, models_by_name[current], batch
+                    batch = []
+                if entry.get('count') != count or entry.get('sha256') != checksum.hexdigest():
+                    raise BackupFormatError(f'La sección {current} está dañada (checksum no coincide)')
+                current = None
+
+            elif entry['type'] == 'manifest':
+                if current is not None:
+                    raise BackupFormatError(f'La sección {current} está incompleta')
+                return
+
+        raise BackupFormatError('El backup está incompleto (falta el manifiesto)')
+
+
+class _SnapshotRestarted(Exception):
+    """La copia en línea se reinició demasiadas veces por escrituras concurrentes"""
+
+
+class _HashingWriter:
+    """Envoltura de archivo que calcula el SHA-256 de lo que se escribe"""
+
+    def __init__(self, fileobj, checksum):
+        self.fileobj = fileobj
+        self.checksum = checksum
+
+    def write(self, data):
+        self.checksum.update(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
 
 
 class BackupService:
     """Servicio para crear y restaurar backups"""
     
+    @staticmethod
+    def get_backup_sections(parking_lot_id, since=None):
+        """
+        Secciones del backup de un parqueadero en orden de dependencias
+        (cada modelo aparece después de los modelos a los que referencia)
+
+        Con since (backup incremental) los modelos con updated_at se limitan a
+        los registros modificados desde esa fecha, los demás (catálogos
+        pequeños) se exportan completos, y se agregan las eliminaciones.
+        """
+        if since is None:
+            return [
+                (name, model.objects.filter(**{lookup: parking_lot_id}))
+                for name, model, lookup in BACKUP_SECTIONS
+            ]
+
+        sections = []
+        for name, model, lookup in BACKUP_SECTIONS:
+            queryset = model.objects.filter(**{lookup: parking_lot_id})
+            change_field = get_change_field(model)
+            if change_field:
+                queryset = queryset.filter(**{f'{change_field}__gte': since})
+            sections.append((name, queryset))
+
+        name, model, lookup = TOMBSTONE_SECTION
+        sections.append((name, model.objects.filter(**{lookup: parking_lot_id, 'deleted_at__gte': since})))
+        return sections
+
+    @staticmethod
+    def iter_backup_lines(parking_lot, since=None):
+        """
+        Genera el backup de un parqueadero como líneas NDJSON (bytes)
+
+        Formato: una línea de encabezado, luego por cada sección una línea
+        'section', un registro serializado por línea y una línea 'section_end'
+        con el conteo y el SHA-256 de las líneas de registros; al final un
+        'manifest' con el resumen de todas las secciones. Los registros se leen
+        con .iterator() por lotes, así que la memoria no depende del tamaño.
+
+        El encabezado incluye la marca de agua (watermark) del backup; un
+        backup incremental (since) contiene solo los cambios posteriores a la
+        marca de agua del backup anterior.
+        """
+        def encode(obj):
+            return (json.dumps(obj, cls=BackupJSONEncoder, ensure_ascii=False) + '\n').encode('utf-8')
+
+        watermark = timezone.now()
+        changed_since = since - BACKUP_WATERMARK_OVERLAP if since else None
+
+        yield encode({
+            'type': 'header',
+            'format': BACKUP_FORMAT,
+            'version': BACKUP_VERSION,
+            'kind': 'incremental' if since else 'full',
+            'backup_date': datetime.now().isoformat(),
+            'parking_lot_id': parking_lot.id,
+            'parking_lot_name': parking_lot.empresa,
+            'since': since.isoformat() if since else None,
+            'watermark': watermark.isoformat(),
+        })
+
+        manifest = {}
+        for name, queryset in BackupService.get_backup_sections(parking_lot.id, changed_since):
+            yield encode({'type': 'section', 'name': name, 'model': queryset.model._meta.label_lower})
+
+            checksum = hashlib.sha256()
+            count = 0
+            rows = queryset.order_by('pk').iterator(chunk_size=BACKUP_CHUNK_SIZE)
+            while True:
+                batch = list(islice(rows, BACKUP_CHUNK_SIZE))
+                if not batch:
+                    break
+                for record in serializers.serialize('python', batch):
+                    line = encode(record)
+                    checksum.update(line)
+                    count += 1
+                    yield line
+
+            manifest[name] = {'count': count, 'sha256': checksum.hexdigest()}
+            yield encode({'type': 'section_end', 'name': name, **manifest[name]})
+
+        yield encode({
+            'type': 'manifest',
+            'sections': manifest,
+            'total_records': sum(section['count'] for section in manifest.values()),
+        })
+
+    @staticmethod
+    def iter_parking_lot_backup(parking_lot, since=None):
+        """Genera el backup comprimido con gzip en bloques (para StreamingHttpResponse)"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        pending = []
+        pending_size = 0
+        for line in BackupService.iter_backup_lines(parking_lot, since):
+            data = compressor.compress(line)
+            if data:
+                pending.append(data)
+                pending_size += len(data)
+                if pending_size >= BACKUP_STREAM_BLOCK_SIZE:
+                    yield b''.join(pending)
+                    pending = []
+                    pending_size = 0
+        pending.append(compressor.flush())
+        yield b''.join(pending)
+
     @staticmethod
     def export_parking_lot_data(parking_lot_id):
         """
-        Exporta todos los datos de un parqueadero específico
-        Retorna un diccionario con los datos en formato JSON
+        Prepara la exportación en streaming de un parqueadero
+        Retorna un diccionario con el generador de bloques gzip y el nombre del archivo
         """
         try:
             parking_lot = ParkingLot.objects.get(id=parking_lot_id)
-            
-            # Obtener todos los datos relacionados
-            data = {
-                'metadata': {
-                    'backup_date': datetime.now().isoformat(),
-                    'parking_lot_id': parking_lot_id,
-                    'parking_lot_name': parking_lot.empresa,
-                    'version': '1.0'
-                },
-                'parking_lot': json.loads(serializers.serialize('json', [parking_lot]))[0],
-                'categories': json.loads(serializers.serialize('json', 
-                    VehicleCategory.objects.filter(parking_lot=parking_lot))),
-                'tickets': json.loads(serializers.serialize('json', 
-                    ParkingTicket.objects.filter(parking_lot=parking_lot))),
-                'clientes': json.loads(serializers.serialize('json', 
-                    Cliente.objects.filter(parking_lot=parking_lot))),
-                'mensualidades': json.loads(serializers.serialize('json', 
-                    Mensualidad.objects.filter(parking_lot=parking_lot))),
-                'payment_methods': json.loads(serializers.serialize('json', 
-                    PaymentMethod.objects.filter(parking_lot=parking_lot))),
-                'user_assignments': json.loads(serializers.serialize('json', 
-                    UserParkingLot.objects.filter(parking_lot=parking_lot)))
+
+            return {
+                'success': True,
+                'stream': BackupService.iter_parking_lot_backup(parking_lot),
+                'filename': f'backup_{parking_lot.empresa}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.ndjson.gz'
             }
-            
+
+        except ParkingLot.DoesNotExist:
+            return {
+                'success': False,
+                'error': 'Parqueadero no encontrado'
+            }
+
+    @staticmethod
+    def write_parking_lot_backup(parking_lot_id, path, since=None):
+        """
+        Escribe el backup comprimido de un parqueadero en un archivo
+        Se escribe primero en un archivo .part que se renombra al terminar
+
+        Args:
+            since: marca de agua del backup anterior para un backup incremental
+        """
+        try:
+            parking_lot = ParkingLot.objects.get(id=parking_lot_id)
+            part_path = f'{path}.part'
+            size = 0
+
+            with open(part_path, 'wb') as backup_file:
+                for block in BackupService.iter_parking_lot_backup(parking_lot, since):
+                    backup_file.write(block)
+                    size += len(block)
+            os.replace(part_path, path)
+
             return {
                 'success': True,
-                'data': data,
-                'filename': f'backup_{parking_lot.empresa}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+                'path': path,
+                'size': size,
             }
-            
+
         except ParkingLot.DoesNotExist:
             return {
                 'success': False,
                 'error': 'Parqueadero no encontrado'
             }
         except Exception as e:
+            if os.path.exists(f'{path}.part'):
+                os.remove(f'{path}.part')
             return {
                 'success': False,
                 'error': str(e)
             }
-    
+
+    @staticmethod
+    def _sqlite_online_copy(source_path, dest_path, pages=SQLITE_BACKUP_STEP_PAGES, sleep=SQLITE_BACKUP_STEP_SLEEP):
+        """
+        Copia una base SQLite en uso con la API de backup en línea
+
+        La copia avanza por pasos de `pages` páginas; cada paso solo mantiene un
+        bloqueo de lectura breve, así que los escritores no quedan bloqueados
+        durante toda la copia. SQLite reinicia la copia cuando otra conexión
+        escribe en la base; si se reinicia demasiadas veces se termina en un
+        solo paso, que en modo WAL es una lectura que no bloquea escritores.
+        Retorna la duración máxima de un paso (ms).
+        """
+        steps = []
+        state = {'last': time.monotonic(), 'remaining': None, 'restarts': 0}
+
+        def progress(status, remaining, total):
+            now = time.monotonic()
+            steps.append(now - state['last'])
+            state['last'] = now + sleep
+            if state['remaining'] is not None and remaining > state['remaining']:
+                state['restarts'] += 1
+                if state['restarts'] > SQLITE_BACKUP_MAX_RESTARTS:
+                    raise _SnapshotRestarted()
+            state['remaining'] = remaining
+
+        source = sqlite3.connect(source_path, timeout=SQLITE_BUSY_TIMEOUT)
+        dest = sqlite3.connect(dest_path, timeout=SQLITE_BUSY_TIMEOUT)
+        try:
+            try:
+                source.backup(dest, pages=pages, progress=progress, sleep=sleep)
+            except _SnapshotRestarted:
+                started = time.monotonic()
+                source.backup(dest, pages=-1)
+                steps.append(time.monotonic() - started)
+        finally:
+            dest.close()
+            source.close()
+
+        return max(steps, default=0) * 1000
+
+    @staticmethod
+    def _verify_sqlite_database(path):
+        """Verifica que el archivo sea una base SQLite íntegra con las tablas de la aplicación"""
+        check = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            result = check.execute('PRAGMA integrity_check').fetchone()[0]
+            if result != 'ok':
+                raise ValueError(f'La base de datos del backup está dañada: {result}')
+            tables = {row[0] for row in check.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f'El archivo no es una base de datos SQLite válida: {e}')
+        finally:
+            check.close()
+        if not {'django_migrations', ParkingLot._meta.db_table} <= tables:
+            raise ValueError('El archivo no contiene una base de datos de la aplicación')
+
+    @staticmethod
+    def create_sqlite_snapshot(dest_path):
+        """
+        Crea un snapshot comprimido (gzip) y con checksum de la base SQLite en uso
+
+        Retorna: dict con ruta, SHA-256 y tamaño del archivo comprimido y la
+        duración máxima de un paso de copia (ms)
+        """
+        db_path = str(settings.DATABASES['default']['NAME'])
+        dest_dir = os.path.dirname(dest_path)
+        fd, temp_path = tempfile.mkstemp(suffix='.sqlite3', dir=dest_dir)
+        os.close(fd)
+
+        try:
+            max_step_ms = BackupService._sqlite_online_copy(db_path, temp_path)
+
+            checksum = hashlib.sha256()
+            part_path = f'{dest_path}.part'
+            with open(temp_path, 'rb') as source, open(part_path, 'wb') as raw_dest:
+                with gzip.GzipFile(fileobj=_HashingWriter(raw_dest, checksum), mode='wb') as dest:
+                    shutil.copyfileobj(source, dest, BACKUP_STREAM_BLOCK_SIZE * 16)
+            os.replace(part_path, dest_path)
+
+            with open(f'{dest_path}.sha256', 'w') as checksum_file:
+                checksum_file.write(f'{checksum.hexdigest()}  {os.path.basename(dest_path)}\n')
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return {
+            'path': dest_path,
+            'sha256': checksum.hexdigest(),
+            'size': os.path.getsize(dest_path),
+            'max_step_ms': max_step_ms,
+        }
+
     @staticmethod
     def export_full_database():
         """
@@ -76,15 +505,20 @@ class BackupService:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
             if 'sqlite' in db_engine:
-                # Para SQLite, simplemente copiar el archivo
-                db_path = settings.DATABASES['default']['NAME']
-                backup_filename = f'full_backup_{timestamp}.sqlite3'
+                # Para SQLite, snapshot consistente con la API de backup en línea
+                backup_dir = os.path.join(settings.BASE_DIR, 'backups')
+                os.makedirs(backup_dir, exist_ok=True)
+                backup_filename = f'full_backup_{timestamp}.sqlite3.gz'
+                snapshot = BackupService.create_sqlite_snapshot(os.path.join(backup_dir, backup_filename))
                 
                 return {
                     'success': True,
                     'type': 'sqlite',
-                    'source_path': str(db_path),
-                    'filename': backup_filename
+                    'path': snapshot['path'],
+                    'filename': backup_filename,
+                    'sha256': snapshot['sha256'],
+                    'size': snapshot['size'],
+                    'max_step_ms': snapshot['max_step_ms'],
                 }
                 
             elif 'postgresql' in db_engine:
@@ -134,43 +568,51 @@ class BackupService:
         Restaura toda la base de datos desde un archivo de backup
         
         Args:
-            backup_file_path: Ruta al archivo de backup (.sqlite3 o .sql)
+            backup_file_path: Ruta al archivo de backup (.sqlite3, .sqlite3.gz o .sql)
         """
         try:
-            import shutil
-            from django.core.management import call_command
-            
             db_engine = settings.DATABASES['default']['ENGINE']
             
             if 'sqlite' in db_engine:
-                # Para SQLite, reemplazar el archivo de base de datos
-                current_db_path = settings.DATABASES['default']['NAME']
-                
-                # Crear backup del archivo actual antes de reemplazar
-                backup_current = f"{current_db_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                # Para SQLite, verificar el backup en una base temporal y
+                # reemplazar el contenido de la base en uso con la API de backup
+                current_db_path = str(settings.DATABASES['default']['NAME'])
+                db_dir = os.path.dirname(current_db_path)
+                fd, temp_path = tempfile.mkstemp(suffix='.sqlite3', dir=db_dir)
+                os.close(fd)
                 
                 try:
-                    # Hacer backup del archivo actual
-                    if os.path.exists(current_db_path):
-                        shutil.copy2(current_db_path, backup_current)
+                    # Descomprimir (si aplica) a la base temporal
+                    with open(backup_file_path, 'rb') as backup_file:
+                        compressed = backup_file.read(2) == b'\x1f\x8b'
+                    opener = gzip.open if compressed else open
+                    with opener(backup_file_path, 'rb') as source, open(temp_path, 'wb') as dest:
+                        shutil.copyfileobj(source, dest, BACKUP_STREAM_BLOCK_SIZE * 16)
                     
-                    # Reemplazar con el nuevo archivo
-                    shutil.copy2(backup_file_path, current_db_path)
+                    BackupService._verify_sqlite_database(temp_path)
                     
-                    # Verificar que la base de datos es válida
-                    call_command('check', '--database', 'default')
+                    # Snapshot de seguridad de la base actual
+                    backup_dir = os.path.join(settings.BASE_DIR, 'backups')
+                    os.makedirs(backup_dir, exist_ok=True)
+                    backup_current = os.path.join(
+                        backup_dir, f"before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}.sqlite3.gz"
+                    )
+                    BackupService.create_sqlite_snapshot(backup_current)
+                    
+                    # Copia en un solo paso: SQLite la aplica como una única
+                    # transacción, así que las demás conexiones ven la base
+                    # anterior o la restaurada, nunca un estado intermedio
+                    connection.close()
+                    BackupService._sqlite_online_copy(temp_path, current_db_path, pages=-1)
                     
                     return {
                         'success': True,
                         'message': 'Base de datos restaurada exitosamente',
                         'backup_of_current': backup_current
                     }
-                    
-                except Exception as e:
-                    # Si falla, restaurar el backup anterior
-                    if os.path.exists(backup_current):
-                        shutil.copy2(backup_current, current_db_path)
-                    raise e
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
                     
             elif 'postgresql' in db_engine:
                 # Para PostgreSQL, usar comando de gestión
@@ -205,90 +647,277 @@ class BackupService:
             }
     
     @staticmethod
-    def restore_parking_lot_data(backup_data, overwrite=False):
+    def _deserialize_batch(model, records, parking_lot_id):
+        """
+        Convierte un lote de registros del backup en instancias (sin guardar)
+        Rechaza el archivo si un registro es de otro modelo o de otro parqueadero.
+        """
+        lookup = SECTION_LOOKUPS[model]
+        objs = [obj.object for obj in serializers.deserialize('python', records)]
+        for obj in objs:
+            if type(obj) is not model or getattr(obj, 'pk' if lookup == 'id' else lookup) != parking_lot_id:
+                raise BackupFormatError(
+                    f'El backup contiene registros ajenos al parqueadero en {model._meta.label_lower}'
+                )
+        if model is UserParkingLot:
+            # Solo se restauran asignaciones de usuarios que existen en esta instalación
+            user_model = apps.get_model(settings.AUTH_USER_MODEL)
+            existing = set(user_model.objects.filter(
+                id__in={obj.user_id for obj in objs}
+            ).values_list('id', flat=True))
+            objs = [obj for obj in objs if obj.user_id in existing]
+        elif model is CashSession:
+            # Las sesiones se conservan aunque el cajero no exista en esta instalación
+            user_model = apps.get_model(settings.AUTH_USER_MODEL)
+            existing = set(user_model.objects.filter(
+                id__in={obj.user_id for obj in objs if obj.user_id}
+            ).values_list('id', flat=True))
+            for obj in objs:
+                if obj.user_id not in existing:
+                    obj.user_id = None
+        return objs
+
+    @staticmethod
+    def _insert_objects(model, objs):
+        """
+        Inserta un lote de instancias con un solo executemany
+
+        Se inserta en modo raw (como loaddata) para conservar tal cual los
+        valores del backup: no se ejecuta save(), así que no se regeneran
+        códigos de barras ni se sobrescriben campos auto_now_add.
+        """
+        if not objs:
+            return 0
+
+        # El SQL se compila una vez con la primera fila y se reutiliza para todo el lote
+        db = connections[DEFAULT_DB_ALIAS]
+        fields = model._meta.concrete_fields
+        query = InsertQuery(model)
+        query.insert_values(fields, objs[:1], raw=True)
+        sql, _ = query.get_compiler(connection=db).as_sql()[0]
+        params = [
+            [field.get_db_prep_save(getattr(obj, field.attname), db) for field in fields]
+            for obj in objs
+        ]
+        with db.cursor() as cursor:
+            cursor.executemany(sql, params)
+        return len(objs)
+
+    @staticmethod
+    def _upsert_objects(model, objs, parking_lot_id):
+        """
+        Actualiza los registros existentes e inserta los nuevos (backups incrementales)
+        Rechaza el archivo si un id ya pertenece a otro parqueadero.
+        """
+        if not objs:
+            return 0
+
+        scoped = model.objects.filter(**{SECTION_LOOKUPS[model]: parking_lot_id})
+        pks = [obj.pk for obj in objs]
+        existing = set(scoped.filter(pk__in=pks).values_list('pk', flat=True))
+        if model.objects.filter(pk__in=set(pks) - existing).exists():
+            raise BackupFormatError(f'El backup modifica registros de otro parqueadero en {model._meta.label_lower}')
+        to_update = [obj for obj in objs if obj.pk in existing]
+        to_insert = [obj for obj in objs if obj.pk not in existing]
+
+        if to_update:
+            # bulk_update no ejecuta pre_save, así que updated_at conserva el valor del backup;
+            # la actualización queda limitada al parqueadero restaurado
+            fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+            scoped.bulk_update(to_update, fields, batch_size=RESTORE_BATCH_SIZE)
+        BackupService._insert_objects(model, to_insert)
+        return len(objs)
+
+    @staticmethod
+    def _apply_tombstones(records, parking_lot_id):
+        """
+        Elimina los registros marcados como borrados en un backup incremental
+        Solo acepta modelos con marcas de eliminación (TRACKED_MODELS) y borra
+        únicamente dentro del parqueadero restaurado. Las marcas de archivo
+        (archived_before) eliminan de ParkingTicket los tickets que ya están en
+        ArchivedTicket y salieron antes de la fecha límite.
+        """
+        tracked = {model._meta.label_lower: model for model in TRACKED_MODELS}
+        pks_by_model = {}
+        archived_before = None
+        for record in records:
+            fields = record.get('fields') or {}
+            model = tracked.get(fields.get('model'))
+            if (record.get('model') != DeletedRecord._meta.label_lower or model is None
+                    or fields.get('parking_lot') != parking_lot_id):
+                raise BackupFormatError('El backup contiene eliminaciones inválidas')
+            if fields.get('archived_before') is not None:
+                cutoff = parse_datetime(str(fields['archived_before']))
+                if model is not ParkingTicket or cutoff is None:
+                    raise BackupFormatError('El backup contiene eliminaciones inválidas')
+                archived_before = max(archived_before or cutoff, cutoff)
+            else:
+                pks_by_model.setdefault(model, []).append(fields['object_pk'])
+
+        deleted = 0
+        for model, pks in pks_by_model.items():
+            deleted += model.objects.filter(parking_lot_id=parking_lot_id, pk__in=pks).delete()[0]
+        if archived_before is not None:
+            archived = ArchivedTicket.objects.filter(parking_lot_id=parking_lot_id, exit_time__lt=archived_before)
+            deleted += ParkingTicket.objects.filter(
+                parking_lot_id=parking_lot_id, exit_time__lt=archived_before, pk__in=archived.values('pk'),
+            ).delete()[0]
+        return deleted
+
+    @staticmethod
+    def delete_parking_lot_data(parking_lot_id, batch_size=RESTORE_BATCH_SIZE, progress=None):
+        """
+        Elimina un parqueadero y sus datos por lotes, en orden inverso de dependencias
+
+        Evita que el borrado en cascada cargue en memoria todos los tickets.
+        Fuera de una transacción, cada lote se confirma por separado.
+
+        Args:
+            progress: función opcional progress(sección, eliminados_en_el_lote)
+        Retorna: dict {sección: registros eliminados}
+        """
+        deleted_counts = {}
+        with suppress_tombstones():
+            # El libro de caja primero: referencia los medios de pago y no cuenta en el progreso
+            for model in LEDGER_MODELS:
+                queryset = model.objects.filter(parking_lot_id=parking_lot_id)
+                while True:
+                    batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+                    if not batch:
+                        break
+                    model.objects.filter(pk__in=batch).delete()
+            for name, model, lookup in reversed(BACKUP_SECTIONS):
+                queryset = model.objects.filter(**{lookup: parking_lot_id})
+                deleted = 0
+                while True:
+                    batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+                    if not batch:
+                        break
+                    count = model.objects.filter(pk__in=batch).delete()[1].get(model._meta.label, 0)
+                    deleted += count
+                    if progress:
+                        progress(name, count)
+                deleted_counts[name] = deleted
+        return deleted_counts
+
+    @staticmethod
+    def count_parking_lot_data(parking_lot_id):
+        """Cantidad de registros por sección de un parqueadero"""
+        return {
+            name: model.objects.filter(**{lookup: parking_lot_id}).count()
+            for name, model, lookup in BACKUP_SECTIONS
+        }
+
+    @staticmethod
+    def restore_parking_lot_data(backup_file, overwrite=False):
         """
-        Restaura los datos de un parqueadero desde un backup
+        Restaura los datos de un parqueadero desde un archivo de backup completo
         
         Args:
-            backup_data: Diccionario con los datos del backup
+            backup_file: Archivo de backup (NDJSON con o sin gzip, o JSON 1.0)
+            overwrite: Si True, sobrescribe datos existentes
+        """
+        return BackupService.restore_backup_chain([backup_file], overwrite=overwrite)
+
+    @staticmethod
+    def restore_backup_chain(backup_files, overwrite=False):
+        """
+        Restaura un backup completo seguido de una cadena de backups incrementales
+
+        Cada incremental debe partir de la marca de agua del backup anterior
+        (o antes); sus registros se insertan o actualizan y sus eliminaciones se
+        aplican. Todo ocurre en una sola transacción.
+
+        Args:
+            backup_files: Archivos en orden: el completo primero
             overwrite: Si True, sobrescribe datos existentes
         """
         try:
-            from django.core import serializers
-            from django.db import transaction
-            
-            with transaction.atomic():
-                # Verificar metadata
-                if 'metadata' not in backup_data:
+            started = time.monotonic()
+
+            with transaction.atomic(), suppress_tombstones():
+                reader = BackupReader(backup_files[0])
+                if reader.is_incremental:
                     return {
                         'success': False,
-                        'error': 'Formato de backup inválido'
+                        'error': 'El primer backup de la cadena debe ser un backup completo'
                     }
-                
-                metadata = backup_data['metadata']
-                parking_lot_id = metadata.get('parking_lot_id')
-                
+                parking_lot_id = reader.header.get('parking_lot_id')
+                if not isinstance(parking_lot_id, int) or isinstance(parking_lot_id, bool):
+                    raise BackupFormatError('El backup no indica un parqueadero válido')
+
                 # Verificar si el parqueadero existe
                 parking_exists = ParkingLot.objects.filter(id=parking_lot_id).exists()
-                
+
                 if parking_exists and not overwrite:
                     return {
                         'success': False,
                         'error': 'El parqueadero ya existe. Use overwrite=True para sobrescribir.'
                     }
-                
-                # Restaurar datos
-                restored_counts = {}
-                
-                # Restaurar parqueadero
+
+                # Eliminar el parqueadero existente (y en cascada sus datos)
                 if overwrite and parking_exists:
-                    ParkingLot.objects.filter(id=parking_lot_id).delete()
-                
-                for obj in serializers.deserialize('json', json.dumps([backup_data['parking_lot']])):
-                    obj.save()
-                restored_counts['parking_lot'] = 1
-                
-                # Restaurar categorías
-                if overwrite:
-                    VehicleCategory.objects.filter(parking_lot_id=parking_lot_id).delete()
-                for obj in serializers.deserialize('json', json.dumps(backup_data['categories'])):
-                    obj.save()
-                restored_counts['categories'] = len(backup_data['categories'])
-                
-                # Restaurar tickets
-                if overwrite:
-                    ParkingTicket.objects.filter(parking_lot_id=parking_lot_id).delete()
-                for obj in serializers.deserialize('json', json.dumps(backup_data['tickets'])):
-                    obj.save()
-                restored_counts['tickets'] = len(backup_data['tickets'])
-                
-                # Restaurar clientes
-                if overwrite:
-                    Cliente.objects.filter(parking_lot_id=parking_lot_id).delete()
-                for obj in serializers.deserialize('json', json.dumps(backup_data['clientes'])):
-                    obj.save()
-                restored_counts['clientes'] = len(backup_data['clientes'])
-                
-                # Restaurar mensualidades
-                if overwrite:
-                    Mensualidad.objects.filter(parking_lot_id=parking_lot_id).delete()
-                for obj in serializers.deserialize('json', json.dumps(backup_data['mensualidades'])):
-                    obj.save()
-                restored_counts['mensualidades'] = len(backup_data['mensualidades'])
-                
-                # Restaurar métodos de pago
-                if overwrite:
-                    PaymentMethod.objects.filter(parking_lot_id=parking_lot_id).delete()
-                for obj in serializers.deserialize('json', json.dumps(backup_data['payment_methods'])):
-                    obj.save()
-                restored_counts['payment_methods'] = len(backup_data['payment_methods'])
-                
-                return {
-                    'success': True,
-                    'restored_counts': restored_counts,
-                    'parking_lot_name': metadata.get('parking_lot_name')
-                }
-                
+                    BackupService.delete_parking_lot_data(parking_lot_id)
+
+                restored_counts = {}
+                for name, model, records in reader.sections():
+                    objs = BackupService._deserialize_batch(model, records, parking_lot_id)
+                    restored_counts[name] = restored_counts.get(name, 0) + BackupService._insert_objects(model, objs)
+
+                # Aplicar los incrementales en orden
+                previous = reader
+                for backup_file in backup_files[1:]:
+                    reader = BackupReader(backup_file)
+                    if not reader.is_incremental or reader.header.get('parking_lot_id') != parking_lot_id:
+                        raise BackupFormatError('Los backups siguientes deben ser incrementales del mismo parqueadero')
+                    previous_watermark = previous.get_datetime('watermark')
+                    if previous_watermark is None or reader.get_datetime('since') > previous_watermark:
+                        raise BackupFormatError(
+                            f'Falta un backup en la cadena: el incremental parte de {reader.header["since"]}'
+                        )
+
+                    for name, model, records in reader.sections():
+                        if name == TOMBSTONE_SECTION[0]:
+                            count = BackupService._apply_tombstones(records, parking_lot_id)
+                        else:
+                            objs = BackupService._deserialize_batch(model, records, parking_lot_id)
+                            count = BackupService._upsert_objects(model, objs, parking_lot_id)
+                        restored_counts[name] = restored_counts.get(name, 0) + count
+                    previous = reader
+
+                # El libro de caja no viaja en el backup: se reconstruye desde los pagos
+                from .services import CashRegisterService
+                CashRegisterService.rebuild_ledger(parking_lot_id)
+
+                # Las categorías y medios de pago se insertaron sin señales
+                reference_cache.invalidate_parking_lot(parking_lot_id)
+                transaction.on_commit(lambda: reference_cache.invalidate_parking_lot(parking_lot_id))
+                # El snapshot de reportes describe los datos anteriores
+                transaction.on_commit(lambda: drop_snapshot(parking_lot_id))
+
+                # Ajustar las secuencias de ID tras insertar con PKs explícitas
+                sequence_sql = connection.ops.sequence_reset_sql(
+                    no_style(), [model for _, model, _ in BACKUP_SECTIONS]
+                )
+                if sequence_sql:
+                    with connection.cursor() as cursor:
+                        for sql in sequence_sql:
+                            cursor.execute(sql)
+
+            elapsed = time.monotonic() - started
+            total_rows = sum(restored_counts.values())
+
+            return {
+                'success': True,
+                'restored_counts': restored_counts,
+                'parking_lot_name': reader.header.get('parking_lot_name'),
+                'backups_applied': len(backup_files),
+                'watermark': reader.header.get('watermark'),
+                'total_rows': total_rows,
+                'elapsed': elapsed,
+                'rows_per_second': total_rows / elapsed if elapsed else total_rows,
+            }
+
         except Exception as e:
             return {
                 'success': False,
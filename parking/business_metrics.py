@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas de negocio por parqueadero: ocupación, entradas, salidas y recaudo
+
+Se actualizan al confirmar la transacción (transaction.on_commit) de cada
+entrada (VehicleEntryView), salida (TicketService.register_exit) y pago de
+mensualidad (mensualidad_pagar). Los contadores viven en el caché compartido
+y se incrementan con cache.incr, así que se suman entre todos los procesos
+de gunicorn.
+
+/metrics los exporta por parqueadero sin consultar la base de datos:
+- parking_vehicle_entries_total, parking_vehicle_exits_total (contadores)
+- parking_revenue_pesos_total{source="tickets"|"mensualidades"} (contador)
+- parking_mensualidad_payments_total (contador)
+- parking_occupancy (gauge: vehículos dentro)
+- parking_entries_last_minute, parking_exits_last_minute (gauges del último minuto completo)
+
+Si el caché se reinicia los contadores vuelven a cero (Prometheus lo trata
+como un reinicio del contador) y la ocupación se toma de nuevo de la base de
+datos en el siguiente evento del parqueadero.
+"""
+
+import logging
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Los contadores de cada minuto se conservan unos minutos para el scrape
+MINUTE_KEY_TIMEOUT = 10 * 60
+
+TENANT_COUNT_KEY = 'bm:tenant_count'
+
+COUNTERS = (
+    ('entries', 'parking_vehicle_entries_total', 'Entradas de vehículos registradas'),
+    ('exits', 'parking_vehicle_exits_total', 'Salidas de vehículos registradas'),
+    ('mensualidad_payments', 'parking_mensualidad_payments_total', 'Pagos de mensualidades registrados'),
+)
+REVENUE_SOURCES = ('tickets', 'mensualidades')
+PER_MINUTE = (
+    ('entries', 'parking_entries_last_minute', 'Entradas en el último minuto completo'),
+    ('exits', 'parking_exits_last_minute', 'Salidas en el último minuto completo'),
+)
+PER_MINUTE_COUNTERS = {name for name, _, _ in PER_MINUTE}
+
+
+def _key(parking_lot_id, name):
+    return f'bm:{parking_lot_id}:{name}'
+
+
+def _minute_key(parking_lot_id, name, minute):
+    return f'bm:{parking_lot_id}:{name}:m{minute}'
+
+
+def _incr(key, delta=1, timeout=None):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _seed_occupancy(parking_lot_id):
+    """
+    Ocupación inicial leída de la base de datos (fuera del scrape); ya incluye
+    el evento actual. Se guarda con add para no pisar los incrementos de otro
+    proceso que la haya creado antes.
+    """
+    from .models import ParkingTicket
+    occupancy = ParkingTicket.objects.filter(parking_lot_id=parking_lot_id, exit_time__isnull=True).count()
+    cache.add(_key(parking_lot_id, 'occupancy'), occupancy, None)
+
+
+def _register_tenant(parking_lot_id):
+    """
+    Agrega el parqueadero al índice que recorre el scrape
+    El índice es un contador atómico más una clave por posición, para no
+    perder altas concurrentes.
+    Retorna: True si el parqueadero se registró en esta llamada
+    """
+    if not cache.add(_key(parking_lot_id, 'registered'), 1, None):
+        return False
+    _seed_occupancy(parking_lot_id)
+    position = _incr(TENANT_COUNT_KEY)
+    cache.set(f'bm:tenant:{position}', parking_lot_id, None)
+    return True
+
+
+def _record(parking_lot_id, counter=None, occupancy_delta=0, revenue_source=None, amount=None):
+    try:
+        registered = _register_tenant(parking_lot_id)
+        if counter:
+            _incr(_key(parking_lot_id, counter))
+            if counter in PER_MINUTE_COUNTERS:
+                minute = int(time.time() // 60)
+                _incr(_minute_key(parking_lot_id, counter, minute), timeout=MINUTE_KEY_TIMEOUT)
+        if occupancy_delta and not registered:
+            try:
+                cache.incr(_key(parking_lot_id, 'occupancy'), occupancy_delta)
+            except ValueError:
+                # La clave expiró o salió del caché: se vuelve a leer con el evento incluido
+                _seed_occupancy(parking_lot_id)
+        if revenue_source and amount:
+            cents = int((Decimal(amount) * 100).to_integral_value())
+            _incr(_key(parking_lot_id, f'revenue_{revenue_source}_cents'), cents)
+    except Exception:
+        # Las métricas nunca deben afectar la operación
+        logger.exception('Error actualizando métricas del parqueadero %s', parking_lot_id)
+
+
+def record_entry(parking_lot_id):
+    """Registra una entrada cuando se confirma la transacción"""
+    transaction.on_commit(lambda: _record(parking_lot_id, 'entries', occupancy_delta=1))
+
+
+def record_exit(parking_lot_id, amount):
+    """Registra una salida y su cobro cuando se confirma la transacción"""
+    transaction.on_commit(
+        lambda: _record(parking_lot_id, 'exits', occupancy_delta=-1, revenue_source='tickets', amount=amount)
+    )
+
+
+def record_mensualidad_payment(parking_lot_id, amount):
+    """Registra el pago de una mensualidad cuando se confirma la transacción"""
+    transaction.on_commit(
+        lambda: _record(parking_lot_id, 'mensualidad_payments', revenue_source='mensualidades', amount=amount)
+    )
+
+
+def collect():
+    """
+    Valores actuales de todos los parqueaderos (dos lecturas del caché)
+    Retorna: dict {parking_lot_id: {métrica: valor}}
+    """
+    count = cache.get(TENANT_COUNT_KEY) or 0
+    positions = cache.get_many([f'bm:tenant:{position}' for position in range(1, count + 1)])
+    parking_lot_ids = sorted(set(positions.values()))
+
+    last_minute = int(time.time() // 60) - 1
+    keys = []
+    for parking_lot_id in parking_lot_ids:
+        keys += [_key(parking_lot_id, name) for name, _, _ in COUNTERS]
+        keys += [_key(parking_lot_id, f'revenue_{source}_cents') for source in REVENUE_SOURCES]
+        keys.append(_key(parking_lot_id, 'occupancy'))
+        keys += [_minute_key(parking_lot_id, name, last_minute) for name, _, _ in PER_MINUTE]
+    values = cache.get_many(keys)
+
+    result = {}
+    for parking_lot_id in parking_lot_ids:
+        metrics = {name: values.get(_key(parking_lot_id, name), 0) for name, _, _ in COUNTERS}
+        for source in REVENUE_SOURCES:
+            metrics[f'revenue_{source}'] = values.get(_key(parking_lot_id, f'revenue_{source}_cents'), 0) / 100
+        metrics['occupancy'] = values.get(_key(parking_lot_id, 'occupancy'), 0)
+        for name, _, _ in PER_MINUTE:
+            metrics[f'{name}_last_minute'] = values.get(_minute_key(parking_lot_id, name, last_minute), 0)
+        result[parking_lot_id] = metrics
+    return result
+
+
+def render():
+    """Texto en formato de exposición de Prometheus"""
+    data = collect()
+    lines = []
+
+    def family(name, help_text, metric_type, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        lines.extend(samples)
+
+    for key, name, help_text in COUNTERS:
+        family(name, help_text, 'counter', [
+            f'{name}{{parking_lot="{parking_lot_id}"}} {metrics[key]}' for parking_lot_id, metrics in data.items()
+        ])
+    family('parking_revenue_pesos_total', 'Recaudo registrado en pesos', 'counter', [
+        f'parking_revenue_pesos_total{{parking_lot="{parking_lot_id}",source="{source}"}} {metrics[f"revenue_{source}"]}'
+        for parking_lot_id, metrics in data.items() for source in REVENUE_SOURCES
+    ])
+    family('parking_occupancy', 'Vehículos dentro del parqueadero', 'gauge', [
+        f'parking_occupancy{{parking_lot="{parking_lot_id}"}} {metrics["occupancy"]}'
+        for parking_lot_id, metrics in data.items()
+    ])
+    for key, name, help_text in PER_MINUTE:
+        family(name, help_text, 'gauge', [
+            f'{name}{{parking_lot="{parking_lot_id}"}} {metrics[f"{key}_last_minute"]}'
+            for parking_lot_id, metrics in data.items()
+        ])
+    return '\n'.join(lines) + '\n'
@@ -3,7 +3,43 @@ from django.contrib.auth.models import User
 from .models import ParkingTicket, ParkingLot, VehicleCategory
 
 
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """
+    Selección entre datos de referencia en caché (ver parking/reference_cache.py)
+    Las opciones y la validación usan la instantánea, sin consultar la base de
+    datos; el valor limpio es la instancia del modelo (ref.to_model()).
+    """
+
+    def __init__(self, references=(), label_from_reference=str, **kwargs):
+        super().__init__(queryset=None, **kwargs)
+        self.set_references(references, label_from_reference)
+
+    def set_references(self, references, label_from_reference=None):
+        if label_from_reference is not None:
+            self.label_from_reference = label_from_reference
+        self.references = tuple(references)
+        choices = [(ref.id, self.label_from_reference(ref)) for ref in self.references]
+        if self.empty_label is not None:
+            choices.insert(0, ('', self.empty_label))
+        self.choices = choices
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            value = int(value.pk if hasattr(value, '_meta') else value)
+        except (TypeError, ValueError):
+            value = None
+        reference = next((ref for ref in self.references if ref.id == value), None)
+        if reference is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return reference.to_model()
+
+
 class ParkingTicketForm(forms.ModelForm):
+    # Las categorías del parqueadero las asigna la vista (VehicleEntryView.get_form)
+    category = ReferenceChoiceField(label='Categoría')
+
     class Meta:
         model = ParkingTicket
         fields = ['category', 'placa', 'color', 'marca', 'cascos']
@@ -25,6 +61,13 @@ class ParkingTicketForm(forms.ModelForm):
         self.fields['marca'].required = False
         self.fields['cascos'].required = False
 
+    def _get_validation_exclusions(self):
+        # La categoría ya la validó ReferenceChoiceField contra los datos en caché;
+        # la validación del modelo repetiría la consulta de la llave foránea
+        exclude = super()._get_validation_exclusions()
+        exclude.add('category')
+        return exclude
+
     def clean(self):
         cleaned_data = super().clean()
         category = cleaned_data.get('category')
@@ -136,8 +179,8 @@ class ParkingLotCreateForm(forms.Form):
         label='Confirmar Contraseña',
         widget=forms.PasswordInput(attrs={'class': 'form-input', 'placeholder': 'Repita la contraseña'})
     )
-    subscription_plan = forms.ModelChoiceField(
-        queryset=None,
+    subscription_plan = ReferenceChoiceField(
+        label_from_reference=lambda plan: f"{plan.name} - ${plan.price}",
         label='Plan de Suscripción',
         widget=forms.Select(attrs={'class': 'form-input', 'onchange': 'updatePlanInfo(this)'})
     )
@@ -150,8 +193,8 @@ class ParkingLotCreateForm(forms.Form):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        from .models import SubscriptionPlan
-        self.fields['subscription_plan'].queryset = SubscriptionPlan.objects.filter(is_active=True)
+        from .reference_cache import get_active_plans
+        self.fields['subscription_plan'].set_references(get_active_plans())
 
     def clean_email(self):
         email = self.cleaned_data.get('email')
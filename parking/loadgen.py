@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""
+Datos sintéticos multi-parqueadero para pruebas de carga
+
+Crea parqueaderos de prueba (empresa "Carga N", usuario dueño carga<N>) con
+categorías, medios de pago, clientes, mensualidades y tickets con
+distribuciones realistas:
+- entradas repartidas en `years` años con estacionalidad por hora del día
+  (picos de la mañana, el mediodía y la tarde) y menos tráfico el domingo
+- duración de la estadía log-normal (mediana de ~1.5 horas)
+- popularidad de las categorías tipo Zipf (pocas categorías concentran la
+  mayoría de los tickets)
+- unos pocos tickets abiertos por parqueadero, con placas únicas (respeta
+  unique_active_plate_per_parking)
+
+Los tickets no pasan por el ORM: cada lote se genera por columnas con NumPy
+y se escribe con COPY en PostgreSQL o con executemany en las demás bases de
+datos, sin ParkingTicket.save() (no se generan archivos de código de barras).
+Si la tabla de tickets está particionada, las particiones mensuales del
+rango se crean antes de cargar (ver parking/partitioning.py).
+"""
+
+import io
+import math
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import connection as default_connection, transaction
+from django.utils import timezone
+
+from . import partitioning, reference_cache
+from .models import (
+    Cliente, Mensualidad, ParkingLot, ParkingTicket, PaymentMethod, UserParkingLot, VehicleCategory,
+)
+from .services import CashRegisterService
+
+
+LOAD_PREFIX = 'carga'
+DEFAULT_PASSWORD = 'carga-benchmark-123'
+
+# Peso relativo de las entradas por hora del día (0-23)
+HOURLY_WEIGHTS = np.array([
+    0.2, 0.1, 0.1, 0.1, 0.2, 0.6, 2.0, 4.5, 5.0, 3.5, 2.8, 3.0,
+    4.0, 4.2, 3.2, 2.8, 3.0, 4.2, 4.8, 3.5, 2.2, 1.4, 0.8, 0.4,
+])
+# Peso relativo por día de la semana (lunes=0)
+WEEKDAY_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.05, 1.15, 0.9, 0.5])
+
+PAYMENT_METHODS = (
+    ('Efectivo', 'fa-money-bill-wave', 0.6),
+    ('Nequi', 'fa-mobile-alt', 0.2),
+    ('Tarjeta', 'fa-credit-card', 0.15),
+    ('Transferencia', 'fa-university', 0.05),
+)
+COLORS = np.array(['Blanco', 'Negro', 'Gris', 'Rojo', 'Azul', 'Plata'])
+BRANDS = np.array(['Chevrolet', 'Renault', 'Mazda', 'Kia', 'Toyota', 'Yamaha', 'Honda', 'AKT'])
+LETTERS = np.array(list('ABCDEFGHJKLMNPRSTUVWXYZ'))
+
+MONTHLY_RATE = 120000
+# Fracción de los tickets asociados a un cliente registrado
+CLIENTE_TICKET_SHARE = 0.1
+
+# Tickets por COPY/executemany (y por transacción)
+BATCH_SIZE = 50000
+
+# Columnas escritas directamente en la tabla de tickets
+TICKET_FIELDS = (
+    'parking_lot', 'ticket_id', 'category', 'cliente', 'placa', 'color', 'marca', 'cascos',
+    'entry_time', 'exit_time', 'amount_paid', 'payment_method', 'barcode', 'monthly_expiry',
+    'es_mensualidad', 'updated_at',
+)
+
+
+def username_for(index):
+    return f'{LOAD_PREFIX}{index}'
+
+
+def seeded_parking_lots():
+    """Parqueaderos creados por este módulo, en orden"""
+    return ParkingLot.objects.filter(user__username__startswith=LOAD_PREFIX).select_related('user').order_by('id')
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Permite asignar a mano los campos auto_now/auto_now_add (fechas históricas)"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def random_plates(rng, count):
+    """Placas con formato colombiano (AAA123), como arreglo de NumPy"""
+    letters = LETTERS[rng.integers(0, len(LETTERS), size=(count, 3))]
+    digits = np.char.zfill(rng.integers(0, 1000, size=count).astype('U3'), 3)
+    return np.char.add(np.ascontiguousarray(letters).view('U3').ravel(), digits)
+
+
+def unique_plates(rng, count):
+    plates = np.unique(random_plates(rng, count))
+    while len(plates) < count:
+        plates = np.unique(np.concatenate([plates, random_plates(rng, count - len(plates))]))
+    return rng.permutation(plates)
+
+
+def zipf_weights(count, exponent=1.1):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def create_tenant(index, password_hash, categories=20, cashiers=2):
+    """
+    Parqueadero de prueba con su dueño, cajeros, categorías y medios de pago
+    password_hash viene de make_password (se calcula una sola vez para todos)
+    """
+    admin_group, _ = Group.objects.get_or_create(name='Administrador')
+    vendedor_group, _ = Group.objects.get_or_create(name='Vendedor')
+
+    owner = User.objects.create(
+        username=username_for(index), email=f'{username_for(index)}@example.com', password=password_hash
+    )
+    owner.groups.add(admin_group)
+    parking_lot = ParkingLot.objects.create(
+        user=owner,
+        empresa=f'Carga {index}',
+        telefono='3000000000',
+        direccion=f'Calle {index}',
+        subscription_start=timezone.now().date(),
+        subscription_end=timezone.now().date() + timedelta(days=365),
+    )
+    for number in range(1, cashiers + 1):
+        cashier = User.objects.create(username=f'{username_for(index)}_cajero{number}', password=password_hash)
+        cashier.groups.add(vendedor_group)
+        UserParkingLot.objects.create(user=cashier, parking_lot=parking_lot)
+
+    hourly = [
+        VehicleCategory(
+            parking_lot=parking_lot,
+            name='Carros' if number == 0 else ('Motos' if number == 1 else f'Categoría {number}'),
+            first_hour_rate=(3000 if number != 1 else 1500) + (number % 7) * 500,
+            additional_hour_rate=(2000 if number != 1 else 1000) + (number % 5) * 250,
+        )
+        for number in range(categories)
+    ]
+    monthly = VehicleCategory(
+        parking_lot=parking_lot, name='Mensualidad Carros', is_monthly=True, monthly_rate=MONTHLY_RATE,
+        first_hour_rate=0, additional_hour_rate=0,
+    )
+    VehicleCategory.objects.bulk_create(hourly + [monthly], batch_size=5000)
+    PaymentMethod.objects.bulk_create([
+        PaymentMethod(parking_lot=parking_lot, nombre=nombre, icono=icono, orden=orden)
+        for orden, (nombre, icono, _) in enumerate(PAYMENT_METHODS)
+    ])
+    # bulk_create no envía señales
+    reference_cache.invalidate_parking_lot(parking_lot.id)
+    return parking_lot
+
+
+def create_clientes(parking_lot, count, rng):
+    if not count:
+        return
+    plates = random_plates(rng, count)
+    documents = rng.integers(10_000_000, 1_999_999_999, size=count)
+    Cliente.objects.bulk_create([
+        Cliente(
+            parking_lot=parking_lot,
+            nombre=f'Cliente {number}',
+            documento=str(document),
+            telefono=f'3{document % 1_000_000_000:09d}',
+            placa=str(plate),
+        )
+        for number, (plate, document) in enumerate(zip(plates, documents), start=1)
+    ], batch_size=5000)
+
+
+def create_mensualidades(parking_lot, rng, share, months, now=None):
+    """
+    Historial de mensualidades para una fracción de los clientes
+    Meses consecutivos pagados; la del mes actual queda pendiente en ~20%.
+    Retorna: número de mensualidades creadas
+    """
+    now = now or timezone.now()
+    cliente_ids = list(Cliente.objects.filter(parking_lot=parking_lot).values_list('id', flat=True))
+    category = VehicleCategory.objects.filter(parking_lot=parking_lot, is_monthly=True).first()
+    payment_ids = list(PaymentMethod.objects.filter(parking_lot=parking_lot).values_list('id', flat=True))
+    if not cliente_ids or category is None or months <= 0:
+        return 0
+
+    chosen = rng.choice(cliente_ids, size=int(len(cliente_ids) * share), replace=False)
+    today = timezone.localtime(now).date()
+    mensualidades = []
+    for cliente_id, length, pending in zip(
+        chosen, rng.integers(1, months + 1, size=len(chosen)), rng.random(len(chosen)) < 0.2
+    ):
+        length = int(length)
+        for offset in range(length):
+            fecha_inicio = today - timedelta(days=30 * (length - 1 - offset))
+            paid_at = timezone.make_aware(datetime.combine(fecha_inicio, time(9)))
+            estado = 'PENDIENTE' if offset == length - 1 and pending else 'PAGADO'
+            mensualidades.append(Mensualidad(
+                parking_lot=parking_lot,
+                cliente_id=int(cliente_id),
+                category=category,
+                fecha_inicio=fecha_inicio,
+                fecha_vencimiento=fecha_inicio + timedelta(days=30),
+                monto=MONTHLY_RATE,
+                estado=estado,
+                fecha_pago=paid_at if estado == 'PAGADO' else None,
+                payment_method_id=payment_ids[0] if estado == 'PAGADO' and payment_ids else None,
+                created_at=paid_at,
+                updated_at=paid_at,
+            ))
+    with explicit_timestamps(Mensualidad):
+        Mensualidad.objects.bulk_create(mensualidades, batch_size=5000)
+    return len(mensualidades)
+
+
+def entry_times(rng, count, years, now):
+    """Entradas con estacionalidad por hora y día de la semana (segundos epoch)"""
+    days = int(years * 365)
+    start_day = timezone.localtime(now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    day_offsets = np.arange(days)
+    weekday_of_offset = (start_day.weekday() + day_offsets) % 7
+    # Crecimiento suave del tráfico en el tiempo
+    day_weights = WEEKDAY_WEIGHTS[weekday_of_offset] * np.linspace(0.7, 1.0, days)
+    chosen_days = rng.choice(days, size=count, p=day_weights / day_weights.sum())
+    hours = rng.choice(24, size=count, p=HOURLY_WEIGHTS / HOURLY_WEIGHTS.sum())
+    seconds = rng.integers(0, 3600, size=count)
+    return int(start_day.timestamp()) + chosen_days * 86400 + hours * 3600 + seconds
+
+
+class TicketWriter:
+    """
+    Genera tickets de un parqueadero por columnas y los escribe en lote
+
+    Cada columna se arma como arreglo de texto con NumPy; las filas solo se
+    unen al final (una línea de COPY o una tupla de executemany).
+    """
+
+    def __init__(self, parking_lot, rng, years, now=None, connection=None):
+        self.connection = connection or default_connection
+        self.copy = self.connection.vendor == 'postgresql'
+        self.null = r'\N' if self.copy else None
+        self.false = 'f' if self.copy else '0'
+        self.parking_lot_id = str(parking_lot.pk)
+        self.rng = rng
+        self.years = years
+        self.now = now or timezone.now()
+
+        categories = list(VehicleCategory.objects.filter(parking_lot=parking_lot, is_monthly=False).order_by('id'))
+        self.category_ids = np.array([str(category.pk) for category in categories])
+        self.first_rates = np.array([float(category.first_hour_rate) for category in categories])
+        self.additional_rates = np.array([float(category.additional_hour_rate) for category in categories])
+        self.category_weights = zipf_weights(len(categories))
+        methods = list(PaymentMethod.objects.filter(parking_lot=parking_lot).order_by('orden'))
+        self.payment_ids = np.array([str(method.pk) for method in methods])
+        weights = np.array([weight for _, _, weight in PAYMENT_METHODS[:len(methods)]])
+        self.payment_weights = weights / weights.sum()
+        self.cliente_ids = np.array(
+            [str(pk) for pk in Cliente.objects.filter(parking_lot=parking_lot).values_list('id', flat=True)]
+        )
+
+        meta = ParkingTicket._meta
+        self.table = meta.db_table
+        self.columns = [meta.get_field(name).column for name in TICKET_FIELDS]
+
+    def timestamps(self, seconds):
+        """Epoch (UTC) como texto: timestamptz para COPY, 'AAAA-MM-DD HH:MM:SS' UTC en las demás"""
+        text = np.datetime_as_string(seconds.astype('datetime64[s]'), unit='s')
+        if self.copy:
+            return np.char.add(text, '+00')
+        return np.char.replace(text, 'T', ' ')
+
+    def uuids(self, count):
+        hexes = self.rng.bytes(16 * count).hex()
+        return [hexes[position:position + 32] for position in range(0, 32 * count, 32)]
+
+    def constant(self, value, count):
+        return np.full(count, value, dtype=object)
+
+    def categories(self, count):
+        index = self.rng.choice(len(self.category_ids), size=count, p=self.category_weights)
+        return index, self.category_ids[index]
+
+    def closed_rows(self, count):
+        """Tickets cerrados y cobrados, repartidos en la historia"""
+        rng = self.rng
+        # En orden cronológico: cada partición mensual y los índices por fecha
+        # reciben filas contiguas en lugar de inserciones al azar
+        entries = np.sort(entry_times(rng, count, self.years, self.now))
+        durations = np.minimum(rng.lognormal(mean=math.log(1.5), sigma=0.9, size=count), 72.0)
+        exits = np.minimum(entries + (durations * 3600).astype(np.int64), int(self.now.timestamp()) - 60)
+        category_index, category_ids = self.categories(count)
+        # Tarifa por horas como ParkingTicket.calculate_fee
+        extra_hours = np.ceil(np.maximum((exits - entries) / 3600 - 1, 0))
+        amounts = self.first_rates[category_index] + extra_hours * self.additional_rates[category_index]
+
+        clientes = self.constant(self.null, count)
+        if len(self.cliente_ids):
+            linked = rng.random(count) < CLIENTE_TICKET_SHARE
+            clientes[linked] = self.cliente_ids[rng.integers(0, len(self.cliente_ids), size=linked.sum())]
+        exit_text = self.timestamps(exits)
+        return zip(
+            self.constant(self.parking_lot_id, count),
+            self.uuids(count),
+            category_ids,
+            clientes,
+            random_plates(rng, count),
+            COLORS[rng.integers(0, len(COLORS), size=count)],
+            BRANDS[rng.integers(0, len(BRANDS), size=count)],
+            self.constant(self.null, count),
+            self.timestamps(entries),
+            exit_text,
+            amounts.astype(np.int64).astype('U12'),
+            self.payment_ids[rng.choice(len(self.payment_ids), size=count, p=self.payment_weights)],
+            self.constant('', count),
+            self.constant(self.null, count),
+            self.constant(self.false, count),
+            exit_text,
+        )
+
+    def open_rows(self, count):
+        """Vehículos dentro del parqueadero en este momento, con placas únicas"""
+        entries = int(self.now.timestamp()) - self.rng.integers(5 * 60, 8 * 3600, size=count)
+        _, category_ids = self.categories(count)
+        entry_text = self.timestamps(entries)
+        nulls = self.constant(self.null, count)
+        return zip(
+            self.constant(self.parking_lot_id, count),
+            self.uuids(count),
+            category_ids,
+            nulls,
+            unique_plates(self.rng, count),
+            self.constant(str(COLORS[0]), count),
+            self.constant(str(BRANDS[0]), count),
+            nulls,
+            entry_text,
+            nulls,
+            nulls,
+            nulls,
+            self.constant('', count),
+            nulls,
+            self.constant(self.false, count),
+            entry_text,
+        )
+
+    def skip_fk_checks(self):
+        """
+        Solo un superusuario de PostgreSQL puede omitir los triggers de FK, que
+        se ejecutan fila por fila y dominan el tiempo de la carga. Los ids de
+        categoría, cliente y medio de pago salen del mismo parqueadero.
+        """
+        if not hasattr(self, '_skip_fk_checks'):
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT rolsuper FROM pg_roles WHERE rolname = current_user')
+                self._skip_fk_checks = bool(cursor.fetchone()[0])
+        return self._skip_fk_checks
+
+    def write(self, rows):
+        with transaction.atomic(using=self.connection.alias), self.connection.cursor() as cursor:
+            if self.copy:
+                cursor.execute('SET LOCAL synchronous_commit = off')
+                if self.skip_fk_checks():
+                    cursor.execute('SET LOCAL session_replication_role = replica')
+                buffer = io.StringIO(''.join('\t'.join(row) + '\n' for row in rows))
+                cursor.copy_expert(f'COPY {self.table} ({", ".join(self.columns)}) FROM STDIN', buffer)
+            else:
+                quote = self.connection.ops.quote_name
+                cursor.executemany(
+                    f'INSERT INTO {quote(self.table)} ({", ".join(map(quote, self.columns))}) '
+                    f'VALUES ({", ".join(["%s"] * len(self.columns))})',
+                    list(rows),
+                )
+
+
+def ensure_history_partitions(years, now=None, connection=None):
+    """
+    Particiones mensuales para toda la historia generada, si la tabla está particionada
+    Así los tickets no caen en la partición DEFAULT.
+    Retorna: número de particiones creadas
+    """
+    connection = connection or default_connection
+    if not partitioning.is_supported(connection) or not partitioning.is_partitioned(connection):
+        return 0
+    now = now or timezone.now()
+    month = partitioning.month_start(now - timedelta(days=int(years * 365) + 1))
+    last = partitioning.month_start(now)
+    created = 0
+    while month <= last:
+        created += partitioning.create_partition(month, connection=connection)
+        month = partitioning.add_months(month, 1)
+    return created
+
+
+def create_tickets(parking_lot, count, years, rng, open_tickets=20, now=None, batch_size=BATCH_SIZE):
+    """
+    Tickets históricos cerrados más `open_tickets` abiertos
+    Retorna: número de tickets creados
+    """
+    writer = TicketWriter(parking_lot, rng, years, now=now)
+    for offset in range(0, count, batch_size):
+        writer.write(writer.closed_rows(min(batch_size, count - offset)))
+    if open_tickets:
+        writer.write(writer.open_rows(open_tickets))
+    return count + open_tickets
+
+
+def seed_tenants(tenants, categories=20, clientes=500, tickets=10000, years=2, open_tickets=20,
+                 cashiers=2, mensualidades=0.2, password=DEFAULT_PASSWORD, seed=42, batch_size=BATCH_SIZE,
+                 log=None):
+    """
+    Crea `tenants` parqueaderos de prueba a continuación de los existentes
+    mensualidades: fracción de los clientes con historial de mensualidades
+    Retorna: lista de parqueaderos creados
+    """
+    start = seeded_parking_lots().count() + 1
+    # Con la misma semilla, cada nueva tanda de parqueaderos genera datos distintos
+    rng = np.random.default_rng([seed, start])
+    password_hash = make_password(password)
+    now = timezone.now()
+    ensure_history_partitions(years, now=now)
+    created = []
+    for index in range(start, start + tenants):
+        with transaction.atomic():
+            parking_lot = create_tenant(index, password_hash, categories=categories, cashiers=cashiers)
+            create_clientes(parking_lot, clientes, rng)
+            monthly = create_mensualidades(parking_lot, rng, mensualidades, months=min(int(years * 12), 24), now=now)
+        total = create_tickets(parking_lot, tickets, years, rng, open_tickets=open_tickets, now=now,
+                               batch_size=batch_size)
+        # Los tickets y mensualidades se insertan sin pasar por el cobro: el libro de caja se arma al final
+        CashRegisterService.rebuild_ledger(parking_lot.id)
+        created.append(parking_lot)
+        if log:
+            log(f'Parqueadero {parking_lot.id} ({parking_lot.empresa}): {categories} categorías, '
+                f'{clientes} clientes, {monthly} mensualidades, {total} tickets')
+    return created
@@ -0,0 +1,58 @@
+"""
+Comando de gestión para archivar los tickets cerrados antiguos
+Mueve por lotes a la tabla de archivo los tickets que salieron hace más de
+TICKET_ARCHIVE_AFTER_DAYS días (o --older-than-days), para que la tabla de
+tickets activa solo tenga la actividad reciente.
+Uso: python manage.py archive_tickets [--parking-lot ID] [--older-than-days N] [--dry-run]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from parking.archive_service import ARCHIVE_BATCH_SIZE, TicketArchiveService
+from parking.models import ParkingLot
+
+
+class Command(BaseCommand):
+    help = 'Archiva los tickets cerrados antiguos de los parqueaderos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parking-lot', type=int, help='ID del parqueadero (por defecto todos)')
+        parser.add_argument('--older-than-days', type=int, help='Antigüedad mínima en días desde la salida')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Tickets por transacción')
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra cuántos tickets se archivarían')
+
+    def handle(self, *args, **options):
+        kwargs = {
+            'older_than_days': options['older_than_days'],
+            'batch_size': options['batch_size'],
+            'dry_run': options['dry_run'],
+        }
+
+        if options['parking_lot']:
+            if not ParkingLot.objects.filter(id=options['parking_lot']).exists():
+                raise CommandError(f'No existe el parqueadero {options["parking_lot"]}')
+            results = {
+                options['parking_lot']: TicketArchiveService.archive_parking_lot(options['parking_lot'], **kwargs)
+            }
+        else:
+            results = TicketArchiveService.archive_all(**kwargs)
+
+        verb = 'por archivar' if options['dry_run'] else 'archivados'
+        total = 0
+        failed = False
+        for parking_lot_id, result in results.items():
+            total += result['archived']
+            if result['success']:
+                self.stdout.write(f'  Parqueadero {parking_lot_id}: {result["archived"]} tickets {verb}')
+            else:
+                failed = True
+                self.stdout.write(self.style.ERROR(
+                    f'  Parqueadero {parking_lot_id}: error después de {result["archived"]} tickets: {result["error"]}'
+                ))
+
+        cutoff = next(iter(results.values()))['cutoff'] if results else None
+        message = f'✓ {total} tickets {verb}'
+        if cutoff:
+            message += f' (salida antes de {timezone.localtime(cutoff):%Y-%m-%d %H:%M})'
+        if failed:
+            raise CommandError(f'{total} tickets {verb}; algunos parqueaderos fallaron')
+        self.stdout.write(self.style.SUCCESS(message))
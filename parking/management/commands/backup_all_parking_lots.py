@@ -0,0 +1,123 @@
+"""
+Comando de gestión para respaldar todos los parqueaderos en paralelo
+Exporta cada parqueadero (formato NDJSON + gzip) con un pool de procesos,
+en un directorio por fecha, y aplica la política de retención (también a
+las marcas de eliminación que ya no necesita ningún backup conservado).
+Si la ejecución se interrumpe, al repetirla el mismo día (o con --date)
+solo se respaldan los parqueaderos pendientes.
+Uso: python manage.py backup_all_parking_lots [--workers N] [--keep-daily N] [--keep-weekly M]
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from parking import backup_runner
+from parking.models import ParkingLot
+import multiprocessing
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Respalda todos los parqueaderos en paralelo con política de retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'backups', 'tenants'),
+            help='Directorio raíz de los backups',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Procesos en paralelo (por defecto min(4, CPUs))',
+        )
+        parser.add_argument('--keep-daily', type=int, default=7, help='Backups diarios a conservar')
+        parser.add_argument('--keep-weekly', type=int, default=4, help='Backups semanales a conservar')
+        parser.add_argument(
+            '--date',
+            type=date.fromisoformat,
+            help='Fecha de la ejecución a crear o reanudar (por defecto hoy)',
+        )
+
+    def handle(self, *args, **options):
+        root = options['output_dir']
+        run_date = options.get('date') or timezone.localdate()
+        run_dir = backup_runner.get_run_dir(root, run_date)
+        os.makedirs(run_dir, exist_ok=True)
+
+        summary = backup_runner.load_summary(run_dir)
+        parking_lot_ids = list(ParkingLot.objects.order_by('id').values_list('id', flat=True))
+
+        pending = []
+        for parking_lot_id in parking_lot_ids:
+            if os.path.exists(backup_runner.get_backup_path(run_dir, parking_lot_id)):
+                continue
+            pending.append(parking_lot_id)
+
+        skipped = len(parking_lot_ids) - len(pending)
+        self.stdout.write(
+            f'{len(parking_lot_ids)} parqueaderos: {skipped} ya respaldados, {len(pending)} pendientes '
+            f'({options["workers"]} procesos) → {run_dir}'
+        )
+
+        started = time.monotonic()
+        failures = 0
+        if pending:
+            # Los procesos hijos no deben heredar conexiones abiertas
+            connections.close_all()
+            context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+
+            with ProcessPoolExecutor(
+                max_workers=max(1, options['workers']),
+                mp_context=context,
+                initializer=backup_runner.init_worker,
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        backup_runner.backup_parking_lot,
+                        parking_lot_id,
+                        backup_runner.get_backup_path(run_dir, parking_lot_id),
+                    ): parking_lot_id
+                    for parking_lot_id in pending
+                }
+                for future in as_completed(futures):
+                    parking_lot_id = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'parking_lot_id': parking_lot_id, 'success': False, 'error': str(e), 'size': 0, 'elapsed': 0}
+
+                    summary['tenants'][str(parking_lot_id)] = result
+                    backup_runner.save_summary(run_dir, summary)
+
+                    if result['success']:
+                        self.stdout.write(self.style.SUCCESS(
+                            f'✓ Parqueadero {parking_lot_id}: {result["size"] / (1024 * 1024):.2f} MB '
+                            f'en {result["elapsed"]:.2f}s'
+                        ))
+                    else:
+                        failures += 1
+                        self.stdout.write(self.style.ERROR(f'✗ Parqueadero {parking_lot_id}: {result["error"]}'))
+
+        wall_time = time.monotonic() - started
+        summary['last_run_wall_time'] = wall_time
+        summary['completed'] = failures == 0
+        backup_runner.save_summary(run_dir, summary)
+
+        removed = backup_runner.apply_retention(root, options['keep_daily'], options['keep_weekly'], today=run_date)
+        for run_path in removed:
+            self.stdout.write(f'  Eliminado por retención: {run_path}')
+        pruned = backup_runner.prune_tombstones(root)
+        if pruned:
+            self.stdout.write(f'  Marcas de eliminación depuradas: {pruned}')
+
+        tenant_time = sum(result['elapsed'] for result in summary['tenants'].values())
+        self.stdout.write(self.style.SUCCESS(
+            f'\nBackups terminados en {wall_time:.2f}s de reloj '
+            f'({tenant_time:.2f}s sumando parqueaderos, {failures} errores)'
+        ))
@@ -0,0 +1,123 @@
+"""
+Comando de gestión para medir la latencia de las consultas de tickets
+Mide los reportes por rango de exit_time, la búsqueda de un vehículo activo y
+el registro de una salida (en una transacción que se revierte), para comparar
+la tabla de tickets normal con la particionada por mes.
+Uso: python manage.py benchmark_ticket_queries [--parking-lot ID] [--iterations N]
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from parking.models import ParkingLot, ParkingTicket
+from parking.partitioning import is_partitioned, list_partitions
+from parking.services import TicketService
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de reportes y salidas sobre la tabla de tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parking-lot', type=int, help='ID del parqueadero (por defecto el primero)')
+        parser.add_argument('--iterations', type=int, default=20, help='Repeticiones por consulta')
+
+    def handle(self, *args, **options):
+        parking_lot = ParkingLot.objects.order_by('id')
+        if options['parking_lot']:
+            parking_lot = parking_lot.filter(id=options['parking_lot'])
+        parking_lot = parking_lot.first()
+        if parking_lot is None:
+            raise CommandError('No hay parqueaderos')
+
+        iterations = options['iterations']
+        now = timezone.now()
+        month_start = timezone.localtime(now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+        ranges = {
+            'reporte_7_dias': (now - timedelta(days=7), now),
+            'reporte_mes_anterior': (last_month_start, month_start - timedelta(microseconds=1)),
+            'reporte_12_meses': (now - timedelta(days=365), now),
+        }
+
+        open_ids = list(ParkingTicket.objects.filter(
+            parking_lot=parking_lot, exit_time__isnull=True
+        ).values_list('id', 'placa')[:500])
+        if not open_ids:
+            raise CommandError('El parqueadero no tiene tickets abiertos para medir salidas')
+
+        layout = 'tabla normal'
+        if is_partitioned():
+            layout = f'particionada ({len(list_partitions())} particiones mensuales)'
+        self.stdout.write(f'Parqueadero {parking_lot.id} - {connection.vendor}, {layout}')
+
+        results = {}
+        for name, (start, end) in ranges.items():
+            results[name] = self.measure(iterations, lambda: self.report(parking_lot, start, end))
+        results['vehiculo_activo'] = self.measure(
+            iterations, lambda: self.active_lookup(parking_lot, random.choice(open_ids)[1])
+        )
+        results['registrar_salida'] = self.measure(
+            iterations, lambda: self.register_exit(parking_lot, random.choice(open_ids)[0])
+        )
+
+        self.stdout.write(f'{"consulta":<24}{"mediana ms":>12}{"p95 ms":>10}{"máx ms":>10}')
+        for name, timings in results.items():
+            timings = sorted(timings)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f'{name:<24}{statistics.median(timings):>12.2f}{p95:>10.2f}{timings[-1]:>10.2f}'
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark completado'))
+
+    def measure(self, iterations, func):
+        func()  # calentamiento
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def report(self, parking_lot, start, end):
+        """Consultas agregadas del reporte (mismas que ReportView en vivo)"""
+        tickets = ParkingTicket.objects.filter(
+            parking_lot=parking_lot,
+            exit_time__isnull=False,
+            exit_time__range=(start, end)
+        ).exclude(amount_paid__isnull=True)
+        tickets.aggregate(
+            total_vehicles=Count('id'),
+            total_revenue=Sum('amount_paid'),
+            avg_duration=Avg(F('exit_time') - F('entry_time')),
+        )
+        list(tickets.values('category__name').annotate(count=Count('id'), revenue=Sum('amount_paid')))
+        list(tickets.annotate(date=TruncDate('exit_time')).values('date').annotate(
+            count=Count('id'), revenue=Sum('amount_paid')
+        ))
+        list(tickets.values('payment_method__nombre').annotate(count=Count('id'), total=Sum('amount_paid')))
+
+    def active_lookup(self, parking_lot, placa):
+        """Búsqueda del vehículo activo en la salida"""
+        return ParkingTicket.objects.select_related('category', 'parking_lot').filter(
+            parking_lot=parking_lot,
+            placa__iexact=placa,
+            exit_time__isnull=True
+        ).first()
+
+    def register_exit(self, parking_lot, ticket_id):
+        """Registro de salida como en print_exit_ticket, revertido al final"""
+        with transaction.atomic():
+            ticket = ParkingTicket.objects.select_for_update().select_related('category', 'parking_lot').get(
+                id=ticket_id,
+                parking_lot=parking_lot,
+                exit_time__isnull=True
+            )
+            TicketService.register_exit(ticket)
+            transaction.set_rollback(True)
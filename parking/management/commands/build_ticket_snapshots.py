@@ -0,0 +1,43 @@
+"""
+Comando de gestión para construir los snapshots de analítica de tickets
+Pensado para ejecutarse cada noche (cron): agrega de forma incremental los
+tickets cerrados desde la última marca de agua de cada parqueadero.
+Uso: python manage.py build_ticket_snapshots [--parking-lot ID] [--rebuild]
+"""
+from django.core.management.base import BaseCommand
+from parking.analytics import TicketSnapshotBuilder
+from parking.models import ParkingLot
+import time
+
+
+class Command(BaseCommand):
+    help = 'Construye o extiende los snapshots columnares de tickets por parqueadero'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--parking-lot',
+            type=int,
+            help='ID del parqueadero (por defecto todos)',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Descarta el snapshot existente y lo reconstruye desde cero',
+        )
+
+    def handle(self, *args, **options):
+        parking_lots = ParkingLot.objects.all().order_by('id')
+        if options.get('parking_lot'):
+            parking_lots = parking_lots.filter(id=options['parking_lot'])
+
+        for parking_lot in parking_lots:
+            started = time.monotonic()
+            result = TicketSnapshotBuilder(parking_lot.id).build(rebuild=options['rebuild'])
+            elapsed = time.monotonic() - started
+
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {parking_lot.empresa}: +{result["rows_added"]} tickets '
+                f'({result["rows"]} en total, cubierto hasta {result["covered_until"]}) en {elapsed:.2f}s'
+            ))
+
+        self.stdout.write(self.style.SUCCESS('\nSnapshots actualizados'))
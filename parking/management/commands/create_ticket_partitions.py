@@ -0,0 +1,36 @@
+"""
+Comando de gestión para crear las particiones mensuales futuras de tickets
+Pensado para ejecutarse cada mes (cron) cuando la tabla de tickets está
+particionada. Si la partición DEFAULT tiene tickets de un mes nuevo, se
+mueven a su partición.
+Uso: python manage.py create_ticket_partitions [--months-ahead N]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from parking.partitioning import PartitioningError, ensure_future_partitions, get_months_ahead, list_partitions
+
+
+class Command(BaseCommand):
+    help = 'Crea las particiones mensuales de tickets de los próximos meses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=get_months_ahead(),
+            help='Meses futuros con partición creada de antemano',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            created = ensure_future_partitions(months_ahead=options['months_ahead'])
+        except PartitioningError as e:
+            raise CommandError(str(e))
+
+        for name in created:
+            self.stdout.write(f'  Creada {name}')
+
+        partitions = list_partitions()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(created)} particiones creadas; hay {len(partitions)} particiones mensuales '
+            f'(hasta {partitions[-1]["month"]:%Y-%m})'
+        ))
@@ -0,0 +1,73 @@
+"""
+Comando de gestión para exportar el backup de un parqueadero a un archivo
+Genera el mismo formato NDJSON comprimido que la descarga del panel de superadmin.
+Con --base (o --since) genera un backup incremental con los cambios posteriores
+a la marca de agua del backup anterior.
+Uso: python manage.py export_parking_lot_backup --parking-lot ID [--output RUTA]
+         [--base BACKUP_ANTERIOR | --since AAAA-MM-DDTHH:MM:SS+00:00]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from parking.backup_service import BackupService, BackupReader
+from datetime import datetime
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Exporta el backup comprimido (NDJSON + gzip) de un parqueadero'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parking-lot', type=int, required=True, help='ID del parqueadero')
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Ruta del archivo (por defecto backups/parking_lot_<id>_<fecha>.ndjson.gz)',
+        )
+        parser.add_argument(
+            '--base',
+            type=str,
+            help='Backup anterior (completo o incremental) desde cuya marca de agua se exportan los cambios',
+        )
+        parser.add_argument(
+            '--since',
+            type=datetime.fromisoformat,
+            help='Marca de agua explícita (ISO 8601 con zona horaria) para un backup incremental',
+        )
+
+    def get_since(self, options):
+        if options.get('since'):
+            return options['since']
+        if not options.get('base'):
+            return None
+
+        with open(options['base'], 'rb') as base_file:
+            reader = BackupReader(base_file)
+            if reader.header.get('parking_lot_id') != options['parking_lot']:
+                raise CommandError('El backup base pertenece a otro parqueadero')
+            watermark = reader.get_datetime('watermark')
+        if watermark is None:
+            raise CommandError('El backup base no tiene marca de agua (formato anterior)')
+        return watermark
+
+    def handle(self, *args, **options):
+        parking_lot_id = options['parking_lot']
+        since = self.get_since(options)
+        output = options.get('output')
+        if not output:
+            backup_dir = os.path.join(settings.BASE_DIR, 'backups')
+            os.makedirs(backup_dir, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            kind = 'incr' if since else 'full'
+            output = os.path.join(backup_dir, f'parking_lot_{parking_lot_id}_{timestamp}_{kind}.ndjson.gz')
+
+        started = time.monotonic()
+        result = BackupService.write_parking_lot_backup(parking_lot_id, output, since=since)
+        if not result['success']:
+            raise CommandError(result['error'])
+
+        size_mb = result['size'] / (1024 * 1024)
+        kind = f'incremental desde {since.isoformat()}' if since else 'completo'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Backup {kind} creado: {result["path"]} ({size_mb:.2f} MB en {time.monotonic() - started:.2f}s)'
+        ))
@@ -0,0 +1,292 @@
+"""
+Comando de gestión para la prueba de concurrencia de la portería
+En cada ronda, N cajeros (hilos con su propia sesión y conexión a la base de
+datos) envían a la vez:
+- entrada: la misma placa a /entry/; la restricción
+  unique_active_plate_per_parking debe dejar un solo ticket abierto
+- salida: el mismo ticket a /print-exit-ticket/; select_for_update y
+  exit_time__isnull=True deben dejar un solo cobro
+
+Verifica en cada ronda que haya exactamente un ganador y que la base de datos
+quede consistente, y reporta la latencia, el tiempo esperando bloqueos (las
+sentencias que toman el bloqueo del ticket, solo en proceso) y el throughput.
+Usa un parqueadero de prueba propio que se elimina al terminar.
+Uso: python manage.py gate_stress [--workers 16] [--rounds 50] [--races entry,exit]
+         [--url http://127.0.0.1:8000] [--keep]
+"""
+import json
+import logging
+import random
+import string
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from parking import loadgen
+from parking.management.commands.load_benchmark import HTTPSession, InProcessSession
+from parking.models import ParkingTicket, PaymentMethod, UserParkingLot, VehicleCategory
+
+
+RACES = ('entry', 'exit')
+
+# Sentencias que esperan el bloqueo del ticket o de la placa
+LOCKING_SQL = (
+    'FOR UPDATE', 'BEGIN IMMEDIATE', 'INSERT INTO "parking_parkingticket"', 'UPDATE "parking_parkingticket"',
+)
+# Los perdedores de cada carrera generan errores esperados en estos logs
+QUIET_LOGGERS = ('django.request', 'parking.views')
+
+
+class LockRecorder:
+    """execute_wrapper que suma el tiempo de las sentencias que toman bloqueos"""
+
+    def __init__(self):
+        self.lock_wait = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if any(marker in sql for marker in LOCKING_SQL):
+                self.lock_wait += time.perf_counter() - start
+
+
+class Worker(threading.Thread):
+    """Un cajero: espera la señal de cada ronda y envía la petición de la carrera"""
+
+    def __init__(self, number, session, user, password, barrier, stress):
+        super().__init__(name=f'porteria-{number}', daemon=True)
+        self.session = session
+        self.user = user
+        self.password = password
+        self.barrier = barrier
+        self.stress = stress
+        self.result = None
+        self.login_error = None
+
+    def run(self):
+        try:
+            try:
+                self.session.login(self.user, self.password)
+            except Exception as exception:
+                self.login_error = str(exception)
+            while True:
+                self.barrier.wait()
+                task = self.stress.task
+                if task is None:
+                    return
+                self.result = None if self.login_error else self.attempt(*task)
+                self.barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            connections.close_all()
+
+    def attempt(self, race, data):
+        recorder = LockRecorder()
+        path = '/entry/' if race == 'entry' else '/print-exit-ticket/'
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                status, body = self.session.request('POST', path, data, ajax=True)
+        except Exception as exception:
+            status, body = None, f'{type(exception).__name__}: {exception}'.encode()
+        elapsed = time.perf_counter() - start
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = {}
+        if status == 200 and payload.get('success'):
+            outcome = 'win'
+        elif status is not None and status < 500:
+            # Perdió la carrera: error de validación, restricción o ticket ya cobrado
+            outcome = 'loss'
+        else:
+            outcome = 'error'
+        return {
+            'outcome': outcome,
+            'status': status,
+            'ms': elapsed * 1000,
+            'lock_ms': recorder.lock_wait * 1000,
+            'detail': payload.get('error') or body[:200].decode('utf-8', 'replace'),
+        }
+
+
+class Command(BaseCommand):
+    help = 'Carreras concurrentes de entrada y salida sobre la misma placa y ticket; verifica un solo ganador'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help='Cajeros concurrentes por ronda')
+        parser.add_argument('--rounds', type=int, default=50, help='Rondas por carrera')
+        parser.add_argument('--races', default=','.join(RACES), help='Carreras a ejecutar (entry,exit)')
+        parser.add_argument('--url', help='Servidor a probar (por defecto en el mismo proceso)')
+        parser.add_argument('--password', default=loadgen.DEFAULT_PASSWORD, help='Contraseña del usuario de prueba')
+        parser.add_argument('--keep', action='store_true', help='No eliminar el parqueadero de prueba al terminar')
+
+    def handle(self, *args, **options):
+        races = [race.strip() for race in options['races'].split(',') if race.strip()]
+        unknown = set(races) - set(RACES)
+        if unknown or not races:
+            raise CommandError(f'Carreras válidas: {", ".join(RACES)}')
+        if options['workers'] < 2 or options['rounds'] < 1:
+            raise CommandError('Se necesitan al menos 2 cajeros y 1 ronda')
+
+        parking_lot, = loadgen.seed_tenants(
+            1, categories=2, clientes=0, tickets=0, open_tickets=0, cashiers=0, mensualidades=0,
+            password=options['password'],
+        )
+        self.parking_lot = parking_lot
+        self.category_id = VehicleCategory.objects.filter(
+            parking_lot=parking_lot, is_monthly=False
+        ).values_list('id', flat=True).first()
+        self.payment_method_id = PaymentMethod.objects.filter(
+            parking_lot=parking_lot
+        ).values_list('id', flat=True).first()
+        self.stdout.write(
+            f'{options["workers"]} cajeros x {options["rounds"]} rondas, parqueadero {parking_lot.id} '
+            f'({options["url"] or "en proceso"}, {connection.vendor})'
+        )
+
+        loggers = [logging.getLogger(name) for name in QUIET_LOGGERS]
+        levels = [logger.level for logger in loggers]
+        for logger in loggers:
+            logger.setLevel(logging.CRITICAL)
+        try:
+            results = self.run_rounds(races, options)
+        finally:
+            for logger, level in zip(loggers, levels):
+                logger.setLevel(level)
+            if not options['keep']:
+                self.cleanup(parking_lot)
+
+        failures = self.print_report(results, in_process=not options['url'])
+        if failures:
+            raise CommandError(f'{failures} rondas sin exactamente un ganador o con datos inconsistentes')
+        self.stdout.write(self.style.SUCCESS('✓ Cada ronda tuvo exactamente un ganador'))
+
+    def run_rounds(self, races, options):
+        barrier = threading.Barrier(options['workers'] + 1)
+        self.task = None
+        workers = [
+            Worker(number, self.make_session(options['url']), self.parking_lot.user, options['password'], barrier, self)
+            for number in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        prefix = ''.join(random.choices(string.ascii_uppercase, k=3))
+        results = {race: {'rounds': [], 'attempts': [], 'seconds': 0.0} for race in races}
+        try:
+            for number in range(options['rounds']):
+                plate = f'{prefix}{number:04d}'
+                ticket_id = None
+                for race in races:
+                    if race == 'entry':
+                        data = {'category': self.category_id, 'placa': plate, 'color': 'Gris', 'marca': 'Mazda'}
+                    else:
+                        ticket_id = ticket_id or self.open_ticket(plate)
+                        data = {'ticket_id': ticket_id, 'amount_received': 100000,
+                                'payment_method': self.payment_method_id}
+                    self.task = (race, data)
+                    start = time.perf_counter()
+                    barrier.wait(timeout=120)
+                    barrier.wait(timeout=120)
+                    results[race]['seconds'] += time.perf_counter() - start
+                    attempts = [worker.result for worker in workers if worker.result]
+                    results[race]['attempts'].extend(attempts)
+                    results[race]['rounds'].append(self.verify(race, plate, attempts))
+                    if race == 'entry':
+                        ticket_id = self.parking_lot.tickets.filter(
+                            placa=plate, exit_time__isnull=True
+                        ).values_list('id', flat=True).first()
+        finally:
+            self.task = None
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+            for worker in workers:
+                worker.join(timeout=10)
+
+        login_errors = {worker.login_error for worker in workers if worker.login_error}
+        if login_errors:
+            raise CommandError(f'No se pudo iniciar sesión: {login_errors.pop()}')
+        return results
+
+    def open_ticket(self, plate):
+        """Ticket abierto para la carrera de salida cuando no se corre la de entrada"""
+        return ParkingTicket.objects.create(
+            parking_lot=self.parking_lot, category_id=self.category_id, placa=plate, color='Gris', marca='Mazda',
+        ).id
+
+    def verify(self, race, plate, attempts):
+        """
+        Ganadores de la ronda y consistencia de la base de datos
+        Retorna: dict con winners, errors y problem (None si la ronda es válida)
+        """
+        winners = sum(1 for attempt in attempts if attempt['outcome'] == 'win')
+        errors = sum(1 for attempt in attempts if attempt['outcome'] == 'error')
+        tickets = list(self.parking_lot.tickets.filter(placa=plate).values('exit_time', 'amount_paid'))
+        problem = None
+        if race == 'entry':
+            open_tickets = sum(1 for ticket in tickets if ticket['exit_time'] is None)
+            if open_tickets != 1 or len(tickets) != 1:
+                problem = f'{plate}: {open_tickets} tickets abiertos, {len(tickets)} en total'
+        else:
+            closed = [ticket for ticket in tickets if ticket['exit_time'] is not None]
+            if len(closed) != 1 or closed[0]['amount_paid'] is None:
+                problem = f'{plate}: {len(closed)} tickets cobrados'
+        if problem is None and winners != 1:
+            problem = f'{plate}: {winners} respuestas ganadoras'
+        return {'winners': winners, 'errors': errors, 'problem': problem}
+
+    def make_session(self, url):
+        if url:
+            return HTTPSession(url)
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')),
+                    'localhost')
+        return InProcessSession(host, secure=getattr(settings, 'SECURE_SSL_REDIRECT', False))
+
+    def cleanup(self, parking_lot):
+        users = [parking_lot.user_id] + list(
+            UserParkingLot.objects.filter(parking_lot=parking_lot).values_list('user_id', flat=True)
+        )
+        parking_lot.delete()
+        User.objects.filter(id__in=users).delete()
+
+    def print_report(self, results, in_process):
+        """Imprime el resumen por carrera; retorna el número de rondas con problemas"""
+        self.stdout.write(
+            f'{"carrera":<9}{"rondas":>7}{"req/s":>8}{"gan.":>6}{"perd.":>7}{"err.":>6}'
+            f'{"p50 ms":>9}{"p95 ms":>9}{"máx ms":>9}{"bloqueo p95":>13}{"bloqueo máx":>13}'
+        )
+        failures = 0
+        for race, data in results.items():
+            attempts = data['attempts']
+            outcomes = defaultdict(int)
+            for attempt in attempts:
+                outcomes[attempt['outcome']] += 1
+            latencies = np.array([attempt['ms'] for attempt in attempts] or [0.0])
+            locks = np.array([attempt['lock_ms'] for attempt in attempts] or [0.0])
+            lock_columns = f'{np.percentile(locks, 95):>13.1f}{locks.max():>13.1f}' if in_process else f'{"-":>13}' * 2
+            self.stdout.write(
+                f'{race:<9}{len(data["rounds"]):>7}{len(attempts) / max(data["seconds"], 1e-9):>8.0f}'
+                f'{outcomes["win"]:>6}{outcomes["loss"]:>7}{outcomes["error"]:>6}'
+                f'{np.percentile(latencies, 50):>9.1f}{np.percentile(latencies, 95):>9.1f}{latencies.max():>9.1f}'
+                f'{lock_columns}'
+            )
+            problems = [round_data['problem'] for round_data in data['rounds'] if round_data['problem']]
+            failures += len(problems)
+            for problem in problems[:5]:
+                self.stdout.write(self.style.ERROR(f'  {race}: {problem}'))
+            sample = next((attempt for attempt in attempts if attempt['outcome'] == 'error'), None)
+            if sample:
+                self.stdout.write(self.style.WARNING(f'  {race}: error HTTP {sample["status"]}: {sample["detail"]}'))
+        return failures
@@ -0,0 +1,386 @@
+"""
+Comando de gestión para la prueba de carga de punta a punta
+Cajeros virtuales concurrentes (hilos) inician sesión en los parqueaderos de
+prueba (ver parking/loadgen.py) y recorren los flujos de la operación con una
+mezcla ponderada: entrada, salida (búsqueda + pago), dashboard, reportes,
+cuadre de caja y exportación a Excel. Los requests van al proceso actual
+(django.test.Client, con toda la cadena de middlewares) o a un servidor local
+con --url.
+
+Guarda un JSON con el throughput y los percentiles p50/p95/p99 por flujo para
+comparar entre commits (--compare con el JSON de una corrida anterior).
+Uso: python manage.py load_benchmark [--seed-tenants N --tickets N ...]
+         [--cashiers N] [--duration SEG] [--url http://127.0.0.1:8000]
+         [--output reporte.json] [--compare anterior.json]
+"""
+import http.cookiejar
+import json
+import random
+import string
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.utils import timezone
+
+from parking import loadgen
+from parking.models import ParkingTicket, PaymentMethod, VehicleCategory
+
+
+FLOWS = ('entry', 'exit', 'dashboard', 'reports', 'cash_register', 'export')
+DEFAULT_MIX = 'entry=30,exit=25,dashboard=15,cash_register=15,reports=10,export=5'
+
+
+class InProcessSession:
+    """Cliente de pruebas de Django: mismo proceso, sin red"""
+
+    def __init__(self, host, secure):
+        self.client = Client(SERVER_NAME=host, raise_request_exception=False)
+        self.secure = secure
+
+    def login(self, user, password):
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None, ajax=False):
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if ajax else {}
+        handler = self.client.post if method == 'POST' else self.client.get
+        response = handler(path, data or {}, secure=self.secure, headers=headers)
+        if response.streaming:
+            body = b''.join(response.streaming_content)
+        else:
+            body = response.content
+        return response.status_code, body
+
+
+class HTTPSession:
+    """Sesión HTTP contra un servidor en ejecución (cookies de sesión y CSRF)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == settings.CSRF_COOKIE_NAME), '')
+
+    def login(self, user, password):
+        self.request('GET', '/accounts/login/')
+        status, _ = self.request('POST', '/accounts/login/', {'username': user.username, 'password': password})
+        if status >= 400 or not any(cookie.name == settings.SESSION_COOKIE_NAME for cookie in self.cookies):
+            raise CommandError(f'No se pudo iniciar sesión como {user.username} en {self.base_url}')
+
+    def request(self, method, path, data=None, ajax=False):
+        url = self.base_url + path
+        body = None
+        if method == 'GET' and data:
+            url += '?' + urllib.parse.urlencode(data)
+        elif method == 'POST':
+            body = urllib.parse.urlencode({**(data or {}), 'csrfmiddlewaretoken': self.csrf_token()}).encode()
+        request = urllib.request.Request(url, data=body, method=method)
+        request.add_header('Referer', self.base_url + '/')
+        if ajax:
+            request.add_header('X-Requested-With', 'XMLHttpRequest')
+        try:
+            with self.opener.open(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+class VirtualCashier(threading.Thread):
+    """Un cajero: inicia sesión y ejecuta flujos al azar hasta el final de la prueba"""
+
+    def __init__(self, number, session, tenant, mix, deadline, plate_prefix, password):
+        super().__init__(name=f'cajero-{number}', daemon=True)
+        self.number = number
+        self.session = session
+        self.tenant = tenant
+        self.flows, self.weights = zip(*mix.items())
+        self.deadline = deadline
+        self.plate_prefix = plate_prefix
+        self.password = password
+        self.random = random.Random(number)
+        self.parked = []
+        self.counter = 0
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+
+    def run(self):
+        try:
+            self.session.login(self.tenant['user'], self.password)
+            while time.monotonic() < self.deadline:
+                flow = self.random.choices(self.flows, self.weights)[0]
+                if flow == 'exit' and not self.parked:
+                    flow = 'entry'
+                start = time.perf_counter()
+                try:
+                    error = getattr(self, f'flow_{flow}')()
+                except Exception as exception:
+                    error = f'{type(exception).__name__}: {exception}'
+                elapsed = (time.perf_counter() - start) * 1000
+                if error:
+                    self.errors[flow] += 1
+                    self.error_samples.setdefault(flow, error[:300])
+                else:
+                    self.timings[flow].append(elapsed)
+        finally:
+            connections.close_all()
+
+    def expect(self, status, body, ok=200, key=None):
+        """Mensaje de error o None si la respuesta es la esperada"""
+        if status != ok:
+            return f'HTTP {status}'
+        if key:
+            data = json.loads(body)
+            if not data.get(key):
+                return data.get('error') or f'Respuesta sin {key}'
+        return None
+
+    def flow_entry(self):
+        self.counter += 1
+        placa = f'{self.plate_prefix}{self.number:03d}{self.counter:05d}'
+        status, body = self.session.request('POST', '/entry/', {
+            'category': self.random.choice(self.tenant['categories']),
+            'placa': placa,
+            'color': 'Blanco',
+            'marca': 'Renault',
+        }, ajax=True)
+        error = self.expect(status, body, key='success')
+        if not error:
+            self.parked.append(placa)
+        return error
+
+    def flow_exit(self):
+        placa = self.parked.pop(self.random.randrange(len(self.parked)))
+        status, body = self.session.request('POST', '/exit/', {'identifier': placa}, ajax=True)
+        error = self.expect(status, body, key='ticket_id')
+        if error:
+            return error
+        data = json.loads(body)
+        status, body = self.session.request('POST', '/print-exit-ticket/', {
+            'ticket_id': data['ticket_id'],
+            'amount_received': data['amount'],
+            'payment_method': self.random.choice(self.tenant['payment_methods']),
+        }, ajax=True)
+        return self.expect(status, body, key='success')
+
+    def flow_dashboard(self):
+        return self.expect(*self.session.request('GET', '/dashboard/'))
+
+    def flow_reports(self):
+        return self.expect(*self.session.request('GET', '/reports/', {'filter_type': 'month'}))
+
+    def flow_cash_register(self):
+        return self.expect(*self.session.request('GET', '/cash-register/'))
+
+    def flow_export(self):
+        return self.expect(*self.session.request('GET', '/reports/', {'filter_type': 'month', 'export': 'excel'}))
+
+
+def summarize(timings, errors, duration):
+    if timings:
+        values = np.array(timings)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        stats = {'mean_ms': values.mean(), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': values.max()}
+    else:
+        stats = dict.fromkeys(('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'), None)
+    return {
+        'count': len(timings),
+        'errors': errors,
+        'throughput_rps': round(len(timings) / duration, 2),
+        **{key: round(float(value), 2) if value is not None else None for key, value in stats.items()},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga con cajeros virtuales concurrentes; reporta throughput y p50/p95/p99 por flujo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-tenants', type=int, default=0, help='Parqueaderos de prueba a crear antes de medir')
+        parser.add_argument('--categories', type=int, default=20, help='Categorías por parqueadero creado')
+        parser.add_argument('--clientes', type=int, default=500, help='Clientes por parqueadero creado')
+        parser.add_argument('--tickets', type=int, default=10000, help='Tickets históricos por parqueadero creado')
+        parser.add_argument('--years', type=float, default=2, help='Años de historia de los tickets creados')
+        parser.add_argument('--tenants', type=int, help='Parqueaderos de prueba a usar (por defecto todos)')
+        parser.add_argument('--cashiers', type=int, default=8, help='Cajeros virtuales concurrentes')
+        parser.add_argument('--duration', type=float, default=30, help='Duración de la medición en segundos')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Peso de cada flujo (por defecto {DEFAULT_MIX})')
+        parser.add_argument('--url', help='Servidor a probar (por defecto en el mismo proceso)')
+        parser.add_argument('--password', default=loadgen.DEFAULT_PASSWORD, help='Contraseña de los usuarios de prueba')
+        parser.add_argument('--output', default='load_benchmark.json', help='Archivo JSON del reporte')
+        parser.add_argument('--compare', help='Reporte JSON anterior para comparar')
+
+    def parse_mix(self, text):
+        mix = {}
+        for part in filter(None, (chunk.strip() for chunk in text.split(','))):
+            name, _, weight = part.partition('=')
+            if name not in FLOWS:
+                raise CommandError(f'Flujo desconocido "{name}". Opciones: {", ".join(FLOWS)}')
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'Peso inválido para {name}: "{weight}"')
+        if not any(mix.values()):
+            raise CommandError('La mezcla de flujos está vacía')
+        return mix
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+
+        if options['seed_tenants']:
+            start = time.perf_counter()
+            loadgen.seed_tenants(
+                options['seed_tenants'],
+                categories=options['categories'],
+                clientes=options['clientes'],
+                tickets=options['tickets'],
+                years=options['years'],
+                password=options['password'],
+                log=self.stdout.write,
+            )
+            self.stdout.write(f'Datos creados en {time.perf_counter() - start:.1f} s')
+
+        parking_lots = list(loadgen.seeded_parking_lots()[:options['tenants']])
+        if not parking_lots:
+            raise CommandError('No hay parqueaderos de prueba. Use --seed-tenants N para crearlos.')
+        tenants = [self.tenant_data(parking_lot) for parking_lot in parking_lots]
+
+        target = options['url'] or 'en proceso'
+        self.stdout.write(
+            f'{options["cashiers"]} cajeros, {len(tenants)} parqueaderos, {options["duration"]:.0f} s '
+            f'({target}, {connection.vendor})'
+        )
+
+        plate_prefix = ''.join(random.choices(string.ascii_uppercase, k=2))
+        deadline = time.monotonic() + options['duration']
+        cashiers = [
+            VirtualCashier(
+                number,
+                self.make_session(options['url']),
+                tenants[number % len(tenants)],
+                mix,
+                deadline,
+                plate_prefix,
+                options['password'],
+            )
+            for number in range(options['cashiers'])
+        ]
+        started = time.monotonic()
+        for cashier in cashiers:
+            cashier.start()
+        for cashier in cashiers:
+            cashier.join()
+        duration = time.monotonic() - started
+
+        report = self.build_report(cashiers, tenants, duration, options)
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                previous = json.load(f)
+        self.print_report(report, previous)
+        self.stdout.write(self.style.SUCCESS(f'✓ Reporte guardado en {options["output"]}'))
+
+    def tenant_data(self, parking_lot):
+        categories = list(VehicleCategory.objects.filter(
+            parking_lot=parking_lot, is_monthly=False
+        ).order_by('id').values_list('id', flat=True)[:20])
+        payment_methods = list(PaymentMethod.objects.filter(
+            parking_lot=parking_lot, is_active=True
+        ).values_list('id', flat=True))
+        if not categories:
+            raise CommandError(f'El parqueadero {parking_lot.id} no tiene categorías por hora')
+        return {
+            'parking_lot': parking_lot,
+            'user': parking_lot.user,
+            'categories': categories,
+            'payment_methods': payment_methods,
+        }
+
+    def make_session(self, url):
+        if url:
+            return HTTPSession(url)
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')),
+                    'localhost')
+        return InProcessSession(host, secure=getattr(settings, 'SECURE_SSL_REDIRECT', False))
+
+    def build_report(self, cashiers, tenants, duration, options):
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        samples = {}
+        for cashier in cashiers:
+            for flow, values in cashier.timings.items():
+                timings[flow].extend(values)
+            for flow, count in cashier.errors.items():
+                errors[flow] += count
+            for flow, sample in cashier.error_samples.items():
+                samples.setdefault(flow, sample)
+
+        all_timings = [value for values in timings.values() for value in values]
+        return {
+            'created_at': timezone.now().isoformat(),
+            'commit': self.git_commit(),
+            'target': options['url'] or 'in-process',
+            'database': connection.vendor,
+            'cashiers': options['cashiers'],
+            'duration_s': round(duration, 2),
+            'tenants': [
+                {
+                    'id': tenant['parking_lot'].id,
+                    'tickets': ParkingTicket.objects.filter(parking_lot=tenant['parking_lot']).count(),
+                }
+                for tenant in tenants
+            ],
+            'flows': {flow: summarize(timings[flow], errors[flow], duration) for flow in FLOWS if flow in timings or flow in errors},
+            'total': summarize(all_timings, sum(errors.values()), duration),
+            'error_samples': samples,
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def print_report(self, report, previous=None):
+        header = f'{"flujo":<15}{"ops":>7}{"err":>6}{"ops/s":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+        if previous:
+            header += f'{"Δ p95":>10}{"Δ ops/s":>10}'
+        self.stdout.write(header)
+        rows = list(report['flows'].items()) + [('TOTAL', report['total'])]
+        for flow, stats in rows:
+            line = (
+                f'{flow:<15}{stats["count"]:>7}{stats["errors"]:>6}{stats["throughput_rps"]:>9.1f}'
+                f'{self.ms(stats["p50_ms"])}{self.ms(stats["p95_ms"])}{self.ms(stats["p99_ms"])}'
+            )
+            if previous:
+                old = previous['total'] if flow == 'TOTAL' else previous.get('flows', {}).get(flow)
+                line += self.delta(old, stats, 'p95_ms') + self.delta(old, stats, 'throughput_rps')
+            self.stdout.write(line)
+        for flow, sample in report['error_samples'].items():
+            self.stdout.write(self.style.WARNING(f'Error en {flow}: {sample}'))
+        if previous:
+            self.stdout.write(f'Comparado con {previous.get("commit") or "?"} ({previous.get("created_at", "")[:19]})')
+
+    def ms(self, value):
+        return f'{value:>10.1f}' if value is not None else f'{"-":>10}'
+
+    def delta(self, old, new, key):
+        if not old or not old.get(key) or new.get(key) is None:
+            return f'{"-":>10}'
+        return f'{(new[key] - old[key]) / old[key] * 100:>+9.1f}%'
@@ -0,0 +1,35 @@
+"""
+Comando de gestión para particionar la tabla de tickets por mes (PostgreSQL)
+Convierte parking_parkingticket en una tabla particionada por rango de
+exit_time en una sola transacción. Bloquea la tabla mientras copia los
+datos: ejecutar en una ventana de mantenimiento y con un backup reciente.
+Uso: python manage.py partition_ticket_table [--months-ahead N]
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from parking.partitioning import PartitioningError, convert_ticket_table, get_months_ahead
+
+
+class Command(BaseCommand):
+    help = 'Convierte la tabla de tickets en una tabla particionada por mes (solo PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=get_months_ahead(),
+            help='Meses futuros con partición creada de antemano',
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        try:
+            result = convert_ticket_table(months_ahead=options['months_ahead'])
+        except PartitioningError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Tabla de tickets particionada: {result["rows"]} tickets en '
+            f'{len(result["partitions"])} particiones mensuales ({time.monotonic() - start:.1f}s)'
+        ))
+        self.stdout.write(f'  {result["partitions"][0]} … {result["partitions"][-1]}')
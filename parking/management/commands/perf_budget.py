@@ -0,0 +1,79 @@
+"""
+Comando de gestión para los microbenchmarks y el presupuesto de consultas
+Mide las funciones más usadas y las vistas principales sobre un parqueadero
+de prueba (se revierte al terminar) y compara con la línea base del motor de
+base de datos actual (ver parking/perf_budget.py). Termina con error si hay
+regresiones.
+Uso: python manage.py perf_budget [--update] [--tolerance 0.25] [--queries-only]
+         [--only functions|views] [--baseline archivo.json]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from parking import perf_budget
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmarks de funciones y presupuesto de consultas por vista contra la línea base'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--update', action='store_true',
+                            help='Guarda las mediciones como nueva línea base del motor actual')
+        parser.add_argument('--tolerance', type=float, default=perf_budget.DEFAULT_TIME_TOLERANCE,
+                            help='Aumento de tiempo permitido, relativo (0.25 = 25%%)')
+        parser.add_argument('--queries-only', action='store_true',
+                            help='Compara solo el número de consultas (tiempos de otra máquina)')
+        parser.add_argument('--only', choices=('functions', 'views'), help='Mide solo funciones o solo vistas')
+        parser.add_argument('--baseline', help='Archivo de línea base (por defecto PERF_BASELINE_FILE)')
+
+    def handle(self, *args, **options):
+        if options['tolerance'] < 0:
+            raise CommandError('--tolerance no puede ser negativa')
+        vendor = connection.vendor
+        self.stdout.write(f'Midiendo sobre {vendor}...')
+
+        def log(name, result):
+            value = f'{result["us"]:10.2f} us' if 'us' in result else f'{result["ms"]:10.2f} ms'
+            self.stdout.write(f'  {name:<52}{value}{result["queries"]:>5} consultas')
+
+        try:
+            results = perf_budget.run(
+                include_functions=options['only'] != 'views',
+                include_views=options['only'] != 'functions',
+                log=log,
+            )
+        except perf_budget.ViewMeasurementError as exc:
+            raise CommandError(f'No se pudo medir una vista: {exc}')
+
+        if options['update']:
+            path = perf_budget.save_baseline(results, vendor, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Línea base de {vendor} guardada en {path}'))
+            return
+
+        vendor_baseline = perf_budget.load_baseline(options['baseline'])['vendors'].get(vendor)
+        if vendor_baseline is None:
+            raise CommandError(f'No hay línea base para {vendor}; créala con --update')
+
+        rows = perf_budget.compare(
+            results, vendor_baseline, tolerance=options['tolerance'], check_time=not options['queries_only'],
+        )
+        regressions = 0
+        self.stdout.write(f'\nComparado con la línea base de {vendor_baseline.get("commit") or "?"} '
+                          f'({vendor_baseline.get("updated_at", "")})')
+        self.stdout.write(f'{"medición":<54}{"actual":>12}{"base":>12}{"consultas":>12}  estado')
+        for section, name, current, base, status in rows:
+            unit = 'us' if section == 'functions' else 'ms'
+            base_time = f'{base[unit]:.2f}' if base else '-'
+            base_queries = base['queries'] if base else '-'
+            line = (f'{name:<54}{current[unit]:>10.2f}{unit}{base_time:>10}{unit}'
+                    f'{current["queries"]:>6}/{base_queries:<5}  {status}')
+            if status == 'regresión':
+                regressions += 1
+                line = self.style.ERROR(line)
+            elif status in ('mejora', 'nuevo'):
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f'{regressions} regresiones frente a la línea base')
+        self.stdout.write(self.style.SUCCESS('✓ Sin regresiones frente a la línea base'))
@@ -0,0 +1,37 @@
+"""
+Comando de gestión para procesar las eliminaciones de parqueaderos pendientes
+Retoma los trabajos que quedaron pendientes, interrumpidos (por ejemplo por un
+reinicio del servidor) o con error, y los ejecuta en primer plano.
+Uso: python manage.py process_parking_lot_deletions [--id ID]
+"""
+from django.core.management.base import BaseCommand
+from parking.models import ParkingLotDeletion
+from parking.services import TenantDeletionService
+
+
+class Command(BaseCommand):
+    help = 'Procesa las eliminaciones de parqueaderos pendientes o interrumpidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, help='Procesa solo el trabajo con este ID')
+
+    def handle(self, *args, **options):
+        deletions = ParkingLotDeletion.objects.exclude(status='COMPLETADO').order_by('created_at')
+        if options['id']:
+            deletions = deletions.filter(id=options['id'])
+
+        pending = list(deletions.values_list('id', flat=True))
+        if not pending:
+            self.stdout.write('No hay eliminaciones pendientes')
+            return
+
+        for deletion_id in pending:
+            deletion = TenantDeletionService.run(deletion_id)
+            if deletion.status == 'COMPLETADO':
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ Parqueadero "{deletion.empresa}" eliminado ({deletion.deleted_rows} registros)'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'✗ Error eliminando "{deletion.empresa}": {deletion.error}'
+                ))
@@ -0,0 +1,46 @@
+"""
+Comando de gestión para reconstruir el libro de caja
+Vuelve a generar los movimientos (CashMovement) y los saldos diarios
+(CashBalance) desde los tickets cobrados, los tickets archivados y las
+mensualidades pagadas. Sirve para poblar el libro después de la migración o
+corregirlo si se editaron pagos fuera de la aplicación.
+Uso: python manage.py rebuild_cash_ledger [--parking-lot ID] [--days N] [--missing-only]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from parking.models import CashMovement, ParkingLot
+from parking.services import CashRegisterService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el libro de caja y los saldos diarios desde los pagos registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parking-lot', type=int, help='ID del parqueadero (por defecto todos)')
+        parser.add_argument('--days', type=int, help='Reconstruye solo los últimos N días (por defecto toda la historia)')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Solo los parqueaderos que todavía no tienen movimientos en el libro')
+
+    def handle(self, *args, **options):
+        parking_lots = ParkingLot.objects.order_by('id')
+        if options['parking_lot']:
+            parking_lots = parking_lots.filter(id=options['parking_lot'])
+            if not parking_lots.exists():
+                raise CommandError(f'No existe el parqueadero {options["parking_lot"]}')
+        if options['missing_only']:
+            with_movements = CashMovement.objects.values('parking_lot_id').distinct()
+            parking_lots = parking_lots.exclude(id__in=with_movements)
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days debe ser al menos 1')
+        since = timezone.localdate() - timedelta(days=options['days'] - 1) if options['days'] else None
+
+        total = 0
+        for parking_lot_id, empresa in parking_lots.values_list('id', 'empresa'):
+            count = CashRegisterService.rebuild_ledger(parking_lot_id, since=since)
+            total += count
+            self.stdout.write(f'  {empresa} ({parking_lot_id}): {count} pagos')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Libro de caja reconstruido: {total} pagos'))
@@ -0,0 +1,40 @@
+"""
+Comando de gestión para restaurar el backup de un parqueadero
+Acepta un backup completo seguido opcionalmente de la cadena de backups
+incrementales generados después de él, que se aplican en orden.
+Uso: python manage.py restore_parking_lot_backup COMPLETO [INCREMENTAL ...] [--overwrite]
+"""
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from parking.backup_service import BackupService
+
+
+class Command(BaseCommand):
+    help = 'Restaura un parqueadero desde un backup completo y sus incrementales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Backup completo seguido de los incrementales en orden')
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Sobrescribe el parqueadero si ya existe',
+        )
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            backup_files = [stack.enter_context(open(path, 'rb')) for path in options['files']]
+            result = BackupService.restore_backup_chain(backup_files, overwrite=options['overwrite'])
+
+        if not result['success']:
+            raise CommandError(result['error'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Parqueadero "{result["parking_lot_name"]}" restaurado con {result["backups_applied"]} backup(s) '
+            f'hasta {result["watermark"]}'
+        ))
+        for name, count in result['restored_counts'].items():
+            self.stdout.write(f'  {name}: {count}')
+        self.stdout.write(
+            f'  {result["total_rows"]} registros en {result["elapsed"]:.2f}s '
+            f'({result["rows_per_second"]:,.0f} registros/s)'
+        )
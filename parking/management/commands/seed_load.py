@@ -0,0 +1,83 @@
+"""
+Comando de gestión para generar datos sintéticos de carga rápidamente
+Crea parqueaderos de prueba con usuarios, categorías, medios de pago,
+clientes, mensualidades y tickets (ver parking/loadgen.py). Los tickets se
+generan por columnas con NumPy y se cargan con COPY en PostgreSQL (executemany
+en SQLite), sin generar códigos de barras.
+Uso: python manage.py seed_load --tenants 10 --tickets 1000000
+         [--categories N] [--clientes N] [--years N] [--open-tickets N]
+         [--mensualidades FRACCIÓN] [--seed N] [--batch-size N]
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from parking import loadgen
+from parking.models import ParkingTicket
+
+
+class Command(BaseCommand):
+    help = 'Genera parqueaderos de prueba con millones de tickets (COPY/executemany, sin códigos de barras)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=1, help='Parqueaderos a crear')
+        parser.add_argument('--tickets', type=int, default=100000, help='Tickets históricos por parqueadero')
+        parser.add_argument('--categories', type=int, default=20, help='Categorías por hora por parqueadero')
+        parser.add_argument('--clientes', type=int, default=1000, help='Clientes por parqueadero')
+        parser.add_argument('--years', type=float, default=3, help='Años de historia')
+        parser.add_argument('--open-tickets', type=int, default=20, help='Vehículos dentro por parqueadero')
+        parser.add_argument('--cashiers', type=int, default=2, help='Usuarios cajeros por parqueadero')
+        parser.add_argument(
+            '--mensualidades', type=float, default=0.2, help='Fracción de clientes con historial de mensualidades'
+        )
+        parser.add_argument('--password', default=loadgen.DEFAULT_PASSWORD, help='Contraseña de los usuarios creados')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla del generador aleatorio')
+        parser.add_argument('--batch-size', type=int, default=loadgen.BATCH_SIZE, help='Tickets por lote')
+
+    def handle(self, *args, **options):
+        if options['tenants'] < 1 or options['tickets'] < 0:
+            raise CommandError('--tenants debe ser al menos 1 y --tickets no puede ser negativo')
+        if not 0 <= options['mensualidades'] <= 1:
+            raise CommandError('--mensualidades debe estar entre 0 y 1')
+        if options['categories'] < 1:
+            raise CommandError('--categories debe ser al menos 1')
+
+        self.stdout.write(
+            f'Generando {options["tenants"]} parqueaderos x {options["tickets"]:,} tickets '
+            f'({connection.vendor}, {"COPY" if connection.vendor == "postgresql" else "executemany"})'
+        )
+        start = time.perf_counter()
+        last = [start]
+
+        def log(message):
+            now = time.perf_counter()
+            self.stdout.write(f'{message} ({now - last[0]:.1f} s)')
+            last[0] = now
+
+        parking_lots = loadgen.seed_tenants(
+            options['tenants'],
+            categories=options['categories'],
+            clientes=options['clientes'],
+            tickets=options['tickets'],
+            years=options['years'],
+            open_tickets=options['open_tickets'],
+            cashiers=options['cashiers'],
+            mensualidades=options['mensualidades'],
+            password=options['password'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=log,
+        )
+
+        if connection.vendor == 'postgresql':
+            # Estadísticas del planificador al día después de la carga masiva
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {ParkingTicket._meta.db_table}')
+
+        elapsed = time.perf_counter() - start
+        total = len(parking_lots) * (options['tickets'] + options['open_tickets'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total:,} tickets en {elapsed:.1f} s ({total / elapsed:,.0f} tickets/s). '
+            f'Usuarios: {loadgen.LOAD_PREFIX}N / {options["password"]}'
+        ))
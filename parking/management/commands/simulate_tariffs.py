@@ -0,0 +1,86 @@
+"""
+Comando de gestión para simular el impacto de cambios de tarifa
+Re-tarifica las estadías históricas del parqueadero con las tarifas propuestas
+y muestra la diferencia de ingresos por categoría y por mes.
+Uso: python manage.py simulate_tariffs --parking-lot ID
+         --scenario "CARROS:first=3000,additional=2500" [--scenario ...]
+         [--start AAAA-MM-DD] [--end AAAA-MM-DD]
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from parking.analytics import TariffSimulator
+from parking.models import ParkingLot
+import time
+
+
+RATE_KEYS = {
+    'first': 'first_hour_rate',
+    'additional': 'additional_hour_rate',
+}
+
+
+class Command(BaseCommand):
+    help = 'Simula el impacto en ingresos de cambiar las tarifas por hora de las categorías'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parking-lot', type=int, required=True, help='ID del parqueadero')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            required=True,
+            help='Cambios de un escenario: "CATEGORIA:first=N,additional=N;OTRA:first=N" (repetible)',
+        )
+        parser.add_argument('--start', type=date.fromisoformat, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Fecha final (AAAA-MM-DD)')
+
+    def parse_scenario(self, text, categories):
+        overrides = {}
+        for part in filter(None, (chunk.strip() for chunk in text.split(';'))):
+            name, _, rates = part.partition(':')
+            category = categories.get(name.strip().upper())
+            if category is None:
+                raise CommandError(f'Categoría no encontrada: {name}')
+            for assignment in filter(None, rates.split(',')):
+                key, _, value = assignment.partition('=')
+                if key.strip() not in RATE_KEYS:
+                    raise CommandError(f'Tarifa desconocida "{key}" (use first o additional)')
+                try:
+                    overrides.setdefault(category.id, {})[RATE_KEYS[key.strip()]] = Decimal(value.strip())
+                except InvalidOperation:
+                    raise CommandError(f'Valor inválido para {key}: {value}')
+        return overrides
+
+    def handle(self, *args, **options):
+        try:
+            parking_lot = ParkingLot.objects.get(id=options['parking_lot'])
+        except ParkingLot.DoesNotExist:
+            raise CommandError(f'Parqueadero {options["parking_lot"]} no encontrado')
+
+        started = time.monotonic()
+        simulator = TariffSimulator(parking_lot, options.get('start'), options.get('end'))
+        loaded = time.monotonic() - started
+
+        categories = {category.name.upper(): category for category in simulator.categories}
+        scenarios = {text: self.parse_scenario(text, categories) for text in options['scenario']}
+
+        started = time.monotonic()
+        results = simulator.simulate(scenarios)
+        simulated = time.monotonic() - started
+
+        self.stdout.write(
+            f'{simulator.stays} estadías cargadas desde {simulator.source} en {loaded:.2f}s '
+            f'({simulator.excluded} con tarifa mensual excluidas); simulación en {simulated:.3f}s'
+        )
+
+        for name, result in results.items():
+            self.stdout.write(self.style.SUCCESS(f'\nEscenario: {name}'))
+            self.stdout.write(
+                f'  Actual: ${result["baseline"]:,}  Simulado: ${result["revenue"]:,}  Diferencia: ${result["delta"]:,}'
+            )
+            self.stdout.write('  Por categoría:')
+            for row in result['by_category']:
+                self.stdout.write(f'    {row["category"]:<20} {row["baseline"]:>14,} → {row["revenue"]:>14,} ({row["delta"]:+,})')
+            self.stdout.write('  Por mes:')
+            for row in result['by_month']:
+                self.stdout.write(f'    {row["month"]:<20} {row["baseline"]:>14,} → {row["revenue"]:>14,} ({row["delta"]:+,})')
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas de consultas SQL y tiempos por vista
+
+QueryMetricsMiddleware envuelve cada request con connection.execute_wrapper
+y registra, por nombre de URL resuelto:
+- número de consultas SQL
+- tiempo total en la base de datos
+- tiempo de la vista fuera de la base de datos (lógica y render de plantillas)
+- tiempo total del request
+
+Los valores se acumulan en histogramas en memoria del proceso y se exportan
+en formato de texto de Prometheus en /metrics (ver admin_views.metrics).
+
+Si un request supera SLOW_REQUEST_MS, se registra en el log con las
+SLOW_REQUEST_TOP_SQL consultas más lentas.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los buckets (segundos y cantidad de consultas)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+DEFAULT_SLOW_REQUEST_MS = 1000
+DEFAULT_SLOW_REQUEST_TOP_SQL = 5
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+class Histogram:
+    """Histograma acumulativo al estilo de Prometheus"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Pares (le, acumulado) incluyendo +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """Histogramas por vista, protegidos con un lock (gunicorn puede usar hilos)"""
+
+    METRICS = (
+        ('parking_request_duration_seconds', 'Tiempo total del request', SECONDS_BUCKETS),
+        ('parking_request_db_seconds', 'Tiempo en la base de datos por request', SECONDS_BUCKETS),
+        ('parking_request_render_seconds', 'Tiempo de la vista fuera de la base de datos (lógica y plantillas)', SECONDS_BUCKETS),
+        ('parking_request_queries', 'Consultas SQL por request', QUERY_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, duration, db_time, queries):
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = [Histogram(buckets) for _, _, buckets in self.METRICS]
+                self._views[view] = histograms
+            for histogram, value in zip(histograms, (duration, db_time, max(duration - db_time, 0), queries)):
+                histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus"""
+        lines = []
+        with self._lock:
+            views = sorted(self._views.items())
+            for position, (name, help_text, _) in enumerate(self.METRICS):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, histograms in views:
+                    histogram = histograms[position]
+                    label = _escape(view)
+                    for bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{label}",le="{bound}"}} {total}')
+                    lines.append(f'{name}_sum{{view="{label}"}} {round(histogram.sum, 6)}')
+                    lines.append(f'{name}_count{{view="{label}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class QueryRecorder:
+    """execute_wrapper que cuenta y cronometra las consultas del request"""
+
+    def __init__(self, keep_top):
+        self.count = 0
+        self.total = 0.0
+        self.keep_top = keep_top
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if self.keep_top:
+                entry = (elapsed, self.count, sql)
+                if len(self._slowest) < self.keep_top:
+                    heapq.heappush(self._slowest, entry)
+                elif elapsed > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+
+class QueryMetricsMiddleware:
+    """Registra consultas y tiempos por vista (ver el docstring del módulo)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+        self.top_sql = getattr(settings, 'SLOW_REQUEST_TOP_SQL', DEFAULT_SLOW_REQUEST_TOP_SQL)
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.top_sql)
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED_VIEW
+        registry.observe(view, duration, recorder.total, recorder.count)
+
+        if duration * 1000 >= self.slow_ms:
+            self.log_slow_request(request, view, duration, recorder)
+        return response
+
+    def log_slow_request(self, request, view, duration, recorder):
+        statements = '\n'.join(
+            f'  {elapsed * 1000:8.1f} ms  #{position}  {sql[:500]}'
+            for elapsed, position, sql in recorder.slowest()
+        )
+        logger.warning(
+            'Request lento: %s %s (%s) %.0f ms, %d consultas, %.0f ms en BD\n%s',
+            request.method, request.path, view, duration * 1000, recorder.count, recorder.total * 1000, statements,
+        )
@@ -1,14 +1,47 @@
 from django.utils.deprecation import MiddlewareMixin
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.core.cache import cache
-from .models import ParkingLot
+from django.contrib.auth import SESSION_KEY
+from .principal import load_principal, store_principal
+from .tenant_cache import get_parking_lot_context, get_tenant_context
+
+
+class PrincipalMiddleware(MiddlewareMixin):
+    """
+    Construye request.user desde el principal firmado de la sesión (ver principal.py)
+    
+    Va después de AuthenticationMiddleware. Si el principal es válido, el
+    usuario no se consulta en la base de datos; si falta o está vencido, se
+    usa el usuario de Django (con su verificación de sesión) y se guarda un
+    principal nuevo.
+    """
+    
+    def process_request(self, request):
+        request.principal = None
+        request.tenant_version = None
+        
+        principal, tenant_version = load_principal(request)
+        if principal is not None:
+            request.user = principal.to_user()
+        elif SESSION_KEY in request.session and request.user.is_authenticated:
+            principal = store_principal(request, request.user)
+            request.user.principal = principal
+        else:
+            return None
+        
+        request.principal = principal
+        request.tenant_version = tenant_version
+        return None
 
 
 class TenantMiddleware(MiddlewareMixin):
     """
     Middleware para establecer el parqueadero (tenant) actual basado en el usuario autenticado
     y verificar el estado de la suscripción con caché para mejor rendimiento
+    
+    request.tenant es el TenantContext (tupla inmutable) y
+    request.current_parking_lot una instancia de ParkingLot construida a partir
+    de él sin consultar la base de datos.
     """
     
     # Rutas que no requieren verificación de suscripción
@@ -23,6 +56,7 @@ class TenantMiddleware(MiddlewareMixin):
     
     def process_request(self, request):
         request.current_parking_lot = None
+        request.tenant = None
         
         # Verificar si la ruta actual está exenta
         if any(request.path.startswith(path) for path in self.EXEMPT_PATHS):
@@ -35,29 +69,21 @@ class TenantMiddleware(MiddlewareMixin):
         if request.user.is_superuser:
             return None
         
-        # Intentar obtener del caché primero (válido por 5 minutos)
-        cache_key = f'parking_lot_user_{request.user.id}'
-        parking_lot = cache.get(cache_key)
-        
-        if parking_lot is None:
-            # Primero intentar obtener el parqueadero del usuario dueño (OneToOne)
-            try:
-                parking_lot = ParkingLot.objects.select_related('subscription_plan').get(user=request.user)
-            except ParkingLot.DoesNotExist:
-                # Si no es dueño, buscar en las asignaciones (cajeros, operadores)
-                from .models import UserParkingLot
-                assignment = UserParkingLot.objects.select_related('parking_lot__subscription_plan').filter(user=request.user).first()
-                parking_lot = assignment.parking_lot if assignment else None
-            
-            # Guardar en caché por 5 minutos
-            if parking_lot:
-                cache.set(cache_key, parking_lot, 300)
+        # Contexto compacto del parqueadero (caché por proceso y compartido, ver tenant_cache.py)
+        principal = getattr(request, 'principal', None)
+        if principal is not None:
+            tenant = None
+            if principal.parking_lot_id:
+                tenant = get_parking_lot_context(principal.parking_lot_id, request.tenant_version)
+        else:
+            tenant = get_tenant_context(request.user.id)
+        request.tenant = tenant
         
-        if parking_lot:
-            request.current_parking_lot = parking_lot
+        if tenant:
+            request.current_parking_lot = tenant.to_parking_lot()
             
             # Verificar si la suscripción está activa
-            if not parking_lot.is_active or parking_lot.is_expired():
+            if not tenant.is_active or tenant.is_expired():
                 messages.error(request, 'Tu suscripción ha expirado. Contacta al administrador para renovarla.')
                 return redirect('login')
         
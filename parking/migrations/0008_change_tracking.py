@@ -0,0 +1,105 @@
+# Generated by Django 5.1.3 on 2026-10-18 23:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0007_subscriptionplan_parkinglot_subscription_plan'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='Modelo')),
+                ('object_pk', models.BigIntegerField(verbose_name='ID del registro')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de eliminación')),
+            ],
+            options={
+                'verbose_name': 'Registro Eliminado',
+                'verbose_name_plural': 'Registros Eliminados',
+            },
+        ),
+        migrations.AddField(
+            model_name='caja',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='parkingticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='caja',
+            index=models.Index(fields=['parking_lot', 'fecha'], name='parking_caj_parking_c5f4ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['parking_lot', 'is_active'], name='parking_cli_parking_06da31_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['documento'], name='parking_cli_documen_783dd8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensualidad',
+            index=models.Index(fields=['parking_lot', 'estado', 'fecha_vencimiento'], name='parking_men_parking_971330_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensualidad',
+            index=models.Index(fields=['cliente', 'estado'], name='parking_men_cliente_c64234_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensualidad',
+            index=models.Index(fields=['fecha_pago'], name='parking_men_fecha_p_978ef1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkinglot',
+            index=models.Index(fields=['subscription_end', 'is_active'], name='parking_par_subscri_8f55b2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkinglot',
+            index=models.Index(fields=['payment_status'], name='parking_par_payment_de4f64_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingticket',
+            index=models.Index(fields=['parking_lot', 'exit_time'], name='parking_par_parking_1b319b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingticket',
+            index=models.Index(fields=['parking_lot', 'placa', 'exit_time'], name='parking_par_parking_1ca49f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingticket',
+            index=models.Index(fields=['entry_time'], name='parking_par_entry_t_dac603_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingticket',
+            index=models.Index(fields=['payment_method'], name='parking_par_payment_001685_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingticket',
+            index=models.Index(fields=['parking_lot', 'updated_at'], name='parking_par_parking_f551b7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclecategory',
+            index=models.Index(fields=['parking_lot', 'is_monthly'], name='parking_veh_parking_4410d4_idx'),
+        ),
+        migrations.AddField(
+            model_name='deletedrecord',
+            name='parking_lot',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='parking.parkinglot'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedrecord',
+            index=models.Index(fields=['parking_lot', 'deleted_at'], name='parking_del_parking_89b9b6_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-18 23:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0008_change_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParkingLotDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parking_lot_id', models.BigIntegerField(verbose_name='ID del parqueadero')),
+                ('user_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID del usuario dueño')),
+                ('empresa', models.CharField(max_length=200, verbose_name='Empresa')),
+                ('status', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En proceso'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('total_rows', models.BigIntegerField(default=0, verbose_name='Registros a eliminar')),
+                ('deleted_rows', models.BigIntegerField(default=0, verbose_name='Registros eliminados')),
+                ('current_section', models.CharField(blank=True, max_length=50, verbose_name='Sección actual')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Eliminación de Parqueadero',
+                'verbose_name_plural': 'Eliminaciones de Parqueaderos',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 23:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0009_parkinglotdeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ticket_id', models.UUIDField(editable=False)),
+                ('placa', models.CharField(max_length=20)),
+                ('color', models.CharField(max_length=50)),
+                ('marca', models.CharField(max_length=50)),
+                ('cascos', models.IntegerField(blank=True, null=True)),
+                ('entry_time', models.DateTimeField()),
+                ('exit_time', models.DateTimeField()),
+                ('amount_paid', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('barcode', models.CharField(blank=True, max_length=100)),
+                ('monthly_expiry', models.DateTimeField(blank=True, null=True)),
+                ('es_mensualidad', models.BooleanField(default=False, verbose_name='Es Mensualidad')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de archivo')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='parking.vehiclecategory')),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='parking.cliente')),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tickets', to='parking.parkinglot')),
+                ('payment_method', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='parking.paymentmethod', verbose_name='Medio de Pago')),
+            ],
+            options={
+                'verbose_name': 'Ticket Archivado',
+                'verbose_name_plural': 'Tickets Archivados',
+                'indexes': [models.Index(fields=['parking_lot', 'exit_time'], name='parking_arc_parking_465e33_idx'), models.Index(fields=['parking_lot', 'updated_at'], name='parking_arc_parking_0eee13_idx')],
+            },
+        ),
+    ]
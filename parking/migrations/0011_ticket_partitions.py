@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_future_partitions(apps, schema_editor):
+    """
+    Crea de antemano las particiones mensuales de tickets
+
+    Solo actúa si la tabla ya fue convertida con partition_ticket_table
+    (PostgreSQL); en cualquier otro caso no hace nada.
+    """
+    from parking.partitioning import ensure_future_partitions, is_partitioned
+
+    if is_partitioned(schema_editor.connection):
+        ensure_future_partitions(connection=schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0010_archivedticket'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_future_partitions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.3 on 2026-10-19 01:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0011_ticket_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tickets_count', models.PositiveIntegerField(default=0)),
+                ('tickets_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mensualidades_count', models.PositiveIntegerField(default=0)),
+                ('mensualidades_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cash_balances', to='parking.parkinglot')),
+                ('payment_method', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='parking.paymentmethod')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['parking_lot', 'fecha'], name='parking_cas_parking_c739e6_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('payment_method__isnull', False)), fields=('parking_lot', 'fecha', 'payment_method'), name='unique_cash_balance_per_method'), models.UniqueConstraint(condition=models.Q(('payment_method__isnull', True)), fields=('parking_lot', 'fecha'), name='unique_cash_balance_without_method')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CashMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('occurred_at', models.DateTimeField()),
+                ('source', models.CharField(choices=[('ticket', 'Ticket'), ('mensualidad', 'Mensualidad')], max_length=20)),
+                ('reference_id', models.BigIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('placa', models.CharField(blank=True, max_length=20)),
+                ('categoria', models.CharField(blank=True, max_length=50)),
+                ('cliente', models.CharField(blank=True, max_length=200)),
+                ('entry_time', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cash_movements', to='parking.parkinglot')),
+                ('payment_method', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='parking.paymentmethod')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['parking_lot', 'fecha', 'payment_method'], name='parking_cas_parking_6251b5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'reference_id'), name='unique_cash_movement_per_payment')],
+            },
+        ),
+    ]
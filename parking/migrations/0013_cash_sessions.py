@@ -0,0 +1,84 @@
+# Generated by Django 5.1.3 on 2026-10-19 01:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0012_cash_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puesto', models.CharField(blank=True, max_length=50)),
+                ('fecha', models.DateField()),
+                ('opened_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('dinero_inicial', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('monto', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('dinero_final', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('cuadre_realizado', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='cashbalance',
+            name='unique_cash_balance_per_method',
+        ),
+        migrations.RemoveConstraint(
+            model_name='cashbalance',
+            name='unique_cash_balance_without_method',
+        ),
+        migrations.AddField(
+            model_name='cashsession',
+            name='parking_lot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cash_sessions', to='parking.parkinglot'),
+        ),
+        migrations.AddField(
+            model_name='cashsession',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cash_sessions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='cashbalance',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='parking.cashsession'),
+        ),
+        migrations.AddField(
+            model_name='cashmovement',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='parking.cashsession'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_method__isnull', False), ('session__isnull', False)), fields=('session', 'fecha', 'payment_method'), name='unique_cash_balance_per_session_method'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_method__isnull', True), ('session__isnull', False)), fields=('session', 'fecha'), name='unique_cash_balance_per_session_without_method'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_method__isnull', False), ('session__isnull', True)), fields=('parking_lot', 'fecha', 'payment_method'), name='unique_cash_balance_per_method'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_method__isnull', True), ('session__isnull', True)), fields=('parking_lot', 'fecha'), name='unique_cash_balance_without_method'),
+        ),
+        migrations.AddIndex(
+            model_name='cashsession',
+            index=models.Index(fields=['parking_lot', 'fecha'], name='parking_cas_parking_1c690a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashsession',
+            constraint=models.UniqueConstraint(condition=models.Q(('closed_at__isnull', True)), fields=('parking_lot', 'user'), name='unique_open_cash_session_per_user'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0013_cash_sessions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cashbalance',
+            name='payment_method',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, to='parking.paymentmethod'),
+        ),
+    ]
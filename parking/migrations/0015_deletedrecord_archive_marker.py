@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0014_cash_balance_restrict_payment_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletedrecord',
+            name='archived_before',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Archivados antes de'),
+        ),
+        migrations.AlterField(
+            model_name='deletedrecord',
+            name='object_pk',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='ID del registro'),
+        ),
+    ]
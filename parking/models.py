@@ -147,6 +147,7 @@ class ParkingTicket(models.Model):
     barcode = models.ImageField(upload_to='barcodes/', blank=True)
     monthly_expiry = models.DateTimeField(null=True, blank=True)
     es_mensualidad = models.BooleanField(default=False, verbose_name='Es Mensualidad')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         constraints = [
@@ -161,6 +162,7 @@ class ParkingTicket(models.Model):
             models.Index(fields=['parking_lot', 'placa', 'exit_time']),
             models.Index(fields=['entry_time']),
             models.Index(fields=['payment_method']),
+            models.Index(fields=['parking_lot', 'updated_at']),
         ]
 
     def __str__(self):
@@ -188,10 +190,18 @@ class ParkingTicket(models.Model):
         if not self.entry_time:
             self.entry_time = timezone.now()
         # Si es categoría mensual y no tiene fecha de vencimiento, asignar un mes desde la entrada
-        if self.category.is_monthly and not self.monthly_expiry:
+        if self.monthly_expiry is None and self._category_is_monthly():
             self.monthly_expiry = self.entry_time + timedelta(days=30)
         super().save(*args, **kwargs)
 
+    def _category_is_monthly(self):
+        """Usa la categoría ya cargada o, si solo se tiene el id, los datos de referencia en caché"""
+        if ParkingTicket.category.is_cached(self):
+            return self.category.is_monthly
+        from .reference_cache import get_reference_data
+        category = get_reference_data(self.parking_lot_id).category(self.category_id)
+        return category.is_monthly if category else self.category.is_monthly
+
     """
     def generate_barcode_image(self):
         buffer = BytesIO()
@@ -266,10 +276,56 @@ class ParkingTicket(models.Model):
             'monthly_status': None
         }
 
+# Tickets cerrados movidos fuera de la tabla de operación
+class ArchivedTicket(models.Model):
+    """
+    Ticket cerrado archivado (almacenamiento frío)
+
+    El comando archive_tickets mueve aquí los tickets cerrados antiguos para
+    que la tabla ParkingTicket, que usan las operaciones de entrada y salida,
+    se mantenga del tamaño de la actividad reciente. Conserva el ID original
+    del ticket y solo tiene los índices que necesitan reportes y backups.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='archived_tickets')
+    ticket_id = models.UUIDField(editable=False)
+    category = models.ForeignKey('VehicleCategory', on_delete=models.CASCADE, related_name='+')
+    cliente = models.ForeignKey('Cliente', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    placa = models.CharField(max_length=20)
+    color = models.CharField(max_length=50)
+    marca = models.CharField(max_length=50)
+    cascos = models.IntegerField(null=True, blank=True)
+    entry_time = models.DateTimeField()
+    exit_time = models.DateTimeField()
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    payment_method = models.ForeignKey('PaymentMethod', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Medio de Pago')
+    barcode = models.CharField(max_length=100, blank=True)
+    monthly_expiry = models.DateTimeField(null=True, blank=True)
+    es_mensualidad = models.BooleanField(default=False, verbose_name='Es Mensualidad')
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name='Fecha de archivo')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Ticket Archivado'
+        verbose_name_plural = 'Tickets Archivados'
+        indexes = [
+            models.Index(fields=['parking_lot', 'exit_time']),
+            models.Index(fields=['parking_lot', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.placa} - {self.entry_time.strftime('%Y-%m-%d %H:%M')}"
+
+    def get_duration(self):
+        duration = self.exit_time - self.entry_time
+        return math.ceil(duration.total_seconds() / 3600)
+
+
 # Al final del archivo, añade el modelo Caja si no está
 
 
 class Caja(models.Model):
+    """Cuadre diario de caja anterior a las sesiones por cajero (CashSession); se conserva como histórico"""
     parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='cajas')
     fecha = models.DateField(default=timezone.now)
     tipo = models.CharField(max_length=50, choices=[('Ingreso', 'Ingreso'), ('Egreso', 'Egreso')])
@@ -278,6 +334,7 @@ class Caja(models.Model):
     dinero_inicial = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     dinero_final = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     cuadre_realizado = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('parking_lot', 'fecha', 'tipo')
@@ -289,6 +346,131 @@ class Caja(models.Model):
         return f"{self.parking_lot.empresa} - {self.fecha} - {self.tipo} - ${self.monto}"
 
 
+class CashSession(models.Model):
+    """
+    Sesión de caja de un cajero en un puesto (turno)
+    Cada cajero abre su propia sesión con su base para vueltos y la cierra con
+    el cuadre; los pagos que registra mientras está abierta suman a los saldos
+    de la sesión (CashBalance), sin bloquear a los demás cajeros.
+    """
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='cash_sessions')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='cash_sessions')
+    puesto = models.CharField(max_length=50, blank=True)
+    fecha = models.DateField()  # Fecha local de apertura
+    opened_at = models.DateTimeField(default=timezone.now)
+    closed_at = models.DateTimeField(null=True, blank=True)
+    dinero_inicial = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Total en efectivo de la sesión, guardado al hacer el cuadre
+    monto = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    dinero_final = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    cuadre_realizado = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['parking_lot', 'user'],
+                condition=models.Q(closed_at__isnull=True),
+                name='unique_open_cash_session_per_user',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['parking_lot', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.parking_lot_id} - {self.fecha} - {self.puesto or self.user_id}"
+
+
+class CashMovement(models.Model):
+    """
+    Libro de caja: un registro por cada pago (salida de un ticket o pago de una mensualidad)
+    Se agrega en la misma transacción del pago (ver CashRegisterService.record_movement).
+    Guarda los datos que muestra el cuadre de caja para no volver a leer tickets y mensualidades.
+    """
+    SOURCE_CHOICES = [('ticket', 'Ticket'), ('mensualidad', 'Mensualidad')]
+
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='cash_movements')
+    fecha = models.DateField()  # Fecha local del pago
+    occurred_at = models.DateTimeField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    # Sin llave foránea: la tabla de tickets puede estar particionada (ver partitioning.py)
+    reference_id = models.BigIntegerField()
+    payment_method = models.ForeignKey('PaymentMethod', on_delete=models.SET_NULL, null=True, blank=True)
+    # Sesión abierta del cajero que cobró (None si no tenía sesión)
+    session = models.ForeignKey(CashSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    placa = models.CharField(max_length=20, blank=True)
+    categoria = models.CharField(max_length=50, blank=True)
+    cliente = models.CharField(max_length=200, blank=True)
+    entry_time = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Cada pago entra una sola vez al libro
+            models.UniqueConstraint(fields=['source', 'reference_id'], name='unique_cash_movement_per_payment'),
+        ]
+        indexes = [
+            models.Index(fields=['parking_lot', 'fecha', 'payment_method']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.source} {self.reference_id} - ${self.amount}"
+
+
+class CashBalance(models.Model):
+    """
+    Saldo de caja por día, medio de pago y sesión, actualizado con cada CashMovement
+    El cuadre de caja lee solo esta tabla para los totales: los del día son la
+    suma de los saldos de todas las sesiones (y de los pagos sin sesión).
+    """
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='cash_balances')
+    fecha = models.DateField()
+    # Un medio de pago con saldos no se puede eliminar (ver payment_method_delete);
+    # RESTRICT sí permite eliminar el parqueadero completo, que también borra sus saldos
+    payment_method = models.ForeignKey('PaymentMethod', on_delete=models.RESTRICT, null=True, blank=True)
+    # Las sesiones solo se eliminan junto con el parqueadero
+    session = models.ForeignKey(CashSession, on_delete=models.CASCADE, null=True, blank=True, related_name='balances')
+    tickets_count = models.PositiveIntegerField(default=0)
+    tickets_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    mensualidades_count = models.PositiveIntegerField(default=0)
+    mensualidades_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Un saldo por combinación; los NULL no cuentan como iguales en un índice único,
+        # así que cada caso de medio de pago y sesión nulos tiene su restricción
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session', 'fecha', 'payment_method'],
+                condition=models.Q(session__isnull=False, payment_method__isnull=False),
+                name='unique_cash_balance_per_session_method',
+            ),
+            models.UniqueConstraint(
+                fields=['session', 'fecha'],
+                condition=models.Q(session__isnull=False, payment_method__isnull=True),
+                name='unique_cash_balance_per_session_without_method',
+            ),
+            models.UniqueConstraint(
+                fields=['parking_lot', 'fecha', 'payment_method'],
+                condition=models.Q(session__isnull=True, payment_method__isnull=False),
+                name='unique_cash_balance_per_method',
+            ),
+            models.UniqueConstraint(
+                fields=['parking_lot', 'fecha'],
+                condition=models.Q(session__isnull=True, payment_method__isnull=True),
+                name='unique_cash_balance_without_method',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['parking_lot', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.parking_lot_id} - {self.fecha} - {self.payment_method_id}: ${self.tickets_total + self.mensualidades_total}"
+
+
 # Modelo de Cliente para mensualidades
 class Cliente(models.Model):
     parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='clientes')
@@ -481,3 +663,83 @@ class SubscriptionPayment(models.Model):
         verbose_name = "Pago de Suscripción"
         verbose_name_plural = "Pagos de Suscripción"
         ordering = ['-payment_date']
+
+
+# Registro de eliminaciones para los backups incrementales
+class DeletedRecord(models.Model):
+    """
+    Marca (tombstone) de un registro eliminado de un parqueadero
+
+    Los backups incrementales exportan las marcas posteriores a la marca de
+    agua anterior para poder replicar las eliminaciones al restaurar. No usa
+    una FK real al parqueadero para que las marcas sobrevivan a su borrado.
+
+    El archivo de tickets no deja una marca por ticket sino una por
+    parqueadero y fecha límite (archived_before, sin object_pk): al restaurar
+    se eliminan de ParkingTicket los tickets archivados que salieron antes.
+    """
+    parking_lot = models.ForeignKey(
+        ParkingLot, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    model = models.CharField(max_length=100, verbose_name='Modelo')
+    object_pk = models.BigIntegerField(null=True, blank=True, verbose_name='ID del registro')
+    archived_before = models.DateTimeField(null=True, blank=True, verbose_name='Archivados antes de')
+    deleted_at = models.DateTimeField(default=timezone.now, verbose_name='Fecha de eliminación')
+
+    class Meta:
+        verbose_name = 'Registro Eliminado'
+        verbose_name_plural = 'Registros Eliminados'
+        indexes = [
+            models.Index(fields=['parking_lot', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        if self.archived_before:
+            return f'{self.model} archivados antes de {self.archived_before} - {self.deleted_at}'
+        return f'{self.model} #{self.object_pk} - {self.deleted_at}'
+
+
+# Trabajo de eliminación de un parqueadero en segundo plano
+class ParkingLotDeletion(models.Model):
+    """
+    Eliminación de un parqueadero por lotes fuera del ciclo de la petición
+
+    El parqueadero se desactiva al crear el trabajo; luego sus datos se
+    eliminan en lotes pequeños (transacciones cortas) y se registra el avance.
+    """
+    STATUS_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+
+    parking_lot_id = models.BigIntegerField(verbose_name='ID del parqueadero')
+    user_id = models.BigIntegerField(null=True, blank=True, verbose_name='ID del usuario dueño')
+    empresa = models.CharField(max_length=200, verbose_name='Empresa')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDIENTE', verbose_name='Estado')
+    total_rows = models.BigIntegerField(default=0, verbose_name='Registros a eliminar')
+    deleted_rows = models.BigIntegerField(default=0, verbose_name='Registros eliminados')
+    current_section = models.CharField(max_length=50, blank=True, verbose_name='Sección actual')
+    error = models.TextField(blank=True, verbose_name='Error')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Eliminación de Parqueadero'
+        verbose_name_plural = 'Eliminaciones de Parqueaderos'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.empresa} - {self.get_status_display()}'
+
+    @property
+    def progress(self):
+        """Porcentaje de avance (0-100)"""
+        if self.status == 'COMPLETADO':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, int(self.deleted_rows * 100 / self.total_rows))
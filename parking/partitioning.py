@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Particionamiento mensual de la tabla de tickets (solo PostgreSQL)
+
+Modo opcional: el comando partition_ticket_table convierte
+parking_parkingticket en una tabla particionada por rango de exit_time, con
+una partición por mes y una partición DEFAULT. Los tickets abiertos
+(exit_time NULL) siempre quedan en la partición DEFAULT, y al registrar la
+salida PostgreSQL mueve la fila a la partición de su mes.
+
+Restricciones de PostgreSQL y cómo se resuelven:
+- Las claves primarias y únicas de una tabla particionada deben incluir la
+  columna de partición, y exit_time admite NULL. La tabla padre no tiene
+  PRIMARY KEY; cada partición tiene su propia PRIMARY KEY (id) y el id
+  sigue saliendo de una única secuencia.
+- Por lo mismo, ninguna FK puede apuntar a la tabla particionada: se elimina
+  la restricción de Mensualidad.ticket (Django sigue aplicando SET_NULL).
+- unique_active_plate_per_parking se crea como índice único parcial sobre
+  la partición DEFAULT, que contiene todos los tickets abiertos, así que la
+  regla (una placa activa por parqueadero) se mantiene igual.
+
+Las consultas que filtran por exit_time (reportes, cierre de caja, tickets
+activos con exit_time IS NULL) solo leen las particiones necesarias.
+"""
+
+import logging
+from datetime import date
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+from django.utils import timezone
+
+from .models import Mensualidad, ParkingTicket
+
+
+logger = logging.getLogger(__name__)
+
+TICKET_TABLE = ParkingTicket._meta.db_table
+DEFAULT_PARTITION = f'{TICKET_TABLE}_default'
+LEGACY_TABLE = f'{TICKET_TABLE}_legacy'
+TICKET_SEQUENCE = f'{TICKET_TABLE}_id_seq'
+ACTIVE_PLATE_INDEX = 'unique_active_plate_per_parking'
+
+# Meses futuros con partición creada de antemano
+DEFAULT_MONTHS_AHEAD = 3
+
+
+class PartitioningError(Exception):
+    """La operación de particionamiento no se puede realizar en esta base de datos"""
+
+
+def get_months_ahead():
+    return getattr(settings, 'TICKET_PARTITION_MONTHS_AHEAD', DEFAULT_MONTHS_AHEAD)
+
+
+def month_start(value):
+    """Primer día del mes (hora local) de una fecha o datetime"""
+    if hasattr(value, 'tzinfo') and hasattr(value, 'hour'):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TICKET_TABLE}_p{month.year}_{month.month:02d}'
+
+
+def _bounds(month):
+    """Límites [inicio, fin) del mes como timestamptz en la zona horaria del proyecto"""
+    tz = settings.TIME_ZONE
+    return f"'{month.isoformat()} 00:00:00 {tz}'", f"'{add_months(month, 1).isoformat()} 00:00:00 {tz}'"
+
+
+def is_supported(connection=None):
+    connection = connection or default_connection
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(connection=None):
+    """Indica si la tabla de tickets ya está particionada"""
+    connection = connection or default_connection
+    if not is_supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+            """,
+            [TICKET_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection=None):
+    """
+    Particiones mensuales existentes
+    Retorna: lista de dicts {name, month, rows} ordenada por mes (sin la DEFAULT)
+    """
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, c.reltuples::bigint
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s AND pg_table_is_visible(p.oid)
+            ORDER BY c.relname
+            """,
+            [TICKET_TABLE],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    prefix = f'{TICKET_TABLE}_p'
+    for name, estimated_rows in rows:
+        if not name.startswith(prefix):
+            continue
+        year, month = name[len(prefix):].split('_')
+        partitions.append({
+            'name': name,
+            'month': date(int(year), int(month), 1),
+            'rows': max(estimated_rows, 0),
+        })
+    return partitions
+
+
+def _add_partition_primary_key(cursor, table):
+    cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+
+
+def create_partition(month, connection=None):
+    """
+    Crea la partición de un mes si no existe
+
+    Si la partición DEFAULT ya tiene tickets cerrados en ese mes (porque no
+    había partición cuando salieron), se mueven a la nueva partición antes de
+    adjuntarla, como exige PostgreSQL.
+    Retorna: True si se creó, False si ya existía
+    """
+    connection = connection or default_connection
+    name = partition_name(month)
+    start, end = _bounds(month)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE exit_time >= {start} AND exit_time < {end})'
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f'CREATE TABLE {name} PARTITION OF {TICKET_TABLE} FOR VALUES FROM ({start}) TO ({end})'
+            )
+            _add_partition_primary_key(cursor, name)
+            return True
+
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TICKET_TABLE} INCLUDING DEFAULTS)')
+        _add_partition_primary_key(cursor, name)
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+            f'WHERE exit_time >= {start} AND exit_time < {end} RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        )
+        logger.info('Movidos %s tickets de la partición DEFAULT a %s', cursor.rowcount, name)
+        cursor.execute(
+            f'ALTER TABLE {TICKET_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})'
+        )
+        return True
+
+
+def ensure_future_partitions(months_ahead=None, connection=None):
+    """
+    Crea las particiones del mes actual y de los próximos meses
+    Retorna: lista con los nombres de las particiones creadas
+    """
+    connection = connection or default_connection
+    if not is_partitioned(connection):
+        raise PartitioningError('La tabla de tickets no está particionada')
+
+    months_ahead = get_months_ahead() if months_ahead is None else months_ahead
+    current = month_start(timezone.now())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if create_partition(month, connection=connection):
+            created.append(partition_name(month))
+    return created
+
+
+def convert_ticket_table(months_ahead=None, connection=None):
+    """
+    Convierte la tabla de tickets en una tabla particionada por mes
+
+    Se ejecuta en una sola transacción: renombra la tabla actual, crea la
+    tabla particionada con sus particiones (desde el mes de la salida más
+    antigua hasta months_ahead meses adelante), copia los datos y recrea
+    secuencia, índices, FKs y el índice único de placas activas.
+    Retorna: dict con success, filas copiadas y particiones creadas
+    """
+    connection = connection or default_connection
+    if not is_supported(connection):
+        raise PartitioningError('El particionamiento de tickets solo está disponible en PostgreSQL')
+    if is_partitioned(connection):
+        raise PartitioningError('La tabla de tickets ya está particionada')
+
+    months_ahead = get_months_ahead() if months_ahead is None else months_ahead
+    model = ParkingTicket
+    mensualidad_ticket = Mensualidad._meta.get_field('ticket')
+
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {TICKET_TABLE} IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'SELECT min(exit_time), max(id) FROM {TICKET_TABLE}')
+            oldest_exit, max_id = cursor.fetchone()
+
+            # Ninguna FK puede apuntar a una tabla particionada sin clave primaria global
+            constraints = connection.introspection.get_constraints(cursor, Mensualidad._meta.db_table)
+            for name, constraint in constraints.items():
+                if constraint['foreign_key'] and constraint['columns'] == [mensualidad_ticket.column]:
+                    cursor.execute(f'ALTER TABLE {Mensualidad._meta.db_table} DROP CONSTRAINT {name}')
+
+            cursor.execute(f'ALTER TABLE {TICKET_TABLE} RENAME TO {LEGACY_TABLE}')
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [LEGACY_TABLE, 'id'])
+            legacy_sequence = cursor.fetchone()[0]
+            if legacy_sequence:
+                cursor.execute(f'ALTER SEQUENCE {legacy_sequence} RENAME TO {LEGACY_TABLE}_id_seq')
+            cursor.execute(
+                f'CREATE TABLE {TICKET_TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (exit_time)'
+            )
+            # La identidad de la tabla anterior se reemplaza por una secuencia propia
+            cursor.execute(f'CREATE SEQUENCE {TICKET_SEQUENCE} OWNED BY {TICKET_TABLE}.id')
+            cursor.execute(
+                f"ALTER TABLE {TICKET_TABLE} ALTER COLUMN id SET DEFAULT nextval('{TICKET_SEQUENCE}')"
+            )
+            if max_id:
+                cursor.execute('SELECT setval(%s, %s)', [TICKET_SEQUENCE, max_id])
+
+            cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TICKET_TABLE} DEFAULT')
+            _add_partition_primary_key(cursor, DEFAULT_PARTITION)
+
+        first_month = month_start(oldest_exit) if oldest_exit else month_start(timezone.now())
+        last_month = add_months(month_start(timezone.now()), months_ahead)
+        created = []
+        month = first_month
+        while month <= last_month:
+            create_partition(month, connection=connection)
+            created.append(partition_name(month))
+            month = add_months(month, 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {TICKET_TABLE} SELECT * FROM {LEGACY_TABLE}')
+            copied = cursor.rowcount
+            # Libera los nombres de índices y restricciones que se recrean abajo
+            cursor.execute(f'DROP TABLE {LEGACY_TABLE}')
+
+            cursor.execute(
+                f'CREATE UNIQUE INDEX {ACTIVE_PLATE_INDEX} ON {DEFAULT_PARTITION} (parking_lot_id, placa) '
+                f'WHERE exit_time IS NULL'
+            )
+
+        # Índices y FKs con los mismos nombres que genera Django para el modelo
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for field in model._meta.local_fields:
+                for sql in schema_editor._field_indexes_sql(model, field):
+                    schema_editor.execute(sql)
+                if field.remote_field and field.db_constraint:
+                    schema_editor.execute(
+                        schema_editor._create_fk_sql(model, field, '_fk_%(to_table)s_%(to_column)s')
+                    )
+            for index in model._meta.indexes:
+                schema_editor.add_index(model, index)
+
+        with connection.cursor() as cursor:
+            # Estadísticas para el planificador (las tablas nuevas no tienen)
+            cursor.execute(f'ANALYZE {TICKET_TABLE}')
+
+    return {
+        'success': True,
+        'rows': copied,
+        'partitions': created,
+    }
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks de las funciones más usadas y presupuesto de consultas por vista
+
+Mide, sobre un parqueadero de prueba creado con parking/loadgen.py dentro de
+una transacción que se revierte al final:
+- funciones: tiempo por llamada (mínimo de varias repeticiones, como timeit)
+  y consultas SQL por llamada
+- vistas: consultas SQL por request (el presupuesto) y mediana del tiempo,
+  con toda la cadena de middlewares (django.test.Client)
+
+La línea base se guarda en PERF_BASELINE_FILE (JSON en el repositorio),
+separada por motor de base de datos porque el número de consultas y los
+tiempos cambian entre SQLite y PostgreSQL. Una medición es una regresión si:
+- hace más consultas que la línea base (el presupuesto no tiene tolerancia)
+- tarda más que la línea base por encima de la tolerancia relativa y de un
+  mínimo absoluto (para no fallar por ruido en funciones de microsegundos)
+
+Los tiempos dependen de la máquina: en otra máquina solo se comparan las
+consultas (ver el comando perf_budget --queries-only).
+"""
+
+import gc
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import loadgen
+
+
+DEFAULT_TIME_TOLERANCE = 0.25
+# Diferencias absolutas por debajo de estas no cuentan como regresión
+MIN_FUNCTION_DELTA_US = 2.0
+MIN_VIEW_DELTA_MS = 2.0
+
+# Cada repetición de una función dura al menos esto (ver timeit.Timer.autorange)
+MIN_REPEAT_SECONDS = 0.05
+FUNCTION_REPEATS = 5
+VIEW_REPEATS = 20
+
+# Tamaño del parqueadero de prueba
+FIXTURE_TICKETS = 2000
+FIXTURE_OPEN_TICKETS = 60
+FIXTURE_CLIENTES = 30
+FIXTURE_CATEGORIES = 5
+
+ROLE_FILTERS = (
+    'has_group', 'is_admin', 'is_cajero', 'is_operador',
+    'can_access_admin', 'can_access_reports', 'can_access_cash_register',
+)
+
+
+def get_baseline_file():
+    return getattr(settings, 'PERF_BASELINE_FILE', os.path.join(settings.BASE_DIR, 'parking', 'perf_baseline.json'))
+
+
+class Fixture:
+    """Parqueadero de prueba con sus usuarios y algunos objetos de referencia"""
+
+    def __init__(self, parking_lot):
+        from .models import Mensualidad, ParkingTicket, UserParkingLot
+
+        self.parking_lot = parking_lot
+        self.owner = parking_lot.user
+        self.cashier = UserParkingLot.objects.filter(parking_lot=parking_lot).select_related('user').first().user
+        tickets = ParkingTicket.objects.filter(parking_lot=parking_lot).select_related('category', 'payment_method')
+        self.closed_tickets = list(tickets.filter(exit_time__isnull=False).order_by('-exit_time'))
+        self.open_ticket = tickets.filter(exit_time__isnull=True).first()
+        # Tickets para las salidas; open_ticket queda abierto para las búsquedas
+        self.open_ticket_ids = list(
+            tickets.filter(exit_time__isnull=True).exclude(id=self.open_ticket.id).values_list('id', flat=True)
+        )
+        self.mensualidad = Mensualidad.objects.filter(parking_lot=parking_lot).first()
+        self.category_id = parking_lot.categories.filter(is_monthly=False).values_list('id', flat=True)[0]
+        self.payment_method_id = parking_lot.payment_methods.values_list('id', flat=True)[0]
+        self.entries = 0
+
+    def next_plate(self):
+        self.entries += 1
+        return f'PRF{self.entries:03d}'
+
+    def next_open_ticket(self):
+        return self.open_ticket_ids.pop()
+
+
+def build_fixture():
+    parking_lot, = loadgen.seed_tenants(
+        1, categories=FIXTURE_CATEGORIES, clientes=FIXTURE_CLIENTES, tickets=FIXTURE_TICKETS, years=1,
+        open_tickets=FIXTURE_OPEN_TICKETS, cashiers=1,
+    )
+    return Fixture(parking_lot)
+
+
+def function_cases(fixture):
+    """
+    Funciones a medir
+    Retorna: lista de (nombre, función sin argumentos)
+    """
+    from .middleware import TenantMiddleware
+    from .principal import build_principal
+    from .reports import generate_chart_data
+    from .services import ReportService, TicketService
+    from .templatetags import user_roles
+
+    closed = fixture.closed_tickets[0]
+    opened = fixture.open_ticket
+    now = timezone.now()
+    month_start = now - timedelta(days=30)
+
+    middleware = TenantMiddleware(lambda request: None)
+    tenant_request = RequestFactory().get('/dashboard/')
+    principal = build_principal(fixture.cashier)
+    tenant_request.user = principal.to_user()
+    tenant_request.principal = principal
+    tenant_request.tenant_version = None
+    user = principal.to_user()
+
+    cases = [
+        ('ParkingTicket.calculate_fee (cerrado)', closed.calculate_fee),
+        ('ParkingTicket.calculate_fee (abierto)', opened.calculate_fee),
+        ('TicketService.calculate_fee (cerrado)', lambda: TicketService.calculate_fee(closed)),
+        ('TicketService.calculate_fee (abierto)', lambda: TicketService.calculate_fee(opened)),
+        ('ParkingTicket.get_barcode_base64', closed.get_barcode_base64),
+        (f'generate_chart_data ({len(fixture.closed_tickets)} tickets)',
+         lambda: generate_chart_data(fixture.closed_tickets, month_start, now)),
+        ('ReportService.get_payment_method_summary (30 días)',
+         lambda: ReportService.get_payment_method_summary(fixture.parking_lot, month_start, now)),
+        ('TenantMiddleware.process_request', lambda: middleware.process_request(tenant_request)),
+    ]
+    for name in ROLE_FILTERS:
+        func = getattr(user_roles, name)
+        if name == 'has_group':
+            cases.append((f'filtro {name}', lambda func=func: func(user, 'Cajero')))
+        else:
+            cases.append((f'filtro {name}', lambda func=func: func(user)))
+    return cases
+
+
+def view_cases(fixture):
+    """
+    Vistas con presupuesto de consultas
+    Retorna: lista de (nombre, usuario, método, URL, función que arma los datos o None)
+    """
+    owner, cashier = fixture.owner, fixture.cashier
+    return [
+        ('dashboard', cashier, 'GET', reverse('dashboard'), None),
+        ('vehicle-entry', cashier, 'GET', reverse('vehicle-entry'), None),
+        ('vehicle-entry POST', cashier, 'POST', reverse('vehicle-entry'), lambda: {
+            'category': fixture.category_id, 'placa': fixture.next_plate(), 'color': 'Blanco', 'marca': 'Renault',
+        }),
+        ('vehicle-exit', cashier, 'GET', reverse('vehicle-exit'), None),
+        ('vehicle-exit POST', cashier, 'POST', reverse('vehicle-exit'),
+         lambda: {'identifier': fixture.open_ticket.placa}),
+        ('print-exit-ticket POST', cashier, 'POST', reverse('print-exit-ticket'), lambda: {
+            'ticket_id': fixture.next_open_ticket(), 'amount_received': 100000,
+            'payment_method': fixture.payment_method_id,
+        }),
+        ('print-ticket (reimpresión)', cashier, 'GET', reverse('print-ticket'),
+         lambda: {'ticket_id': fixture.closed_tickets[0].id}),
+        ('validate-plate', cashier, 'GET', reverse('validate-plate', args=[fixture.open_ticket.placa]), None),
+        ('cash_register', cashier, 'GET', reverse('cash_register'), None),
+        ('reports (30 días)', owner, 'GET', reverse('reports'), lambda: {
+            'filter_type': 'custom',
+            'start_date': (timezone.localdate() - timedelta(days=30)).isoformat(),
+            'end_date': timezone.localdate().isoformat(),
+        }),
+        ('category-list', owner, 'GET', reverse('category-list'), None),
+        ('cliente-list', owner, 'GET', reverse('cliente-list'), None),
+        ('mensualidad-list', owner, 'GET', reverse('mensualidad-list'), None),
+        ('mensualidad-detail', owner, 'GET', reverse('mensualidad-detail', args=[fixture.mensualidad.pk]), None),
+        ('payment-method-list', owner, 'GET', reverse('payment-method-list'), None),
+        ('user-list', owner, 'GET', reverse('user-list'), None),
+        ('company_profile', owner, 'GET', reverse('company_profile'), None),
+    ]
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as captured:
+        func()
+    return len(captured.captured_queries)
+
+
+def measure_function(func, repeats=FUNCTION_REPEATS):
+    """
+    Tiempo por llamada en microsegundos y consultas por llamada
+    Retorna: dict {'us': float, 'queries': int}
+    """
+    func()  # calentamiento
+    queries = count_queries(func)
+
+    def timed(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+
+    # Igual que timeit: sin el recolector de basura durante la medición
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = 1
+        while True:
+            elapsed = timed(number)
+            if elapsed >= MIN_REPEAT_SECONDS:
+                break
+            number *= 2 if elapsed * 10 >= MIN_REPEAT_SECONDS else 10
+        timings = [elapsed] + [timed(number) for _ in range(repeats - 1)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {'us': round(min(timings) / number * 1e6, 3), 'queries': queries}
+
+
+class ViewMeasurementError(Exception):
+    pass
+
+
+def measure_view(client, method, url, data_factory, repeats=VIEW_REPEATS):
+    """
+    Mediana del tiempo en milisegundos y máximo de consultas por request
+    Retorna: dict {'ms': float, 'queries': int}
+    """
+    handler = client.post if method == 'POST' else client.get
+    timings = []
+    queries = 0
+    for position in range(repeats + 1):
+        data = data_factory() if data_factory else {}
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = handler(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400 or (method == 'GET' and response.status_code != 200):
+            raise ViewMeasurementError(f'{method} {url} respondió {response.status_code}')
+        if position:  # el primer request llena los cachés
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(captured.captured_queries))
+    return {'ms': round(statistics.median(timings), 3), 'queries': queries}
+
+
+def run(include_functions=True, include_views=True, log=None):
+    """
+    Ejecuta la suite sobre un parqueadero de prueba que se revierte al final
+    Usa un caché local y un MEDIA_ROOT temporal para no tocar los compartidos.
+    Retorna: dict {'functions': {...}, 'views': {...}}
+    """
+    results = {'functions': {}, 'views': {}}
+    cache_settings = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'perf-budget',
+    }}
+    with tempfile.TemporaryDirectory() as media_root, \
+            override_settings(CACHES=cache_settings, MEDIA_ROOT=media_root, DEBUG=False):
+        with transaction.atomic():
+            fixture = build_fixture()
+            if include_functions:
+                for name, func in function_cases(fixture):
+                    results['functions'][name] = measure_function(func)
+                    if log:
+                        log(name, results['functions'][name])
+            if include_views:
+                clients = {}
+                for name, user, method, url, data_factory in view_cases(fixture):
+                    client = clients.get(user.pk)
+                    if client is None:
+                        client = clients[user.pk] = Client()
+                        client.force_login(user)
+                    results['views'][name] = measure_view(client, method, url, data_factory)
+                    if log:
+                        log(name, results['views'][name])
+            transaction.set_rollback(True)
+    return results
+
+
+def load_baseline(path=None):
+    path = path or get_baseline_file()
+    if not os.path.exists(path):
+        return {'vendors': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_baseline(results, vendor, path=None):
+    """Reemplaza las mediciones del motor `vendor` en la línea base"""
+    path = path or get_baseline_file()
+    baseline = load_baseline(path)
+    vendor_baseline = baseline['vendors'].setdefault(vendor, {'functions': {}, 'views': {}})
+    for section in ('functions', 'views'):
+        if results[section]:
+            vendor_baseline[section] = results[section]
+    vendor_baseline['updated_at'] = timezone.now().isoformat(timespec='seconds')
+    vendor_baseline['commit'] = current_commit()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write('\n')
+    return path
+
+
+def compare(results, vendor_baseline, tolerance=DEFAULT_TIME_TOLERANCE, check_time=True):
+    """
+    Compara con la línea base de un motor
+    Retorna: lista de (sección, nombre, actual, base, estado) con estado
+    'ok', 'regresión', 'mejora' o 'nuevo'
+    """
+    rows = []
+    for section, unit, min_delta in (('functions', 'us', MIN_FUNCTION_DELTA_US), ('views', 'ms', MIN_VIEW_DELTA_MS)):
+        previous = vendor_baseline.get(section, {})
+        for name, current in results[section].items():
+            base = previous.get(name)
+            if base is None:
+                status = 'nuevo'
+            elif current['queries'] > base['queries']:
+                status = 'regresión'
+            elif check_time and current[unit] > base[unit] * (1 + tolerance) and current[unit] - base[unit] > min_delta:
+                status = 'regresión'
+            elif current['queries'] < base['queries'] or (
+                check_time and current[unit] < base[unit] / (1 + tolerance) and base[unit] - current[unit] > min_delta
+            ):
+                status = 'mejora'
+            else:
+                status = 'ok'
+            rows.append((section, name, current, base, status))
+    return rows
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Identidad del usuario autenticado (principal) guardada en la sesión
+
+Al iniciar sesión se guarda en la sesión, firmado, un Principal con el id,
+los datos básicos del usuario, su parqueadero, sus roles y una versión. En
+cada request PrincipalMiddleware revalida la versión contra un contador en
+el caché (un get_many que también trae la versión del parqueadero, ver
+tenant_cache.py) y construye request.user sin consultar la base de datos.
+
+La versión del usuario cambia cuando se guarda o se elimina el usuario
+(contraseña, estado, datos), cambian sus grupos o su asignación a un
+parqueadero (ver parking/signals.py). Con una versión vieja o ausente el
+request sigue el camino normal de Django (carga el usuario y verifica el hash
+de la sesión) y se guarda un principal nuevo. La versión vence como las de
+tenant_cache (context_cache_timeout), así que con un caché por proceso un
+cambio hecho en otro proceso se aplica como máximo en ese tiempo.
+"""
+
+import time
+from collections import namedtuple
+
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.base import ModelState
+
+from . import roles, tenant_cache
+
+
+PRINCIPAL_SESSION_KEY = '_parking_principal'
+PRINCIPAL_SALT = 'parking.principal'
+
+# Campos del usuario copiados al principal
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+
+class Principal(namedtuple('Principal', USER_FIELDS + ('parking_lot_id', 'roles', 'version'))):
+    """Usuario autenticado con su parqueadero y roles"""
+
+    __slots__ = ()
+
+    def to_user(self):
+        """
+        Instancia de User con los campos del principal, sin consultar la base de datos
+        Los demás campos (contraseña, fechas) quedan diferidos.
+        """
+        user = User.__new__(User)
+        user.__dict__.update(zip(USER_FIELDS, self))
+        user._state = ModelState()
+        user._state.adding = False
+        user._state.db = DEFAULT_DB_ALIAS
+        # Los filtros de roles leen de aquí (ver parking/roles.py)
+        user._parking_roles = frozenset(self.roles)
+        user.principal = self
+        return user
+
+    def owns(self, parking_lot_id):
+        """El usuario puede acceder a los datos del parqueadero"""
+        return self.is_superuser or (parking_lot_id is not None and parking_lot_id == self.parking_lot_id)
+
+
+def _version_key(user_id):
+    return f'principal_version_{user_id}'
+
+
+def get_version(user_id):
+    """Versión actual del usuario (timestamp, igual que en tenant_cache)"""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), tenant_cache.context_cache_timeout())
+        version = cache.get(key)
+    return version
+
+
+def invalidate_principal(*user_ids):
+    """Los principals guardados en las sesiones de estos usuarios dejan de ser válidos"""
+    cache.set_many(
+        {_version_key(user_id): time.time_ns() for user_id in user_ids}, tenant_cache.context_cache_timeout()
+    )
+
+
+def build_principal(user):
+    parking_lot_id = None
+    if not user.is_superuser:
+        parking_lot_id = tenant_cache._resolve_parking_lot_id(user.pk)
+    return Principal(
+        *[getattr(user, name) for name in USER_FIELDS],
+        parking_lot_id=parking_lot_id,
+        roles=sorted(roles.get_user_roles(user)),
+        version=get_version(user.pk),
+    )
+
+
+def store_principal(request, user):
+    """Guarda el principal del usuario en la sesión"""
+    principal = build_principal(user)
+    request.session[PRINCIPAL_SESSION_KEY] = signing.dumps(list(principal), salt=PRINCIPAL_SALT, compress=True)
+    return principal
+
+
+def load_principal(request):
+    """
+    Principal válido de la sesión y la versión del parqueadero
+    Retorna: (Principal, versión del parqueadero) o (None, None) si no hay o
+    está vencido
+    """
+    token = request.session.get(PRINCIPAL_SESSION_KEY)
+    if not token:
+        return None, None
+    try:
+        principal = Principal(*signing.loads(token, salt=PRINCIPAL_SALT))
+    except (signing.BadSignature, TypeError):
+        return None, None
+
+    # El principal debe ser del usuario de la sesión
+    if str(principal.id) != str(request.session.get(SESSION_KEY)) or not request.session.get(HASH_SESSION_KEY):
+        return None, None
+
+    keys = [_version_key(principal.id)]
+    if principal.parking_lot_id:
+        keys.append(tenant_cache._version_key(principal.parking_lot_id))
+    values = cache.get_many(keys)
+    # Sin versión en el caché (expirada o caché reiniciado) el principal no se puede validar
+    version = values.get(keys[0])
+    if version is None or version != principal.version:
+        return None, None
+    return principal, values.get(keys[-1]) if principal.parking_lot_id else None
+
+
+def get_principal(user):
+    """Principal del request si el usuario viene de PrincipalMiddleware"""
+    return getattr(user, 'principal', None)
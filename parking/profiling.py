@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Perfilado bajo demanda de requests (cProfile + traza SQL)
+
+ProfilingMiddleware perfila un request solo si trae la cabecera
+X-Parking-Profile o el parámetro ?_profile= y además:
+- el usuario es superusuario, o
+- el valor es un token firmado generado por un superusuario en
+  /superadmin/profiles/ para un usuario concreto, y el request viene de la
+  sesión autenticada de ese usuario (vence en PROFILE_TOKEN_MAX_AGE segundos).
+  Sirve para perfilar una vista con los datos de un parqueadero desde su
+  propia sesión, ya que el superusuario no tiene parqueadero asignado; un
+  token filtrado no sirve desde otra sesión ni sin sesión.
+
+Sin cabecera ni parámetro el costo es una búsqueda en request.META.
+
+Cada perfil se guarda en PROFILE_DIR como dos archivos:
+- <id>.prof: estadísticas de cProfile (se abren con pstats o snakeviz)
+- <id>.json: datos del request y la traza de SQL con tiempos
+Solo se conservan los últimos PROFILE_RETENTION perfiles.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.utils import timezone
+
+
+PROFILE_HEADER = 'HTTP_X_PARKING_PROFILE'
+PROFILE_PARAM = '_profile'
+PROFILE_TOKEN_SALT = 'parking.profiling'
+
+DEFAULT_PROFILE_RETENTION = 50
+DEFAULT_PROFILE_TOKEN_MAX_AGE = 60 * 60
+# Consultas guardadas por perfil (las demás solo se cuentan)
+MAX_SQL_STATEMENTS = 2000
+
+PROFILE_ID_RE = re.compile(r'^\d{8}T\d{6}\.\d{6}-[0-9a-f]{8}$')
+
+
+def get_profile_dir():
+    return getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def make_token(user, for_user):
+    """Token firmado por `user` que habilita el perfilado desde la sesión de `for_user`"""
+    return signing.dumps({'by': user.username, 'uid': for_user.pk}, salt=PROFILE_TOKEN_SALT)
+
+
+def check_token(value, user):
+    """
+    Valida un token de make_token para el usuario del request
+    Retorna: nombre del superusuario que lo generó o None (token inválido,
+    vencido o emitido para otro usuario)
+    """
+    if not user.is_authenticated:
+        return None
+    max_age = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', DEFAULT_PROFILE_TOKEN_MAX_AGE)
+    try:
+        payload = signing.loads(value, salt=PROFILE_TOKEN_SALT, max_age=max_age)
+        if payload['uid'] != user.pk:
+            return None
+        return payload['by']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+class SQLTrace:
+    """execute_wrapper que guarda cada consulta con sus parámetros y su tiempo"""
+
+    def __init__(self):
+        self.statements = []
+        self.count = 0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if len(self.statements) < MAX_SQL_STATEMENTS:
+                self.statements.append({
+                    'ms': round(elapsed * 1000, 3),
+                    'sql': sql,
+                    'params': repr(params)[:500],
+                    'many': many,
+                })
+
+
+class ProfilingMiddleware:
+    """
+    Perfila el resto de la cadena (middlewares siguientes y vista) cuando se pide
+    Va después de PrincipalMiddleware para conocer al usuario.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        flag = request.META.get(PROFILE_HEADER)
+        if flag is None and PROFILE_PARAM in request.META.get('QUERY_STRING', ''):
+            flag = request.GET.get(PROFILE_PARAM)
+        if flag is None:
+            return self.get_response(request)
+
+        requested_by = self.authorize(request, flag)
+        if requested_by is None:
+            return self.get_response(request)
+        return self.profile(request, requested_by)
+
+    def authorize(self, request, flag):
+        if request.user.is_authenticated and request.user.is_superuser:
+            return request.user.username
+        return check_token(flag, request.user)
+
+    def profile(self, request, requested_by):
+        profiler = cProfile.Profile()
+        trace = SQLTrace()
+        started_at = timezone.now()
+        start = time.perf_counter()
+        with connection.execute_wrapper(trace):
+            try:
+                profiler.enable()
+            except ValueError:
+                # Otro perfilador activo en el hilo
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        parking_lot = getattr(request, 'current_parking_lot', None)
+        profile_id = save_profile(profiler, {
+            'started_at': started_at.isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'user': request.user.get_username() if request.user.is_authenticated else None,
+            'parking_lot_id': parking_lot.pk if parking_lot else None,
+            'requested_by': requested_by,
+            'duration_ms': round(duration * 1000, 1),
+            'sql_count': trace.count,
+            'sql_ms': round(trace.total * 1000, 1),
+            'sql': trace.statements,
+        })
+        response['X-Parking-Profile-Id'] = profile_id
+        return response
+
+
+def save_profile(profiler, data):
+    """Guarda el perfil y aplica la retención; retorna el id"""
+    directory = get_profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{timezone.now().strftime('%Y%m%dT%H%M%S.%f')}-{uuid.uuid4().hex[:8]}"
+    data['id'] = profile_id
+    profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    apply_retention(directory)
+    return profile_id
+
+
+def apply_retention(directory):
+    retention = getattr(settings, 'PROFILE_RETENTION', DEFAULT_PROFILE_RETENTION)
+    profile_ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+    for profile_id in profile_ids[:-retention] if retention else profile_ids:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Resumen de los perfiles guardados, del más reciente al más antiguo"""
+    directory = get_profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            data = load_profile(name[:-5])
+        except (OSError, ValueError):
+            continue
+        data.pop('sql', None)
+        profiles.append(data)
+    return profiles
+
+
+def profile_path(profile_id, extension):
+    if not PROFILE_ID_RE.match(profile_id):
+        raise FileNotFoundError(profile_id)
+    return os.path.join(get_profile_dir(), profile_id + extension)
+
+
+def load_profile(profile_id):
+    with open(profile_path(profile_id, '.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_stats(profile_id, sort='cumulative', limit=60):
+    """Las funciones más costosas del perfil como texto de pstats"""
+    output = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id, '.prof'), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
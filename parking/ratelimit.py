@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Limitador de peticiones con ventana deslizante sobre el caché compartido
+
+Cada límite cuenta en ventanas fijas de `window` segundos y estima la ventana
+deslizante ponderando la ventana anterior:
+
+    estimado = anterior * (1 - fracción transcurrida) + actual
+
+Los contadores se incrementan con cache.incr/cache.add, que son atómicos en
+Redis y en LocMemCache, así que no hay carreras de leer-y-escribir entre
+peticiones concurrentes. La ventana anterior ya está cerrada, así que su
+valor se lee una vez por proceso y se guarda en memoria hasta que cambia la
+ventana.
+
+Viajes al caché por verificación (caso normal):
+- hit() con N identificadores: N incr (+1 get_many la primera vez en cada ventana).
+- is_limited() / is_any_limited() con N identificadores: 1 get_many.
+- reset(): 1 delete_many.
+
+Los límites se configuran en settings.RATE_LIMITS como {nombre: (límite, segundos)}.
+"""
+
+import time
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+
+from .utils import get_client_ip
+
+
+RateLimitResult = namedtuple('RateLimitResult', ['limited', 'count', 'retry_after'])
+
+
+def get_rate(name):
+    """(límite, segundos) configurados en settings.RATE_LIMITS"""
+    try:
+        return getattr(settings, 'RATE_LIMITS', {})[name]
+    except KeyError:
+        raise ImproperlyConfigured(f'Falta el límite "{name}" en settings.RATE_LIMITS') from None
+
+
+class SlidingWindowLimiter:
+    """Límite de `limit` eventos por `window` segundos para cada identificador"""
+
+    def __init__(self, name, limit=None, window=None):
+        if limit is None or window is None:
+            configured_limit, configured_window = get_rate(name)
+            limit = limit or configured_limit
+            window = window or configured_window
+        self.name = name
+        self.limit = limit
+        self.window = window
+        # Valores de la ventana anterior leídos por este proceso: (índice, {clave: valor})
+        self._previous = (None, {})
+
+    def _windows(self, now):
+        index, elapsed = divmod(now, self.window)
+        return int(index), elapsed / self.window
+
+    def _key(self, identifier, index):
+        return f'rl:{self.name}:{identifier}:{index}'
+
+    def _previous_counts(self, index):
+        previous_index, counts = self._previous
+        if previous_index != index - 1:
+            counts = {}
+            self._previous = (index - 1, counts)
+        return counts
+
+    def _read_keys(self, identifier, index):
+        """Claves que hay que leer del caché para estimar sin registrar un evento"""
+        keys = [self._key(identifier, index)]
+        previous_key = self._key(identifier, index - 1)
+        if previous_key not in self._previous_counts(index):
+            keys.append(previous_key)
+        return keys
+
+    def _estimate(self, identifier, index, fraction, current, values):
+        previous = self._previous_counts(index)
+        previous_key = self._key(identifier, index - 1)
+        if previous_key not in previous:
+            previous[previous_key] = values.get(previous_key, 0)
+        return previous[previous_key] * (1 - fraction) + current
+
+    def _incr(self, key):
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Primera petición de la ventana; si otra petición la creó primero se incrementa
+            if cache.add(key, 1, self.window * 2):
+                return 1
+            return cache.incr(key)
+
+    def hit(self, *identifiers):
+        """
+        Registra un evento para cada identificador
+        Retorna: RateLimitResult con el estimado más alto entre los identificadores
+        """
+        index, fraction = self._windows(time.time())
+        currents = [self._incr(self._key(identifier, index)) for identifier in identifiers]
+        missing = [key for identifier in identifiers for key in self._read_keys(identifier, index)[1:]]
+        values = cache.get_many(missing) if missing else {}
+        count = max(
+            self._estimate(identifier, index, fraction, current, values)
+            for identifier, current in zip(identifiers, currents)
+        )
+        limited = count > self.limit
+        retry_after = int(self.window * (1 - fraction)) + 1 if limited else 0
+        return RateLimitResult(limited, count, retry_after)
+
+    def is_limited(self, *identifiers):
+        """Indica si algún identificador ya alcanzó el límite, sin registrar un evento"""
+        return is_any_limited(*[(self, identifier) for identifier in identifiers])
+
+    def reset(self, *identifiers):
+        """Borra los contadores de los identificadores (por ejemplo, tras un login exitoso)"""
+        index, _ = self._windows(time.time())
+        previous = self._previous_counts(index)
+        keys = []
+        for identifier in identifiers:
+            keys += [self._key(identifier, index), self._key(identifier, index - 1)]
+            previous[self._key(identifier, index - 1)] = 0
+        cache.delete_many(keys)
+
+
+def is_any_limited(*checks):
+    """
+    Verifica varios pares (limitador, identificador) con un solo get_many
+    Retorna: True si alguno ya alcanzó su límite
+    """
+    now = time.time()
+    windows = [limiter._windows(now) for limiter, _ in checks]
+    keys = []
+    for (limiter, identifier), (index, _) in zip(checks, windows):
+        keys += limiter._read_keys(identifier, index)
+    values = cache.get_many(keys)
+    for (limiter, identifier), (index, fraction) in zip(checks, windows):
+        current = values.get(limiter._key(identifier, index), 0)
+        if limiter._estimate(identifier, index, fraction, current, values) >= limiter.limit:
+            return True
+    return False
+
+
+def rate_limit(prefix):
+    """
+    Decorador para vistas de la operación diaria: limita por IP y por parqueadero
+    Usa los límites `<prefix>_ip` y `<prefix>_tenant`. Responde 429 en JSON
+    con la cabecera Retry-After.
+    """
+    def decorator(view_func):
+        ip_limiter = SlidingWindowLimiter(f'{prefix}_ip')
+        tenant_limiter = SlidingWindowLimiter(f'{prefix}_tenant')
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            results = [ip_limiter.hit(get_client_ip(request))]
+            parking_lot = getattr(request, 'current_parking_lot', None)
+            if parking_lot:
+                results.append(tenant_limiter.hit(parking_lot.pk))
+            limited = [result for result in results if result.limited]
+            if limited:
+                retry_after = max(result.retry_after for result in limited)
+                response = JsonResponse(
+                    {'error': 'Demasiadas solicitudes. Intenta de nuevo en unos segundos.'},
+                    status=429,
+                )
+                response['Retry-After'] = str(retry_after)
+                return response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
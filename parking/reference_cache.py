@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Datos de referencia de cada parqueadero (tenant): categorías y medios de pago,
+y los planes de suscripción activos
+
+Casi todas las operaciones (entrada, salida, cobro, cuadre de caja) leen
+estas tablas pequeñas que casi nunca cambian. En lugar de consultarlas en
+cada request se sirven instantáneas inmutables: tuplas de namedtuples con los
+campos que usan las vistas, y en los medios de pago la marca is_cash ya
+calculada (el efectivo es el que se cuenta en el cuadre de caja).
+
+Niveles de caché (igual que tenant_cache):
+- Caché compartido: la versión de los datos de cada parqueadero y la de los
+  planes. Es la única consulta al caché compartido por lectura.
+- LRU en memoria del proceso, por (id del parqueadero, versión): la
+  instantánea. Detrás está el caché compartido y por último la base de datos.
+
+Invalidación: al guardar o eliminar una categoría, un medio de pago o un
+parqueadero, las señales cambian la versión del parqueadero; al guardar o
+eliminar un plan, la versión de los planes (ver parking/signals.py). Las
+escrituras masivas que no envían señales (bulk_create, update) deben llamar
+a invalidate_parking_lot. Las versiones y las instantáneas vencen como en
+tenant_cache (context_cache_timeout), así que con un caché por proceso los
+cambios hechos en otro proceso se ven al vencer la versión.
+"""
+
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.base import ModelState
+
+from .models import PaymentMethod, SubscriptionPlan, VehicleCategory
+from .tenant_cache import context_cache_timeout
+
+
+# Campos copiados a las instantáneas
+CATEGORY_FIELDS = (
+    'id', 'parking_lot_id', 'name', 'first_hour_rate', 'additional_hour_rate', 'is_monthly', 'monthly_rate',
+)
+PAYMENT_METHOD_FIELDS = (
+    'id', 'parking_lot_id', 'nombre', 'descripcion', 'icono', 'color', 'is_active', 'orden',
+)
+PLAN_FIELDS = ('id', 'name', 'plan_type', 'price', 'duration_days', 'description', 'is_active')
+
+# Nombre del medio de pago que se cuenta en el cuadre de caja
+CASH_METHOD_NAME = 'efectivo'
+
+# Instantáneas guardadas en memoria por proceso
+REFERENCE_LRU_SIZE = 1024
+
+PLANS_VERSION_KEY = 'reference_plans_version'
+
+
+def _to_model(model, fields, values):
+    """Instancia del modelo sin consultar la base de datos (como TenantContext.to_parking_lot)"""
+    instance = model.__new__(model)
+    instance.__dict__.update(zip(fields, values))
+    instance._state = ModelState()
+    instance._state.adding = False
+    instance._state.db = DEFAULT_DB_ALIAS
+    return instance
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_cash_name(nombre):
+    """Indica si el nombre corresponde al medio de pago en efectivo"""
+    return bool(nombre) and nombre.lower() == CASH_METHOD_NAME
+
+
+class CategoryRef(namedtuple('CategoryRef', CATEGORY_FIELDS)):
+    """Categoría de vehículo (tarifas)"""
+
+    __slots__ = ()
+
+    def to_model(self):
+        return _to_model(VehicleCategory, CATEGORY_FIELDS, self)
+
+
+class PaymentMethodRef(namedtuple('PaymentMethodRef', PAYMENT_METHOD_FIELDS + ('is_cash',))):
+    """Medio de pago, con la marca de efectivo ya calculada"""
+
+    __slots__ = ()
+
+    def to_model(self):
+        return _to_model(PaymentMethod, PAYMENT_METHOD_FIELDS, self)
+
+
+class PlanRef(namedtuple('PlanRef', PLAN_FIELDS + ('plan_type_display',))):
+    """Plan de suscripción activo"""
+
+    __slots__ = ()
+
+    def to_model(self):
+        return _to_model(SubscriptionPlan, PLAN_FIELDS, self)
+
+
+class ReferenceData(namedtuple('ReferenceData', ('categories', 'payment_methods'))):
+    """Categorías (por id) y medios de pago (por orden de visualización) de un parqueadero"""
+
+    __slots__ = ()
+
+    def category(self, category_id):
+        """Categoría del parqueadero o None (también si el id no es válido)"""
+        category_id = _as_id(category_id)
+        return next((category for category in self.categories if category.id == category_id), None)
+
+    def monthly_categories(self):
+        return tuple(category for category in self.categories if category.is_monthly)
+
+    def payment_method(self, payment_method_id):
+        """Medio de pago del parqueadero o None (también si el id no es válido)"""
+        payment_method_id = _as_id(payment_method_id)
+        return next((method for method in self.payment_methods if method.id == payment_method_id), None)
+
+    def active_payment_methods(self):
+        return tuple(method for method in self.payment_methods if method.is_active)
+
+    def cash_method_ids(self):
+        return tuple(method.id for method in self.payment_methods if method.is_cash)
+
+
+def _version_key(parking_lot_id):
+    return f'reference_version_{parking_lot_id}'
+
+
+def _data_key(parking_lot_id, version):
+    return f'reference_data_{parking_lot_id}_{version}'
+
+
+def _plans_key(version):
+    return f'reference_plans_{version}'
+
+
+def _get_version(key):
+    """Versión actual (timestamp en nanosegundos, como en tenant_cache)"""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), context_cache_timeout())
+        version = cache.get(key)
+    return version
+
+
+def _build_reference_data(parking_lot_id):
+    categories = VehicleCategory.objects.filter(parking_lot_id=parking_lot_id).order_by('id')
+    payment_methods = PaymentMethod.objects.filter(parking_lot_id=parking_lot_id).order_by('orden', 'nombre')
+    return ReferenceData(
+        categories=tuple(CategoryRef(*row) for row in categories.values_list(*CATEGORY_FIELDS)),
+        payment_methods=tuple(
+            PaymentMethodRef(*row, is_cash_name(row[PAYMENT_METHOD_FIELDS.index('nombre')]))
+            for row in payment_methods.values_list(*PAYMENT_METHOD_FIELDS)
+        ),
+    )
+
+
+@lru_cache(maxsize=REFERENCE_LRU_SIZE)
+def _load_reference_data(parking_lot_id, version):
+    key = _data_key(parking_lot_id, version)
+    data = cache.get(key)
+    if data is None:
+        data = _build_reference_data(parking_lot_id)
+        cache.set(key, data, context_cache_timeout())
+    return data
+
+
+def get_reference_data(parking_lot_id):
+    """
+    Instantánea de las categorías y medios de pago de un parqueadero
+    Retorna: ReferenceData
+    """
+    return _load_reference_data(parking_lot_id, _get_version(_version_key(parking_lot_id)))
+
+
+@lru_cache(maxsize=8)
+def _load_active_plans(version):
+    key = _plans_key(version)
+    plans = cache.get(key)
+    if plans is None:
+        plans = tuple(
+            PlanRef(*(getattr(plan, field) for field in PLAN_FIELDS), plan.get_plan_type_display())
+            for plan in SubscriptionPlan.objects.filter(is_active=True).order_by('duration_days')
+        )
+        cache.set(key, plans, context_cache_timeout())
+    return plans
+
+
+def get_active_plans():
+    """
+    Planes de suscripción activos, de menor a mayor duración
+    Retorna: tupla de PlanRef
+    """
+    return _load_active_plans(_get_version(PLANS_VERSION_KEY))
+
+
+def invalidate_parking_lot(parking_lot_id):
+    """Cambia la versión de los datos de referencia del parqueadero en todos los procesos"""
+    cache.set(_version_key(parking_lot_id), time.time_ns(), context_cache_timeout())
+
+
+def invalidate_plans():
+    """Cambia la versión de los planes activos en todos los procesos"""
+    cache.set(PLANS_VERSION_KEY, time.time_ns(), context_cache_timeout())
@@ -139,9 +139,10 @@ def export_to_excel(parking_lot, start_date, end_date, tickets, payment_summary,
     
     for ticket in tickets:
         worksheet2.write(row, 0, ticket.placa, cell_format)
-        worksheet2.write_datetime(row, 1, ticket.entry_time, date_format)
+        # Excel no admite zona horaria: se escribe la hora local
+        worksheet2.write_datetime(row, 1, timezone.make_naive(ticket.entry_time), date_format)
         if ticket.exit_time:
-            worksheet2.write_datetime(row, 2, ticket.exit_time, date_format)
+            worksheet2.write_datetime(row, 2, timezone.make_naive(ticket.exit_time), date_format)
         else:
             worksheet2.write(row, 2, 'En parqueadero', cell_format)
         worksheet2.write(row, 3, ticket.category.name, cell_format)
@@ -174,7 +175,7 @@ def export_to_excel(parking_lot, start_date, end_date, tickets, payment_summary,
             worksheet3.write(row, 1, mensualidad.cliente.placa, cell_format)
             worksheet3.write(row, 2, mensualidad.category.name, cell_format)
             if mensualidad.fecha_pago:
-                worksheet3.write_datetime(row, 3, mensualidad.fecha_pago, date_format)
+                worksheet3.write_datetime(row, 3, timezone.make_naive(mensualidad.fecha_pago), date_format)
             else:
                 worksheet3.write(row, 3, 'Sin pago', cell_format)
             worksheet3.write(row, 4, float(mensualidad.monto or 0), number_format)
@@ -187,10 +188,12 @@ def export_to_excel(parking_lot, start_date, end_date, tickets, payment_summary,
     return output
 
 
-def export_to_pdf(parking_lot, start_date, end_date, tickets, payment_summary, category_stats, mensualidades=None):
+def export_to_pdf(parking_lot, start_date, end_date, tickets, payment_summary, category_stats, mensualidades=None,
+                  ticket_count=None):
     """
     Exporta el reporte a PDF
-    Incluye tickets y mensualidades
+    Incluye tickets y mensualidades. Si los tickets vienen de un iterador
+    (tickets archivados y activos intercalados), se debe pasar ticket_count.
     """
     if mensualidades is None:
         mensualidades = []
@@ -221,7 +224,7 @@ def export_to_pdf(parking_lot, start_date, end_date, tickets, payment_summary, c
     info_data = [
         ['Período:', f'{start_date.strftime("%d/%m/%Y")} - {end_date.strftime("%d/%m/%Y")}'],
         ['Fecha de Generación:', datetime.now().strftime("%d/%m/%Y %H:%M")],
-        ['Total de Tickets:', str(len(tickets))],
+        ['Total de Tickets:', str(len(tickets) if ticket_count is None else ticket_count)],
         ['Total de Mensualidades:', str(len(mensualidades))]
     ]
     
@@ -317,7 +320,7 @@ def generate_chart_data(tickets, start_date, end_date):
     ocupacion_por_hora = defaultdict(int)
     for ticket in tickets:
         if ticket.entry_time:
-            hora = ticket.entry_time.hour
+            hora = timezone.localtime(ticket.entry_time).hour
             ocupacion_por_hora[hora] += 1
     
     ocupacion_labels = [f"{h:02d}:00" for h in range(24)]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Roles del usuario (grupos) resueltos una vez por request
+
+get_user_roles carga los nombres de los grupos del usuario una sola vez: se
+guardan en el caché compartido por usuario y en el propio objeto user, que
+Django crea en cada request. Los filtros de plantilla (templatetags/user_roles.py)
+y las verificaciones de las vistas leen de aquí, así que una página no
+consulta los grupos aunque base.html verifique varios roles.
+
+El caché se invalida con las señales de parking/signals.py cuando cambian
+los grupos de un usuario o se renombra o elimina un grupo, y vence como los
+demás cachés de contexto (ver tenant_cache.context_cache_timeout).
+"""
+
+from django.core.cache import cache
+
+from .tenant_cache import context_cache_timeout
+
+
+ADMIN_GROUPS = frozenset({'Admin', 'Administrador'})
+CAJERO_GROUP = 'Cajero'
+OPERADOR_GROUP = 'Operador'
+VENDEDOR_GROUP = 'Vendedor'
+
+_USER_ATTR = '_parking_roles'
+
+
+def _cache_key(user_id):
+    return f'user_roles_{user_id}'
+
+
+def get_user_roles(user):
+    """
+    Nombres de los grupos del usuario
+    Retorna: frozenset (vacío para usuarios anónimos)
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, _USER_ATTR, None)
+    if roles is None:
+        key = _cache_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, context_cache_timeout())
+        setattr(user, _USER_ATTR, roles)
+    return roles
+
+
+def invalidate_user_roles(*user_ids):
+    """Olvida los roles en caché de los usuarios"""
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def has_role(user, group_name):
+    return group_name in get_user_roles(user)
+
+
+def is_admin(user):
+    """Superusuario, staff o miembro de un grupo de administradores"""
+    if not user or not user.is_authenticated:
+        return False
+    return user.is_superuser or user.is_staff or not ADMIN_GROUPS.isdisjoint(get_user_roles(user))
+
+
+def is_cajero(user):
+    return has_role(user, CAJERO_GROUP)
+
+
+def is_operador(user):
+    return has_role(user, OPERADOR_GROUP)
+
+
+def is_vendedor(user):
+    return has_role(user, VENDEDOR_GROUP)
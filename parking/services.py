@@ -7,9 +7,13 @@ Separación de lógica de negocio de las vistas (bajo acoplamiento, alta cohesi
 from django.db.models import Sum, Count, Avg, F
 from django.utils import timezone
 from django.core.cache import cache
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, time
 from decimal import Decimal
-from .models import ParkingTicket, Mensualidad, Caja, PaymentMethod
+from . import business_metrics
+from .models import (
+    ArchivedTicket, ParkingTicket, Mensualidad, CashBalance, CashMovement, CashSession, ParkingLot, ParkingLotDeletion,
+)
+from .reference_cache import get_reference_data
 
 
 class ReportService:
@@ -19,40 +23,32 @@ class ReportService:
     def get_date_range(filter_type, start_date_str=None, end_date_str=None):
         """
         Calcula el rango de fechas según el tipo de filtro
-        Retorna: (start_date, end_date)
+        Los días son los de la zona horaria local (como el snapshot de
+        analytics), así que todas las consultas del reporte usan la misma ventana.
+        Retorna: (start_date, end_date) aware, del inicio del primer día al final del último
         """
-        today = timezone.now()
+        today = timezone.localdate()
+        start_day = end_day = today
         
-        if filter_type == 'today':
-            start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'yesterday':
-            yesterday = today - timedelta(days=1)
-            start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
+        if filter_type == 'yesterday':
+            start_day = end_day = today - timedelta(days=1)
         elif filter_type == 'week':
-            start_date = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
+            start_day = today - timedelta(days=today.weekday())
         elif filter_type == 'month':
-            start_date = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
+            start_day = today.replace(day=1)
         elif filter_type == 'year':
-            start_date = today.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
+            start_day = today.replace(month=1, day=1)
         elif filter_type == 'custom' and start_date_str and end_date_str:
             try:
-                start_date = datetime.strptime(f"{start_date_str} 00:00:00", '%Y-%m-%d %H:%M:%S')
-                start_date = timezone.make_aware(start_date)
-                end_date = datetime.strptime(f"{end_date_str} 23:59:59", '%Y-%m-%d %H:%M:%S')
-                end_date = timezone.make_aware(end_date)
+                start_day = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+                end_day = datetime.strptime(end_date_str, '%Y-%m-%d').date()
             except ValueError:
-                start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        else:
-            start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
+                start_day = end_day = today
         
-        return start_date, end_date
+        return (
+            timezone.make_aware(datetime.combine(start_day, time.min)),
+            timezone.make_aware(datetime.combine(end_day, time.max)),
+        )
     
     @staticmethod
     def get_revenue_summary(parking_lot, start_date, end_date):
@@ -191,25 +187,35 @@ class TicketService:
         return round(total, 2)
     
     @staticmethod
-    def register_exit(ticket, payment_method_id=None):
+    def register_exit(ticket, payment_method_id=None, user=None):
         """
         Registra la salida de un vehículo
+        user: cajero que cobra (el pago queda en su sesión de caja abierta)
         Retorna: ticket actualizado
         """
         ticket.exit_time = timezone.now()
         ticket.amount_paid = TicketService.calculate_fee(ticket)
         
         if payment_method_id:
-            try:
-                payment_method = PaymentMethod.objects.get(
-                    id=payment_method_id,
-                    parking_lot=ticket.parking_lot
-                )
-                ticket.payment_method = payment_method
-            except PaymentMethod.DoesNotExist:
-                pass
-        
-        ticket.save()
+            # Medio de pago del parqueadero, desde los datos de referencia en caché
+            payment_method = get_reference_data(ticket.parking_lot_id).payment_method(payment_method_id)
+            if payment_method is not None:
+                ticket.payment_method = payment_method.to_model()
+        
+        # UPDATE filtrado también por exit_time IS NULL: si la tabla de tickets está
+        # particionada (parking/partitioning.py) solo se busca en la partición de
+        # tickets abiertos en lugar de en todas las particiones mensuales
+        ticket.updated_at = ticket.exit_time
+        updated = ParkingTicket.objects.filter(pk=ticket.pk, exit_time__isnull=True).update(
+            exit_time=ticket.exit_time,
+            amount_paid=ticket.amount_paid,
+            payment_method_id=ticket.payment_method_id,
+            updated_at=ticket.updated_at,
+        )
+        if not updated:
+            raise ParkingTicket.DoesNotExist('El ticket ya tiene salida registrada')
+        CashRegisterService.record_ticket_payment(ticket, user)
+        business_metrics.record_exit(ticket.parking_lot_id, ticket.amount_paid)
         
         # Invalidar caché de reportes (solo las claves específicas)
         today = timezone.now().date()
@@ -224,81 +230,355 @@ class TicketService:
 
 
 class CashRegisterService:
-    """Servicio para operaciones de caja"""
+    """
+    Servicio para operaciones de caja
+    
+    Cada pago agrega un CashMovement y suma su monto al CashBalance del día,
+    medio de pago y sesión en la misma transacción, así el cuadre de caja lee
+    los totales ya calculados en lugar de recorrer tickets y mensualidades.
+    Cada cajero cobra dentro de su propia sesión (CashSession): sus pagos solo
+    actualizan los saldos de esa sesión y no compiten con los de otros cajeros.
+    """
+    
+    # Movimientos insertados por lote al reconstruir el libro
+    REBUILD_BATCH_SIZE = 5000
+    
+    @staticmethod
+    def record_ticket_payment(ticket, user=None):
+        """Agrega al libro de caja la salida de un ticket ya cobrado por user"""
+        return CashRegisterService.record_movement(CashMovement(
+            parking_lot_id=ticket.parking_lot_id,
+            occurred_at=ticket.exit_time,
+            source='ticket',
+            reference_id=ticket.pk,
+            payment_method_id=ticket.payment_method_id,
+            amount=ticket.amount_paid,
+            placa=ticket.placa,
+            categoria=ticket.category.name,
+            entry_time=ticket.entry_time,
+        ), user)
     
     @staticmethod
-    def get_or_create_caja(parking_lot, date):
+    def record_mensualidad_payment(mensualidad, user=None):
+        """Agrega al libro de caja el pago de una mensualidad cobrada por user"""
+        return CashRegisterService.record_movement(CashMovement(
+            parking_lot_id=mensualidad.parking_lot_id,
+            occurred_at=mensualidad.fecha_pago,
+            source='mensualidad',
+            reference_id=mensualidad.pk,
+            payment_method_id=mensualidad.payment_method_id,
+            amount=mensualidad.monto,
+            placa=mensualidad.cliente.placa,
+            categoria=mensualidad.category.name,
+            cliente=mensualidad.cliente.nombre,
+        ), user)
+    
+    @staticmethod
+    def record_movement(movement, user=None):
         """
-        Obtiene o crea el registro de caja para una fecha
-        Retorna: instancia de Caja
+        Guarda el movimiento y actualiza el saldo del día con una suma atómica
+        El movimiento queda en la sesión abierta de user, si tiene una.
+        Debe llamarse dentro de la transacción del pago.
+        Retorna: el CashMovement guardado
         """
-        caja, created = Caja.objects.get_or_create(
-            parking_lot=parking_lot,
-            fecha=date,
-            tipo='Ingreso',
-            defaults={
-                'monto': Decimal('0.00'),
-                'dinero_inicial': Decimal('0.00'),
-                'descripcion': f'Ingresos del {date}'
-            }
+        from django.db import IntegrityError, transaction
+        
+        if user is not None and movement.session_id is None:
+            # Bloquea solo la sesión de este cajero: el cuadre espera a los pagos en curso
+            movement.session_id = CashSession.objects.select_for_update().filter(
+                parking_lot_id=movement.parking_lot_id, user=user, closed_at__isnull=True
+            ).values_list('id', flat=True).first()
+        movement.fecha = timezone.localdate(movement.occurred_at)
+        movement.save()
+        
+        prefix = 'tickets' if movement.source == 'ticket' else 'mensualidades'
+        balance = CashBalance.objects.filter(
+            parking_lot_id=movement.parking_lot_id,
+            fecha=movement.fecha,
+            payment_method_id=movement.payment_method_id,
+            session_id=movement.session_id,
         )
-        return caja
+        changes = {
+            f'{prefix}_count': F(f'{prefix}_count') + 1,
+            f'{prefix}_total': F(f'{prefix}_total') + movement.amount,
+            'updated_at': timezone.now(),
+        }
+        if not balance.update(**changes):
+            try:
+                with transaction.atomic():
+                    CashBalance.objects.create(
+                        parking_lot_id=movement.parking_lot_id,
+                        fecha=movement.fecha,
+                        payment_method_id=movement.payment_method_id,
+                        session_id=movement.session_id,
+                        **{f'{prefix}_count': 1, f'{prefix}_total': movement.amount},
+                    )
+            except IntegrityError:
+                # Otro pago sin sesión creó el saldo del día al mismo tiempo
+                balance.update(**changes)
+        return movement
+    
+    @staticmethod
+    def reverse_movement(source, reference_id):
+        """
+        Quita del libro de caja el pago de un ticket o una mensualidad eliminados
+        Resta el movimiento de su saldo con una resta atómica; el saldo que queda
+        en cero se elimina, como si se reconstruyera (rebuild_ledger).
+        Debe llamarse dentro de la transacción de la eliminación.
+        Retorna: el CashMovement eliminado o None si no había pago
+        """
+        movement = CashMovement.objects.filter(source=source, reference_id=reference_id).first()
+        if movement is None:
+            return None
+        
+        prefix = 'tickets' if movement.source == 'ticket' else 'mensualidades'
+        balance = CashBalance.objects.filter(
+            parking_lot_id=movement.parking_lot_id,
+            fecha=movement.fecha,
+            payment_method_id=movement.payment_method_id,
+            session_id=movement.session_id,
+        )
+        balance.update(**{
+            f'{prefix}_count': F(f'{prefix}_count') - 1,
+            f'{prefix}_total': F(f'{prefix}_total') - movement.amount,
+            'updated_at': timezone.now(),
+        })
+        balance.filter(tickets_count=0, mensualidades_count=0).delete()
+        movement.delete()
+        return movement
+    
+    @staticmethod
+    def get_balances(parking_lot, start_day, end_day):
+        """
+        Saldos de todas las sesiones entre dos fechas (incluidas)
+        Los medios de pago se resuelven con get_reference_data (ver summarize_*).
+        Retorna: lista de CashBalance
+        """
+        return list(CashBalance.objects.filter(parking_lot=parking_lot, fecha__range=(start_day, end_day)))
+    
+    @staticmethod
+    def summarize_by_session(balances, references):
+        """
+        Totales de cada sesión a partir de sus saldos
+        references: datos de referencia del parqueadero (get_reference_data)
+        Retorna: dict {session_id: {'count', 'total', 'efectivo'}}; None agrupa los pagos sin sesión
+        """
+        cash_method_ids = set(references.cash_method_ids())
+        totals = {}
+        for balance in balances:
+            item = totals.setdefault(balance.session_id, {
+                'count': 0, 'total': Decimal('0.00'), 'efectivo': Decimal('0.00'),
+            })
+            amount = balance.tickets_total + balance.mensualidades_total
+            item['count'] += balance.tickets_count + balance.mensualidades_count
+            item['total'] += amount
+            if balance.payment_method_id in cash_method_ids:
+                item['efectivo'] += amount
+        return totals
+    
+    @staticmethod
+    def summarize_by_payment_method(balances, references):
+        """
+        Totales por medio de pago sumando los saldos de todas las sesiones
+        references: datos de referencia del parqueadero (get_reference_data)
+        Retorna: lista de diccionarios como get_payment_method_summary, de mayor a menor total
+        """
+        summary = {}
+        for balance in balances:
+            method = references.payment_method(balance.payment_method_id)
+            item = summary.get(balance.payment_method_id)
+            if item is None:
+                item = summary[balance.payment_method_id] = {
+                    'payment_method_id': balance.payment_method_id,
+                    'nombre': method.nombre if method else 'Sin especificar',
+                    'icono': method.icono if method else None,
+                    'is_efectivo': method.is_cash if method else False,
+                    'total': Decimal('0.00'),
+                    'count': 0,
+                    'tickets_total': Decimal('0.00'),
+                    'tickets_count': 0,
+                    'mensualidades_total': Decimal('0.00'),
+                    'mensualidades_count': 0,
+                }
+            item['tickets_total'] += balance.tickets_total
+            item['tickets_count'] += balance.tickets_count
+            item['mensualidades_total'] += balance.mensualidades_total
+            item['mensualidades_count'] += balance.mensualidades_count
+            item['total'] += balance.tickets_total + balance.mensualidades_total
+            item['count'] += balance.tickets_count + balance.mensualidades_count
+        return sorted(summary.values(), key=lambda x: x['total'], reverse=True)
+    
+    @staticmethod
+    def rebuild_ledger(parking_lot_id, since=None):
+        """
+        Reconstruye el libro de caja y los saldos desde los tickets y mensualidades pagados
+        Los movimientos cobrados dentro de una sesión se conservan: los pagos no
+        guardan el cajero, así que no se podría volver a asignar su sesión.
+        since: fecha local desde la que se reconstruye (None para toda la historia)
+        Retorna: número de pagos procesados
+        """
+        from django.db import transaction
+        from django.db.models.functions import Coalesce
+        
+        # Solo las columnas que van al libro, sin instanciar tickets ni mensualidades
+        ticket_fields = ('exit_time', 'id', 'payment_method_id', 'amount_paid', 'placa', 'category__name', 'entry_time')
+        tickets = ParkingTicket.objects.filter(
+            parking_lot_id=parking_lot_id, exit_time__isnull=False, amount_paid__isnull=False
+        ).values_list(*ticket_fields)
+        archived_tickets = ArchivedTicket.objects.filter(
+            parking_lot_id=parking_lot_id, amount_paid__isnull=False
+        ).values_list(*ticket_fields)
+        mensualidades = Mensualidad.objects.filter(
+            parking_lot_id=parking_lot_id, estado='PAGADO', fecha_pago__isnull=False
+        ).values_list('fecha_pago', 'id', 'payment_method_id', 'monto', 'cliente__placa', 'category__name',
+                      'cliente__nombre')
+        movements = CashMovement.objects.filter(parking_lot_id=parking_lot_id)
+        balances = CashBalance.objects.filter(parking_lot_id=parking_lot_id)
+        if since:
+            start = timezone.make_aware(datetime.combine(since, time.min))
+            tickets = tickets.filter(exit_time__gte=start)
+            archived_tickets = archived_tickets.filter(exit_time__gte=start)
+            mensualidades = mensualidades.filter(fecha_pago__gte=start)
+            movements = movements.filter(fecha__gte=since)
+            balances = balances.filter(fecha__gte=since)
+        
+        def ticket_movement(row):
+            exit_time, pk, payment_method_id, amount, placa, categoria, entry_time = row
+            return CashMovement(
+                parking_lot_id=parking_lot_id, fecha=timezone.localdate(exit_time),
+                occurred_at=exit_time, source='ticket', reference_id=pk,
+                payment_method_id=payment_method_id, amount=amount,
+                placa=placa, categoria=categoria, entry_time=entry_time,
+            )
+        
+        def mensualidad_movement(row):
+            fecha_pago, pk, payment_method_id, amount, placa, categoria, cliente = row
+            return CashMovement(
+                parking_lot_id=parking_lot_id, fecha=timezone.localdate(fecha_pago),
+                occurred_at=fecha_pago, source='mensualidad', reference_id=pk,
+                payment_method_id=payment_method_id, amount=amount,
+                placa=placa, categoria=categoria, cliente=cliente,
+            )
+        
+        created = 0
+        with transaction.atomic():
+            movements.filter(session__isnull=True).delete()
+            balances.delete()
+            sources = (
+                (tickets, ticket_movement),
+                (archived_tickets, ticket_movement),
+                (mensualidades, mensualidad_movement),
+            )
+            for queryset, build in sources:
+                batch = []
+                for row in queryset.iterator(chunk_size=CashRegisterService.REBUILD_BATCH_SIZE):
+                    batch.append(build(row))
+                    if len(batch) >= CashRegisterService.REBUILD_BATCH_SIZE:
+                        created += CashRegisterService._insert_movements(batch)
+                        batch = []
+                created += CashRegisterService._insert_movements(batch)
+            
+            # Saldos a partir de los movimientos recién creados
+            totals = {}
+            grouped = movements.values('fecha', 'payment_method_id', 'session_id', 'source').annotate(
+                count=Count('id'), total=Coalesce(Sum('amount'), Decimal('0.00'))
+            ).order_by()
+            for row in grouped:
+                key = (row['fecha'], row['payment_method_id'], row['session_id'])
+                balance = totals.setdefault(key, CashBalance(
+                    parking_lot_id=parking_lot_id, fecha=row['fecha'], payment_method_id=row['payment_method_id'],
+                    session_id=row['session_id'],
+                ))
+                prefix = 'tickets' if row['source'] == 'ticket' else 'mensualidades'
+                setattr(balance, f'{prefix}_count', row['count'])
+                setattr(balance, f'{prefix}_total', row['total'])
+            CashBalance.objects.bulk_create(totals.values(), batch_size=CashRegisterService.REBUILD_BATCH_SIZE)
+        return created
+    
+    @staticmethod
+    def _insert_movements(movements):
+        """
+        Inserta movimientos reconstruidos; ignora los pagos que ya están en el libro
+        (una mensualidad pagada de nuevo conserva su movimiento anterior a since)
+        Retorna: número de movimientos procesados
+        """
+        CashMovement.objects.bulk_create(movements, ignore_conflicts=True)
+        return len(movements)
+    
+    @staticmethod
+    def get_open_session(parking_lot, user):
+        """Sesión de caja abierta del cajero (None si no tiene)"""
+        return CashSession.objects.filter(parking_lot=parking_lot, user=user, closed_at__isnull=True).first()
+    
+    @staticmethod
+    def open_session(parking_lot, user, dinero_inicial, puesto=''):
+        """
+        Abre la sesión de caja del cajero con su base para vueltos
+        Retorna: (CashSession, created); si ya tenía una abierta la retorna sin crear otra
+        """
+        from django.db import IntegrityError, transaction
+        
+        session = CashRegisterService.get_open_session(parking_lot, user)
+        if session:
+            return session, False
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return CashSession.objects.create(
+                    parking_lot=parking_lot,
+                    user=user,
+                    puesto=puesto,
+                    fecha=timezone.localdate(now),
+                    opened_at=now,
+                    dinero_inicial=Decimal(str(dinero_inicial)),
+                ), True
+        except IntegrityError:
+            # La abrió otra petición del mismo cajero
+            return CashRegisterService.get_open_session(parking_lot, user), False
     
     @staticmethod
-    def calculate_cash_total(parking_lot, start_date, end_date):
+    def session_cash_total(session):
         """
-        Calcula el total en efectivo para un período
+        Total en efectivo cobrado en la sesión, desde sus saldos
         Retorna: Decimal con el total
         """
-        efectivo_method = PaymentMethod.objects.filter(
-            parking_lot=parking_lot,
-            nombre__iexact='efectivo'
-        ).first()
-        
-        if not efectivo_method:
+        cash_method_ids = get_reference_data(session.parking_lot_id).cash_method_ids()
+        if not cash_method_ids:
             return Decimal('0.00')
-        
-        # Tickets en efectivo
-        tickets_total = ParkingTicket.objects.filter(
-            parking_lot=parking_lot,
-            exit_time__gte=start_date,
-            exit_time__lt=end_date,
-            exit_time__isnull=False,
-            amount_paid__isnull=False,
-            payment_method=efectivo_method
-        ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0.00')
-        
-        # Mensualidades en efectivo
-        mensualidades_total = Mensualidad.objects.filter(
-            parking_lot=parking_lot,
-            fecha_pago__gte=start_date,
-            fecha_pago__lt=end_date,
-            estado='PAGADO',
-            payment_method=efectivo_method
-        ).aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
-        
-        return tickets_total + mensualidades_total
+        totals = CashBalance.objects.filter(session=session, payment_method_id__in=cash_method_ids).aggregate(
+            tickets=Sum('tickets_total'), mensualidades=Sum('mensualidades_total')
+        )
+        return (totals['tickets'] or Decimal('0.00')) + (totals['mensualidades'] or Decimal('0.00'))
     
     @staticmethod
-    def realizar_cuadre(caja, dinero_final):
+    def realizar_cuadre(session, dinero_final):
         """
-        Realiza el cuadre de caja
+        Realiza el cuadre de una sesión de caja y la cierra
+        El total en efectivo de la sesión queda guardado en session.monto.
         Retorna: dict con resultado del cuadre
         """
-        if caja.cuadre_realizado:
-            return {
-                'success': False,
-                'message': 'El cuadre ya fue realizado'
-            }
-        
-        caja.dinero_final = Decimal(str(dinero_final))
-        caja.cuadre_realizado = True
-        caja.save()
+        from django.db import transaction
+        
+        with transaction.atomic():
+            # Espera a los pagos en curso de la sesión (ver record_movement)
+            session = CashSession.objects.select_for_update().get(pk=session.pk)
+            if session.cuadre_realizado:
+                return {
+                    'success': False,
+                    'message': 'El cuadre ya fue realizado'
+                }
+            
+            session.monto = CashRegisterService.session_cash_total(session)
+            session.dinero_final = Decimal(str(dinero_final))
+            session.cuadre_realizado = True
+            session.closed_at = timezone.now()
+            session.save()
         
-        diferencia = (caja.dinero_final - caja.dinero_inicial) - caja.monto
+        diferencia = (session.dinero_final - session.dinero_inicial) - session.monto
         
         return {
             'success': True,
+            'session': session,
             'diferencia': diferencia,
             'diferencia_abs': abs(diferencia)
         }
@@ -316,6 +596,11 @@ class SecurityService:
         if user.is_superuser:
             return True
         
+        # Con el principal de la sesión no se consulta la base de datos
+        principal = getattr(user, 'principal', None)
+        if principal is not None:
+            return principal.owns(parking_lot.pk)
+        
         # Verificar si es el dueño
         if hasattr(user, 'parking_lot') and user.parking_lot == parking_lot:
             return True
@@ -358,3 +643,112 @@ class SecurityService:
             'valid': True,
             'warning': False
         }
+
+
+class TenantDeletionService:
+    """Servicio para eliminar parqueaderos en segundo plano"""
+
+    # Registros eliminados por transacción
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def request_deletion(parking_lot, requested_by=None):
+        """
+        Desactiva el parqueadero de inmediato y crea el trabajo de eliminación
+        El trabajo se inicia en un hilo cuando se confirma la transacción.
+        Retorna: instancia de ParkingLotDeletion
+        """
+        from django.db import transaction
+        from .backup_service import BackupService
+
+        existing = ParkingLotDeletion.objects.filter(
+            parking_lot_id=parking_lot.id, status__in=['PENDIENTE', 'EN_PROCESO']
+        ).first()
+        if existing:
+            return existing
+
+        with transaction.atomic():
+            parking_lot.is_active = False
+            parking_lot.save(update_fields=['is_active', 'updated_at'])
+            parking_lot.user.is_active = False
+            parking_lot.user.save(update_fields=['is_active'])
+
+            deletion = ParkingLotDeletion.objects.create(
+                parking_lot_id=parking_lot.id,
+                user_id=parking_lot.user_id,
+                empresa=parking_lot.empresa,
+                total_rows=sum(BackupService.count_parking_lot_data(parking_lot.id).values()),
+                requested_by=requested_by,
+            )
+            transaction.on_commit(lambda: TenantDeletionService.start(deletion.id))
+
+        return deletion
+
+    @staticmethod
+    def start(deletion_id):
+        """Ejecuta el trabajo en un hilo en segundo plano"""
+        import threading
+
+        thread = threading.Thread(
+            target=TenantDeletionService._run_in_thread, args=(deletion_id,),
+            name=f'parking-lot-deletion-{deletion_id}', daemon=True,
+        )
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _run_in_thread(deletion_id):
+        from django.db import connection
+
+        try:
+            TenantDeletionService.run(deletion_id)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def run(deletion_id):
+        """
+        Elimina los datos del parqueadero por lotes y luego el usuario dueño
+        Es idempotente: un trabajo interrumpido puede volver a ejecutarse.
+        """
+        import logging
+        from django.contrib.auth.models import User
+        from .analytics import drop_snapshot
+        from .backup_service import BackupService
+        from .signals import suppress_tombstones
+
+        logger = logging.getLogger(__name__)
+        deletion = ParkingLotDeletion.objects.get(id=deletion_id)
+        if deletion.status == 'COMPLETADO':
+            return deletion
+
+        deletion.status = 'EN_PROCESO'
+        deletion.started_at = deletion.started_at or timezone.now()
+        deletion.error = ''
+        deletion.save(update_fields=['status', 'started_at', 'error'])
+
+        def progress(section, count):
+            ParkingLotDeletion.objects.filter(id=deletion_id).update(
+                deleted_rows=F('deleted_rows') + count, current_section=section
+            )
+
+        try:
+            BackupService.delete_parking_lot_data(
+                deletion.parking_lot_id, batch_size=TenantDeletionService.BATCH_SIZE, progress=progress
+            )
+            # Por si quedaron registros relacionados fuera de las secciones del backup
+            with suppress_tombstones():
+                ParkingLot.objects.filter(id=deletion.parking_lot_id).delete()
+                if deletion.user_id:
+                    User.objects.filter(id=deletion.user_id).delete()
+            drop_snapshot(deletion.parking_lot_id)
+
+            ParkingLotDeletion.objects.filter(id=deletion_id).update(
+                status='COMPLETADO', current_section='', finished_at=timezone.now()
+            )
+        except Exception as e:
+            logger.exception('Error eliminando el parqueadero %s', deletion.parking_lot_id)
+            ParkingLotDeletion.objects.filter(id=deletion_id).update(status='ERROR', error=str(e))
+
+        deletion.refresh_from_db()
+        return deletion
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Backend de sesiones en caché con escritura limitada a la base de datos
+
+Con SESSION_SAVE_EVERY_REQUEST = True, Django guarda la sesión en cada
+request para renovar su vencimiento (2 semanas deslizantes). Con el backend
+de base de datos eso es un UPDATE por request, incluidas las validaciones de
+placa y los refrescos del dashboard.
+
+Este backend lee la sesión del caché (cached_db) y al guardar:
+- Si los datos cambiaron (login, mensajes, filtros), escribe en la base de
+  datos y en el caché como cached_db.
+- Si solo hay que renovar el vencimiento, escribe como máximo una vez cada
+  SESSION_TOUCH_INTERVAL segundos. La cookie se sigue renovando en cada
+  respuesta; el vencimiento guardado puede quedar atrasado como mucho ese
+  intervalo respecto al de la cookie.
+
+Uso: SESSION_ENGINE = 'parking.session_backend'
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+# Segundos mínimos entre dos renovaciones del vencimiento sin cambios en los datos
+DEFAULT_TOUCH_INTERVAL = 300
+
+# Momento (epoch) de la última escritura, guardado con los datos de la sesión
+TOUCHED_AT_KEY = '_session_touched_at'
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = 'parking.session_backend'
+
+    @property
+    def touch_interval(self):
+        return getattr(settings, 'SESSION_TOUCH_INTERVAL', DEFAULT_TOUCH_INTERVAL)
+
+    def _touch_due(self):
+        touched_at = self._get_session().get(TOUCHED_AT_KEY)
+        return touched_at is None or time.time() - touched_at >= self.touch_interval
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key and not self.modified and not self._touch_due():
+            return
+        self._get_session(no_load=must_create)[TOUCHED_AT_KEY] = int(time.time())
+        super().save(must_create)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Señales de la aplicación parking
+
+Registra una marca (DeletedRecord) por cada registro eliminado de un
+parqueadero, para que los backups incrementales repliquen las eliminaciones,
+y quita del libro de caja los pagos de tickets y mensualidades eliminados.
+
+Invalida el contexto de parqueadero que usa TenantMiddleware (ver
+parking/tenant_cache.py) cuando cambian el parqueadero, su plan o las
+asignaciones de usuarios, los roles en caché (ver parking/roles.py) cuando
+cambian los grupos de un usuario, y el principal de la sesión (ver
+parking/principal.py) cuando cambian el usuario, sus grupos o su parqueadero,
+o se elimina el usuario.
+
+Invalida los datos de referencia (ver parking/reference_cache.py) cuando
+cambian las categorías, los medios de pago o los planes de suscripción.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.contrib.auth.models import Group, User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from . import principal, reference_cache, roles, tenant_cache
+from .services import CashRegisterService
+from .models import (
+    SubscriptionPlan, ParkingLot, VehicleCategory, PaymentMethod, Cliente, ParkingTicket, ArchivedTicket,
+    Mensualidad, Caja, CashSession, UserParkingLot, DeletedRecord
+)
+
+
+TRACKED_MODELS = (
+    VehicleCategory, PaymentMethod, Cliente, ParkingTicket, ArchivedTicket, Mensualidad, Caja, CashSession,
+    UserParkingLot,
+)
+
+_state = threading.local()
+
+
+@contextmanager
+def suppress_tombstones():
+    """
+    Desactiva el registro de eliminaciones en el hilo actual
+    Se usa al borrar un parqueadero completo, al aplicar una restauración y al
+    archivar tickets, donde las marcas no aportan nada. Tampoco se revierten
+    los pagos del libro de caja: el parqueadero completo borra su libro, la
+    restauración lo reconstruye y un ticket archivado conserva su pago.
+    """
+    previous = getattr(_state, 'suppressed', False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+def record_deletion(sender, instance, **kwargs):
+    """Guarda la marca de eliminación del registro"""
+    if getattr(_state, 'suppressed', False):
+        return
+    DeletedRecord.objects.create(
+        parking_lot_id=instance.parking_lot_id,
+        model=sender._meta.label_lower,
+        object_pk=instance.pk,
+    )
+
+
+for tracked_model in TRACKED_MODELS:
+    post_delete.connect(record_deletion, sender=tracked_model, dispatch_uid=f'tombstone_{tracked_model._meta.label_lower}')
+
+
+def reverse_cash_movement(sender, instance, **kwargs):
+    """Se eliminó un ticket cobrado o una mensualidad pagada: su pago sale del libro de caja"""
+    if getattr(_state, 'suppressed', False):
+        return
+    if sender is Mensualidad:
+        if instance.fecha_pago is not None:
+            CashRegisterService.reverse_movement('mensualidad', instance.pk)
+    elif instance.amount_paid is not None:
+        CashRegisterService.reverse_movement('ticket', instance.pk)
+
+
+for payment_model in (ParkingTicket, ArchivedTicket, Mensualidad):
+    post_delete.connect(
+        reverse_cash_movement, sender=payment_model, dispatch_uid=f'cash_ledger_{payment_model._meta.label_lower}'
+    )
+
+
+def invalidate_parking_lot_context(sender, instance, created=False, **kwargs):
+    """El parqueadero cambió: se invalida al confirmar la transacción"""
+    transaction.on_commit(lambda: tenant_cache.invalidate_parking_lot(instance.pk))
+    if created:
+        transaction.on_commit(lambda: principal.invalidate_principal(instance.user_id))
+
+
+def invalidate_deleted_parking_lot_context(sender, instance, **kwargs):
+    """Las asignaciones se eliminan en cascada y se invalidan con su propia señal"""
+    transaction.on_commit(lambda: tenant_cache.invalidate_parking_lot(instance.pk, user_ids=[instance.user_id]))
+    transaction.on_commit(lambda: principal.invalidate_principal(instance.user_id))
+
+
+def invalidate_plan_contexts(sender, instance, **kwargs):
+    """
+    El plan forma parte del contexto de sus parqueaderos
+    En pre_delete los parqueaderos se leen antes de que SET_NULL los desvincule.
+    """
+    parking_lot_ids = list(ParkingLot.objects.filter(subscription_plan=instance).values_list('id', flat=True))
+
+    def invalidate():
+        for parking_lot_id in parking_lot_ids:
+            tenant_cache.invalidate_parking_lot(parking_lot_id)
+    transaction.on_commit(invalidate)
+
+
+def invalidate_assignment_context(sender, instance, **kwargs):
+    """Cambió el parqueadero asignado al usuario"""
+    transaction.on_commit(lambda: tenant_cache.invalidate_user(instance.user_id))
+    transaction.on_commit(lambda: principal.invalidate_principal(instance.user_id))
+
+
+post_save.connect(invalidate_parking_lot_context, sender=ParkingLot, dispatch_uid='tenant_context_parkinglot')
+post_delete.connect(invalidate_deleted_parking_lot_context, sender=ParkingLot, dispatch_uid='tenant_context_parkinglot_delete')
+post_save.connect(invalidate_assignment_context, sender=UserParkingLot, dispatch_uid='tenant_context_userparkinglot')
+post_delete.connect(invalidate_assignment_context, sender=UserParkingLot, dispatch_uid='tenant_context_userparkinglot_delete')
+post_save.connect(invalidate_plan_contexts, sender=SubscriptionPlan, dispatch_uid='tenant_context_subscriptionplan')
+pre_delete.connect(invalidate_plan_contexts, sender=SubscriptionPlan, dispatch_uid='tenant_context_subscriptionplan_delete')
+
+
+def invalidate_reference_data(sender, instance, **kwargs):
+    """
+    Cambió una categoría o un medio de pago del parqueadero
+    Se invalida de inmediato (lecturas dentro de la misma transacción) y otra
+    vez al confirmar, para que ningún proceso conserve la versión anterior.
+    """
+    parking_lot_id = instance.parking_lot_id
+    reference_cache.invalidate_parking_lot(parking_lot_id)
+    transaction.on_commit(lambda: reference_cache.invalidate_parking_lot(parking_lot_id))
+
+
+def invalidate_parking_lot_reference_data(sender, instance, **kwargs):
+    """Parqueadero nuevo o eliminado: su id no debe servir datos anteriores"""
+    reference_cache.invalidate_parking_lot(instance.pk)
+
+
+def invalidate_active_plans(sender, instance, **kwargs):
+    reference_cache.invalidate_plans()
+    transaction.on_commit(reference_cache.invalidate_plans)
+
+
+for reference_model in (VehicleCategory, PaymentMethod):
+    label = reference_model._meta.label_lower
+    post_save.connect(invalidate_reference_data, sender=reference_model, dispatch_uid=f'reference_{label}')
+    post_delete.connect(invalidate_reference_data, sender=reference_model, dispatch_uid=f'reference_{label}_delete')
+post_save.connect(invalidate_parking_lot_reference_data, sender=ParkingLot, dispatch_uid='reference_parkinglot')
+post_delete.connect(invalidate_parking_lot_reference_data, sender=ParkingLot, dispatch_uid='reference_parkinglot_delete')
+post_save.connect(invalidate_active_plans, sender=SubscriptionPlan, dispatch_uid='reference_subscriptionplan')
+post_delete.connect(invalidate_active_plans, sender=SubscriptionPlan, dispatch_uid='reference_subscriptionplan_delete')
+
+
+def invalidate_roles(user_ids):
+    roles.invalidate_user_roles(*user_ids)
+    principal.invalidate_principal(*user_ids)
+
+
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Se agregaron o quitaron grupos (user.groups o group.user_set)"""
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        if action == 'pre_clear':
+            return
+        user_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # En post_clear ya no se sabe qué usuarios tenía el grupo
+        user_ids = list(instance.user_set.values_list('id', flat=True))
+    else:
+        user_ids = list(pk_set or ())
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_roles(user_ids))
+
+
+def invalidate_group_roles(sender, instance, **kwargs):
+    """Se renombró o se eliminará un grupo: cambian los roles de sus miembros"""
+    user_ids = list(instance.user_set.values_list('id', flat=True))
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_roles(user_ids))
+
+
+m2m_changed.connect(invalidate_roles_on_membership_change, sender=User.groups.through, dispatch_uid='roles_user_groups')
+post_save.connect(invalidate_group_roles, sender=Group, dispatch_uid='roles_group')
+pre_delete.connect(invalidate_group_roles, sender=Group, dispatch_uid='roles_group_delete')
+
+
+def invalidate_user_principal(sender, instance, update_fields=None, **kwargs):
+    """
+    Cambió el usuario (contraseña, estado, datos): su principal se reconstruye
+    No aplica a la actualización de last_login al iniciar sesión.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    transaction.on_commit(lambda: principal.invalidate_principal(instance.pk))
+
+
+def invalidate_deleted_user_principal(sender, instance, **kwargs):
+    """Se eliminó el usuario: sus sesiones dejan de usar el principal"""
+    # Django deja el pk en None después de eliminar
+    user_id = instance.pk
+    transaction.on_commit(lambda: principal.invalidate_principal(user_id))
+
+
+def store_principal_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        principal.store_principal(request, user)
+
+
+post_save.connect(invalidate_user_principal, sender=User, dispatch_uid='principal_user')
+post_delete.connect(invalidate_deleted_user_principal, sender=User, dispatch_uid='principal_user_delete')
+user_logged_in.connect(store_principal_on_login, dispatch_uid='principal_login')
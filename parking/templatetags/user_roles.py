@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 """
 Template tags para verificar roles y permisos de usuarios
+Los roles se cargan una vez por request (ver parking/roles.py).
 """
 
 from django import template
 
+from parking import roles
+
 register = template.Library()
 
 
@@ -14,9 +17,7 @@ def has_group(user, group_name):
     Verifica si el usuario pertenece a un grupo específico
     Uso: {% if user|has_group:"Admin" %}
     """
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name=group_name).exists()
+    return roles.has_role(user, group_name)
 
 
 @register.filter(name='is_admin')
@@ -25,13 +26,7 @@ def is_admin(user):
     Verifica si el usuario es administrador
     Uso: {% if user|is_admin %}
     """
-    if not user or not user.is_authenticated:
-        return False
-    return (
-        user.is_superuser or 
-        user.groups.filter(name__in=['Admin', 'Administrador']).exists() or 
-        user.is_staff
-    )
+    return roles.is_admin(user)
 
 
 @register.filter(name='is_cajero')
@@ -40,9 +35,7 @@ def is_cajero(user):
     Verifica si el usuario es cajero
     Uso: {% if user|is_cajero %}
     """
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name='Cajero').exists()
+    return roles.is_cajero(user)
 
 
 @register.filter(name='is_operador')
@@ -51,9 +44,7 @@ def is_operador(user):
     Verifica si el usuario es operador
     Uso: {% if user|is_operador %}
     """
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name='Operador').exists()
+    return roles.is_operador(user)
 
 
 @register.filter(name='can_access_admin')
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Contexto del parqueadero (tenant) de cada usuario
+
+TenantMiddleware resuelve en cada request el parqueadero del usuario. En
+lugar de guardar el modelo ParkingLot completo en el caché compartido, se
+guarda un TenantContext: una tupla inmutable con los datos que se usan en
+cada request (verificación de la suscripción y encabezado de los tickets).
+
+Niveles de caché:
+- Caché compartido, por usuario: (id del parqueadero, versión). Es la única
+  consulta al caché compartido por request y el valor es una tupla pequeña.
+- LRU en memoria del proceso, por (id del parqueadero, versión): el
+  TenantContext. Detrás está el caché compartido y por último la base de datos.
+
+Invalidación: al guardar o eliminar un ParkingLot, un SubscriptionPlan o una
+asignación UserParkingLot, las señales cambian la versión del parqueadero y
+borran las entradas de sus usuarios. Las entradas viejas del LRU de otros
+procesos quedan con una versión que ya no se consulta.
+
+Las versiones y las entradas vencen a los settings.CONTEXT_CACHE_TIMEOUT
+segundos (ver context_cache_timeout). Con un caché por proceso (LocMemCache)
+la invalidación solo llega al proceso que hizo el cambio; en los demás la
+versión vence, se crea una nueva y el LRU se vuelve a llenar desde la base de
+datos, así que los datos viejos duran como máximo ese tiempo.
+"""
+
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.base import ModelState
+from django.utils import timezone
+
+from .models import ParkingLot, UserParkingLot
+
+
+# Campos del parqueadero copiados al contexto
+TENANT_FIELDS = (
+    'id', 'user_id', 'empresa', 'nit', 'telefono', 'direccion',
+    'is_active', 'subscription_plan_id', 'subscription_end',
+)
+
+# Duración de las versiones y entradas si no se define settings.CONTEXT_CACHE_TIMEOUT
+DEFAULT_CONTEXT_CACHE_TIMEOUT = 60
+
+# Contextos guardados en memoria por proceso
+TENANT_LRU_SIZE = 1024
+
+# Marca para usuarios sin parqueadero (también se guardan en caché)
+NO_TENANT = (None, None)
+
+
+class TenantContext(namedtuple('TenantContext', TENANT_FIELDS + ('plan_name',))):
+    """Datos del parqueadero que se necesitan en cada request"""
+
+    __slots__ = ()
+
+    def is_expired(self):
+        """Misma regla que ParkingLot.is_expired"""
+        if not self.subscription_end:
+            return True
+        return timezone.now().date() > self.subscription_end
+
+    def to_parking_lot(self):
+        """
+        Instancia de ParkingLot con los campos del contexto, sin consultar la base de datos
+        Los demás campos quedan diferidos y se cargan si se acceden. Se arma
+        como al deserializar un modelo (sin __init__ ni señales de init), que
+        es varias veces más rápido que ParkingLot.from_db.
+        """
+        parking_lot = ParkingLot.__new__(ParkingLot)
+        parking_lot.__dict__.update(zip(TENANT_FIELDS, self))
+        parking_lot._state = ModelState()
+        parking_lot._state.adding = False
+        parking_lot._state.db = DEFAULT_DB_ALIAS
+        return parking_lot
+
+
+def context_cache_timeout():
+    """
+    Duración de las versiones y entradas de los cachés de contexto
+    La usan también reference_cache, principal y roles.
+    """
+    return getattr(settings, 'CONTEXT_CACHE_TIMEOUT', DEFAULT_CONTEXT_CACHE_TIMEOUT)
+
+
+def _user_key(user_id):
+    return f'tenant_user_{user_id}'
+
+
+def _version_key(parking_lot_id):
+    return f'tenant_version_{parking_lot_id}'
+
+
+def _context_key(parking_lot_id, version):
+    return f'tenant_context_{parking_lot_id}_{version}'
+
+
+def _get_version(parking_lot_id):
+    """
+    Versión actual del parqueadero
+    Se usa un timestamp en nanosegundos en lugar de un contador, así una
+    versión que salga del caché nunca se repite.
+    """
+    key = _version_key(parking_lot_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), context_cache_timeout())
+        version = cache.get(key)
+    return version
+
+
+def _resolve_parking_lot_id(user_id):
+    """Parqueadero del usuario: el que es dueño o el asignado (cajeros, operadores)"""
+    parking_lot_id = ParkingLot.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+    if parking_lot_id is None:
+        parking_lot_id = UserParkingLot.objects.filter(user_id=user_id).values_list(
+            'parking_lot_id', flat=True
+        ).first()
+    return parking_lot_id
+
+
+def _build_context(parking_lot_id):
+    row = ParkingLot.objects.filter(id=parking_lot_id).values_list(
+        *TENANT_FIELDS, 'subscription_plan__name'
+    ).first()
+    return TenantContext(*row) if row else None
+
+
+@lru_cache(maxsize=TENANT_LRU_SIZE)
+def _load_context(parking_lot_id, version):
+    key = _context_key(parking_lot_id, version)
+    context = cache.get(key)
+    if context is None:
+        context = _build_context(parking_lot_id)
+        if context is None:
+            return None
+        cache.set(key, context, context_cache_timeout())
+    return context
+
+
+def get_tenant_context(user_id):
+    """
+    Contexto del parqueadero de un usuario
+    Retorna: TenantContext o None si el usuario no tiene parqueadero
+    """
+    key = _user_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        parking_lot_id = _resolve_parking_lot_id(user_id)
+        entry = (parking_lot_id, _get_version(parking_lot_id)) if parking_lot_id else NO_TENANT
+        cache.set(key, entry, context_cache_timeout())
+
+    parking_lot_id, version = entry
+    if parking_lot_id is None:
+        return None
+    return _load_context(parking_lot_id, version)
+
+
+def get_parking_lot_context(parking_lot_id, version=None):
+    """
+    Contexto de un parqueadero ya conocido (por ejemplo, desde el principal de la sesión)
+    La versión puede venir leída de antemano junto con otras claves.
+    """
+    if version is None:
+        version = _get_version(parking_lot_id)
+    return _load_context(parking_lot_id, version)
+
+
+def invalidate_user(*user_ids):
+    """Olvida el parqueadero resuelto para los usuarios (cambió su asignación)"""
+    cache.delete_many([_user_key(user_id) for user_id in user_ids])
+
+
+def invalidate_parking_lot(parking_lot_id, user_ids=None):
+    """
+    Invalida el contexto de un parqueadero en todos los procesos
+    Cambia la versión y borra las entradas del dueño y de los usuarios asignados.
+    """
+    cache.set(_version_key(parking_lot_id), time.time_ns(), context_cache_timeout())
+    if user_ids is None:
+        user_ids = list(ParkingLot.objects.filter(id=parking_lot_id).values_list('user_id', flat=True))
+        user_ids += list(
+            UserParkingLot.objects.filter(parking_lot_id=parking_lot_id).values_list('user_id', flat=True)
+        )
+    if user_ids:
+        invalidate_user(*user_ids)
@@ -1,3 +1,874 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core import serializers
+from django.core.exceptions import PermissionDenied
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import backup_runner, business_metrics, loadgen, perf_budget
+from .analytics import TicketSnapshot, TicketSnapshotBuilder, drop_snapshot
+from .backup_service import BackupJSONEncoder, BackupReader, BackupService
+from .forms import ParkingTicketForm
+from .models import (
+    ArchivedTicket, Caja, CashBalance, CashMovement, CashSession, Cliente, DeletedRecord, Mensualidad, ParkingLot,
+    ParkingTicket, PaymentMethod, UserParkingLot, VehicleCategory,
+)
+from .profiling import make_token
+from .reference_cache import get_reference_data
+from .services import CashRegisterService, TicketService
+from .utils import validate_parking_lot_ownership
+
+
+class ParkingTestCase(TestCase):
+    """
+    Base de las pruebas: caché vacío, y archivos subidos (códigos de barras de
+    los tickets) y snapshots de reportes en un directorio temporal en lugar
+    de media/ y snapshots/ del repositorio
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.TemporaryDirectory()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root.name, ANALYTICS_SNAPSHOT_DIR=os.path.join(cls.media_root.name, 'snapshots'),
+        )
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        cls.media_root.cleanup()
+
+    def setUp(self):
+        cache.clear()
+
+
+class TenantTestCase(ParkingTestCase):
+    """Un parqueadero con su dueño y una categoría por horas"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user('dueno', 'dueno@example.com', 'clave-segura-123')
+        self.parking_lot = self.create_parking_lot(self.owner, 'Parqueadero Centro')
+        self.category = VehicleCategory.objects.create(
+            parking_lot=self.parking_lot, name='Carro', first_hour_rate=3000, additional_hour_rate=2000
+        )
+
+    @staticmethod
+    def create_parking_lot(user, empresa):
+        return ParkingLot.objects.create(
+            user=user,
+            empresa=empresa,
+            telefono='3000000000',
+            direccion='Calle 1',
+            subscription_end=timezone.now().date() + timedelta(days=30),
+        )
+
+    def pay_ticket(self, placa, payment_method=None, user=None):
+        """Crea un ticket y registra su salida (con los callbacks de on_commit)"""
+        ticket = ParkingTicket.objects.create(parking_lot=self.parking_lot, category=self.category, placa=placa)
+        with self.captureOnCommitCallbacks(execute=True):
+            return TicketService.register_exit(ticket, payment_method.id if payment_method else None, user)
+
+
+class AuthenticatedRequestQueryTests(TenantTestCase):
+    """
+    Número de consultas fijo por request autenticado: el usuario, el
+    parqueadero y los roles salen del principal de la sesión y del caché
+    (ver parking/principal.py y parking/tenant_cache.py)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cajero = User.objects.create_user('cajero', 'cajero@example.com', 'clave-segura-123')
+        self.cajero.groups.add(Group.objects.create(name='Cajero'))
+        UserParkingLot.objects.create(user=self.cajero, parking_lot=self.parking_lot)
+
+    def login(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(user)
+        # Primer request: llena los cachés del proceso
+        self.client.get(reverse('validate-plate', args=['AAA000']))
+
+    def test_validate_plate_runs_only_the_view_query(self):
+        self.login(self.owner)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('validate-plate', args=['ABC123']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'exists': False})
+
+    def test_assigned_cashier_gets_the_same_query_count(self):
+        self.login(self.cajero)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('validate-plate', args=['ABC123']))
+        self.assertEqual(response.wsgi_request.current_parking_lot.pk, self.parking_lot.pk)
+        self.assertEqual(response.wsgi_request.user._parking_roles, frozenset({'Cajero'}))
+
+    def test_dashboard_has_no_user_tenant_or_group_queries(self):
+        self.login(self.owner)
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_change_rebuilds_principal_once(self):
+        self.login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.first_name = 'Ana'
+            self.owner.save()
+        self.client.get(reverse('validate-plate', args=['ABC123']))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('validate-plate', args=['ABC123']))
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.wsgi_request.user.first_name, 'Ana')
+
+    def test_deactivated_user_is_logged_out(self):
+        self.login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.is_active = False
+            self.owner.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_deleted_user_is_logged_out(self):
+        user = User.objects.create_user('auditor', 'auditor@example.com', 'clave-segura-123')
+        self.login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_expired_version_key_rebuilds_principal(self):
+        self.login(self.owner)
+        cache.delete(f'principal_version_{self.owner.pk}')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        # El principal nuevo se valida con la versión recreada
+        with self.assertNumQueries(1):
+            self.client.get(reverse('validate-plate', args=['ABC123']))
+
+    def test_expired_subscription_applies_on_next_request(self):
+        self.login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.parking_lot.subscription_end = timezone.now().date() - timedelta(days=1)
+            self.parking_lot.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+    def test_group_change_updates_roles(self):
+        self.login(self.owner)
+        self.assertFalse(self.client.get(reverse('dashboard')).wsgi_request.user._parking_roles)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.groups.add(Group.objects.create(name='Admin'))
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.wsgi_request.user._parking_roles, frozenset({'Admin'}))
+
+    def test_ownership_check_is_an_id_comparison(self):
+        self.login(self.owner)
+        user = self.client.get(reverse('dashboard')).wsgi_request.user
+        ticket = ParkingTicket(parking_lot_id=self.parking_lot.id, category=self.category, placa='ABC123')
+        other_lot = ParkingTicket(parking_lot_id=self.parking_lot.id + 1000, category=self.category, placa='XYZ')
+        with self.assertNumQueries(0):
+            self.assertTrue(validate_parking_lot_ownership(user, ticket))
+            with self.assertRaises(PermissionDenied):
+                validate_parking_lot_ownership(user, other_lot)
+
+
+class LoginRateLimitTests(ParkingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('dueno', 'dueno@example.com', 'clave-segura-123')
+
+    def test_lockout_after_failed_attempts_blocks_valid_password(self):
+        for _ in range(5):
+            self.client.post(reverse('login'), {'username': 'dueno', 'password': 'incorrecta'})
+        response = self.client.post(reverse('login'), {'username': 'dueno', 'password': 'clave-segura-123'})
+        self.assertNotIn('_auth_user_id', self.client.session)
+        self.assertEqual(response.status_code, 200)
+
+    def test_email_login_succeeds(self):
+        response = self.client.post(reverse('login'), {'username': 'dueno@example.com', 'password': 'clave-segura-123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session['_auth_user_id'], str(self.user.pk))
+
+
+class BusinessMetricsTests(TenantTestCase):
+    def test_entries_and_exits_update_counters_without_scrape_queries(self):
+        ParkingTicket.objects.create(parking_lot=self.parking_lot, category=self.category, placa='OLD001')
+        tickets = []
+        for placa in ('ABC123', 'DEF456'):
+            with self.captureOnCommitCallbacks(execute=True):
+                tickets.append(ParkingTicket.objects.create(
+                    parking_lot=self.parking_lot, category=self.category, placa=placa
+                ))
+                business_metrics.record_entry(self.parking_lot.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            TicketService.register_exit(tickets[0])
+
+        with self.assertNumQueries(0):
+            metrics = business_metrics.collect()[self.parking_lot.id]
+        self.assertEqual(metrics['entries'], 2)
+        self.assertEqual(metrics['exits'], 1)
+        self.assertEqual(metrics['occupancy'], 2)
+        self.assertEqual(metrics['revenue_tickets'], float(tickets[0].amount_paid))
+
+    def test_evicted_occupancy_is_read_again(self):
+        for placa in ('ABC123', 'DEF456'):
+            with self.captureOnCommitCallbacks(execute=True):
+                ParkingTicket.objects.create(parking_lot=self.parking_lot, category=self.category, placa=placa)
+                business_metrics.record_entry(self.parking_lot.id)
+        cache.delete(f'bm:{self.parking_lot.id}:occupancy')
+        with self.captureOnCommitCallbacks(execute=True):
+            ParkingTicket.objects.create(parking_lot=self.parking_lot, category=self.category, placa='GHI789')
+            business_metrics.record_entry(self.parking_lot.id)
+        self.assertEqual(business_metrics.collect()[self.parking_lot.id]['occupancy'], 3)
+
+    def test_mensualidad_created_as_paid_counts_as_a_payment(self):
+        monthly = VehicleCategory.objects.create(parking_lot=self.parking_lot, name='Mensual', is_monthly=True,
+                                                 monthly_rate=80000)
+        cliente = Cliente.objects.create(parking_lot=self.parking_lot, nombre='Ana', placa='JKL012')
+        self.client.force_login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('mensualidad-create'), {
+                'cliente': cliente.id, 'category': monthly.id,
+                'fecha_inicio': timezone.localdate().isoformat(), 'estado': 'PAGADO',
+            })
+        metrics = business_metrics.collect()[self.parking_lot.id]
+        self.assertEqual(metrics['mensualidad_payments'], 1)
+        self.assertEqual(metrics['revenue_mensualidades'], 80000)
+
+
+class CashLedgerTests(TenantTestCase):
+    """Libro de caja: cada pago suma a su saldo diario y el cuadre de caja solo lee"""
+
+    def setUp(self):
+        super().setUp()
+        self.efectivo = PaymentMethod.objects.create(parking_lot=self.parking_lot, nombre='Efectivo')
+        self.nequi = PaymentMethod.objects.create(parking_lot=self.parking_lot, nombre='Nequi')
+
+    def test_payments_update_daily_balances(self):
+        for placa in ('ABC123', 'DEF456'):
+            self.pay_ticket(placa, self.efectivo)
+        self.pay_ticket('GHI789', self.nequi)
+        monthly = VehicleCategory.objects.create(parking_lot=self.parking_lot, name='Mensual', is_monthly=True,
+                                                 monthly_rate=80000)
+        cliente = Cliente.objects.create(parking_lot=self.parking_lot, nombre='Ana', placa='JKL012')
+        mensualidad = Mensualidad.objects.create(
+            parking_lot=self.parking_lot, cliente=cliente, category=monthly, fecha_inicio=timezone.localdate(),
+            fecha_vencimiento=timezone.localdate() + timedelta(days=30), monto=80000, estado='PAGADO',
+            fecha_pago=timezone.now(), payment_method=self.efectivo,
+        )
+        CashRegisterService.record_mensualidad_payment(mensualidad)
+
+        self.assertEqual(CashMovement.objects.filter(parking_lot=self.parking_lot).count(), 4)
+        balance = CashBalance.objects.get(parking_lot=self.parking_lot, payment_method=self.efectivo)
+        self.assertEqual((balance.tickets_count, balance.tickets_total), (2, 6000))
+        self.assertEqual((balance.mensualidades_count, balance.mensualidades_total), (1, 80000))
+
+        # Reconstruir desde los pagos da los mismos saldos
+        expected = list(CashBalance.objects.order_by('payment_method_id').values_list(
+            'payment_method_id', 'tickets_count', 'tickets_total', 'mensualidades_count', 'mensualidades_total'
+        ))
+        self.assertEqual(CashRegisterService.rebuild_ledger(self.parking_lot.id), 4)
+        self.assertEqual(list(CashBalance.objects.order_by('payment_method_id').values_list(
+            'payment_method_id', 'tickets_count', 'tickets_total', 'mensualidades_count', 'mensualidades_total'
+        )), expected)
+
+    def test_paying_a_paid_mensualidad_again_is_refused(self):
+        monthly = VehicleCategory.objects.create(parking_lot=self.parking_lot, name='Mensual', is_monthly=True,
+                                                 monthly_rate=80000)
+        cliente = Cliente.objects.create(parking_lot=self.parking_lot, nombre='Ana', placa='JKL012')
+        mensualidad = Mensualidad.objects.create(
+            parking_lot=self.parking_lot, cliente=cliente, category=monthly, fecha_inicio=timezone.localdate(),
+            fecha_vencimiento=timezone.localdate() + timedelta(days=30), monto=80000,
+        )
+        self.client.force_login(self.owner)
+        url = reverse('mensualidad-pagar', args=[mensualidad.pk])
+        self.client.post(url, {'payment_method': self.efectivo.id})
+        mensualidad.refresh_from_db()
+        paid_at = mensualidad.fecha_pago
+
+        self.client.post(url, {'payment_method': self.nequi.id})
+        mensualidad.refresh_from_db()
+        self.assertEqual((mensualidad.fecha_pago, mensualidad.payment_method_id), (paid_at, self.efectivo.id))
+        movement, = CashMovement.objects.filter(source='mensualidad', reference_id=mensualidad.pk)
+        self.assertEqual((movement.payment_method_id, movement.amount), (self.efectivo.id, 80000))
+
+    def test_deleting_paid_tickets_reverses_their_movements(self):
+        moto = VehicleCategory.objects.create(parking_lot=self.parking_lot, name='Moto', first_hour_rate=1000,
+                                              additional_hour_rate=500)
+        for placa in ('ABC123', 'DEF456'):
+            self.pay_ticket(placa, self.efectivo)
+        ticket = ParkingTicket.objects.create(parking_lot=self.parking_lot, category=moto, placa='GHI78A')
+        with self.captureOnCommitCallbacks(execute=True):
+            TicketService.register_exit(ticket, self.efectivo.id)
+        self.pay_ticket('JKL012', self.nequi)
+
+        # Eliminar una categoría elimina sus tickets en cascada
+        self.client.force_login(self.owner)
+        self.client.post(reverse('category-delete', args=[self.category.pk]))
+        self.assertFalse(VehicleCategory.objects.filter(pk=self.category.pk).exists())
+
+        movement, = CashMovement.objects.filter(parking_lot=self.parking_lot)
+        self.assertEqual(movement.reference_id, ticket.pk)
+        balance, = CashBalance.objects.filter(parking_lot=self.parking_lot)
+        self.assertEqual((balance.payment_method_id, balance.tickets_count, balance.tickets_total),
+                         (self.efectivo.id, 1, movement.amount))
+        self.assertEqual(CashRegisterService.rebuild_ledger(self.parking_lot.id), 1)
+        self.assertEqual(list(CashBalance.objects.values_list('payment_method_id', 'tickets_count', 'tickets_total')),
+                         [(self.efectivo.id, 1, movement.amount)])
+
+    def test_payment_method_of_archived_tickets_cannot_be_deleted(self):
+        from .archive_service import TicketArchiveService
+
+        self.pay_ticket('ABC123', self.nequi)
+        ParkingTicket.objects.update(exit_time=timezone.now() - timedelta(days=400))
+        TicketArchiveService.archive_parking_lot(self.parking_lot.id)
+        self.assertFalse(ParkingTicket.objects.exists())
+        # Archivar no toca el libro de caja
+        self.assertEqual(CashMovement.objects.filter(payment_method=self.nequi).count(), 1)
+
+        self.client.force_login(self.owner)
+        self.client.post(reverse('payment-method-delete', args=[self.nequi.pk]))
+        self.assertTrue(PaymentMethod.objects.filter(pk=self.nequi.pk).exists())
+
+    def test_cash_register_get_does_not_write(self):
+        self.pay_ticket('ABC123', self.efectivo)
+        self.pay_ticket('DEF456', self.nequi)
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cash_register'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+        self.assertFalse(Caja.objects.exists())
+        self.assertEqual(response.context['total_income'], 3000)
+        self.assertEqual(response.context['total_general'], 6000)
+        self.assertEqual([movement.placa for movement in response.context['tickets']], ['ABC123'])
+
+
+class CashSessionTests(TenantTestCase):
+    """Sesiones de caja: cada cajero cobra en su sesión y el día es la suma de las sesiones"""
+
+    def setUp(self):
+        super().setUp()
+        self.efectivo = PaymentMethod.objects.create(parking_lot=self.parking_lot, nombre='Efectivo')
+        self.cajeros = []
+        for username in ('cajero1', 'cajero2'):
+            cajero = User.objects.create_user(username, f'{username}@example.com', 'clave-segura-123')
+            UserParkingLot.objects.create(user=cajero, parking_lot=self.parking_lot)
+            self.cajeros.append(cajero)
+
+    def pay_ticket(self, placa, user):
+        return super().pay_ticket(placa, self.efectivo, user)
+
+    def test_payments_go_to_each_cashier_session(self):
+        sesiones = [
+            CashRegisterService.open_session(self.parking_lot, cajero, 50000, puesto=f'Caja {number}')[0]
+            for number, cajero in enumerate(self.cajeros, start=1)
+        ]
+        self.assertEqual(CashRegisterService.open_session(self.parking_lot, self.cajeros[0], 0), (sesiones[0], False))
+        self.pay_ticket('ABC123', self.cajeros[0])
+        self.pay_ticket('DEF456', self.cajeros[1])
+        self.pay_ticket('GHI789', self.cajeros[1])
+        self.pay_ticket('JKL012', self.owner)
+
+        balances = CashRegisterService.get_balances(self.parking_lot, timezone.localdate(), timezone.localdate())
+        self.assertEqual(len(balances), 3)
+        references = get_reference_data(self.parking_lot.id)
+        totals = CashRegisterService.summarize_by_session(balances, references)
+        self.assertEqual(totals[sesiones[0].id]['efectivo'], 3000)
+        self.assertEqual(totals[sesiones[1].id]['efectivo'], 6000)
+        self.assertEqual(totals[None]['count'], 1)
+        summary, = CashRegisterService.summarize_by_payment_method(balances, references)
+        self.assertEqual((summary['count'], summary['total']), (4, 12000))
+
+        result = CashRegisterService.realizar_cuadre(sesiones[1], 55000)
+        self.assertEqual(result['diferencia'], -1000)
+        self.assertEqual(result['session'].monto, 6000)
+        self.assertIsNotNone(result['session'].closed_at)
+        self.assertFalse(CashRegisterService.realizar_cuadre(sesiones[1], 55000)['success'])
+
+        # Después del cierre, los cobros del cajero quedan sin sesión
+        self.pay_ticket('MNO345', self.cajeros[1])
+        self.assertEqual(CashBalance.objects.get(session=None).tickets_count, 2)
+
+    def test_cash_register_opens_and_closes_the_cashier_session(self):
+        self.client.force_login(self.owner)
+        self.client.post(reverse('cash_register'), {'abrir_sesion': '', 'dinero_inicial': '20000', 'puesto': 'Norte'})
+        sesion = CashSession.objects.get(user=self.owner, closed_at__isnull=True)
+        self.assertEqual((sesion.puesto, sesion.dinero_inicial), ('Norte', 20000))
+        self.pay_ticket('ABC123', self.owner)
+
+        response = self.client.get(reverse('cash_register'))
+        self.assertEqual(response.context['sesion'], sesion)
+        self.assertEqual(response.context['sesion_esperado'], 23000)
+
+        self.client.post(reverse('cash_register'), {'realizar_cuadre': '', 'dinero_final': '23000'})
+        response = self.client.get(reverse('cash_register'))
+        self.assertTrue(response.context['sesion'].cuadre_realizado)
+        self.assertEqual(response.context['diferencia'], 0)
+
+
+class ReferenceCacheTests(TenantTestCase):
+    """Categorías y medios de pago desde instantáneas en caché (ver parking/reference_cache.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.efectivo = PaymentMethod.objects.create(parking_lot=self.parking_lot, nombre='Efectivo')
+        self.nequi = PaymentMethod.objects.create(parking_lot=self.parking_lot, nombre='Nequi', orden=1)
+
+    def test_warm_snapshot_runs_no_queries(self):
+        references = get_reference_data(self.parking_lot.id)
+        with self.assertNumQueries(0):
+            references = get_reference_data(self.parking_lot.id)
+            self.assertEqual(references.category(str(self.category.id)).name, 'Carro')
+            self.assertIsNone(references.category('x'))
+            self.assertEqual(references.cash_method_ids(), (self.efectivo.id,))
+            self.assertEqual(references.payment_method(self.nequi.id).to_model(), self.nequi)
+
+    def test_changes_invalidate_the_snapshot(self):
+        get_reference_data(self.parking_lot.id)
+        self.category.first_hour_rate = 3500
+        self.category.save()
+        self.nequi.is_active = False
+        self.nequi.save()
+        references = get_reference_data(self.parking_lot.id)
+        self.assertEqual(references.category(self.category.id).first_hour_rate, 3500)
+        self.assertEqual(references.active_payment_methods(), (references.payment_method(self.efectivo.id),))
+        self.efectivo.delete()
+        self.assertEqual(get_reference_data(self.parking_lot.id).cash_method_ids(), ())
+
+    @override_settings(CONTEXT_CACHE_TIMEOUT=60)
+    def test_versions_expire_when_another_process_changes_the_data(self):
+        get_reference_data(self.parking_lot.id)
+        # Sin caché compartido la invalidación de otro proceso no llega aquí
+        VehicleCategory.objects.filter(pk=self.category.pk).update(first_hour_rate=3500)
+        self.assertEqual(get_reference_data(self.parking_lot.id).category(self.category.id).first_hour_rate, 3000)
+
+        expired = timezone.now().timestamp() + 61
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=expired):
+            references = get_reference_data(self.parking_lot.id)
+        self.assertEqual(references.category(self.category.id).first_hour_rate, 3500)
+
+    def test_entry_and_exit_pages_read_no_reference_tables(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.owner)
+        self.client.get(reverse('vehicle-exit'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('vehicle-exit'))
+            self.client.post(reverse('vehicle-entry'), {'category': self.category.id, 'placa': 'ABC123'})
+        self.assertEqual([method.nombre for method in response.context['payment_methods']], ['Efectivo', 'Nequi'])
+        self.assertTrue(ParkingTicket.objects.filter(placa='ABC123', category=self.category).exists())
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('parking_vehiclecategory', tables)
+        self.assertNotIn('parking_paymentmethod', tables)
+
+    def test_category_of_another_parking_lot_is_rejected(self):
+        other = VehicleCategory.objects.create(parking_lot=self.create_parking_lot(
+            User.objects.create_user('otro', 'otro@example.com', 'clave-segura-123'), 'Otro'
+        ), name='Moto')
+        form = ParkingTicketForm(data={'category': other.id, 'placa': 'XYZ987'})
+        form.fields['category'].set_references(get_reference_data(self.parking_lot.id).categories)
+        self.assertFalse(form.is_valid())
+        self.assertIn('category', form.errors)
+
+
+class BackupRestoreTests(TenantTestCase):
+    """Backups NDJSON: completo más incrementales con eliminaciones, y archivos dañados o ajenos"""
+
+    def setUp(self):
+        super().setUp()
+        self.backup_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.backup_dir.cleanup)
+
+    def write_backup(self, name, since=None):
+        path = os.path.join(self.backup_dir.name, name)
+        result = BackupService.write_parking_lot_backup(self.parking_lot.id, path, since)
+        self.assertTrue(result['success'], result.get('error'))
+        return path
+
+    def watermark(self, path):
+        with open(path, 'rb') as backup_file:
+            return BackupReader(backup_file).get_datetime('watermark')
+
+    def restore(self, *paths):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('restore_parking_lot_backup', *paths, '--overwrite', stdout=io.StringIO())
+
+    def crafted_incremental(self, since, sections):
+        """Incremental con checksums válidos armado a mano: sections = [(nombre, modelo, registros)]"""
+        def encode(obj):
+            return (json.dumps(obj, cls=BackupJSONEncoder) + '\n').encode('utf-8')
+
+        lines = [encode({
+            'type': 'header', 'format': 'parking-backup', 'version': '2.0', 'kind': 'incremental',
+            'parking_lot_id': self.parking_lot.id, 'parking_lot_name': self.parking_lot.empresa,
+            'since': since.isoformat(), 'watermark': timezone.now().isoformat(),
+        })]
+        for name, model, records in sections:
+            lines.append(encode({'type': 'section', 'name': name, 'model': model._meta.label_lower}))
+            record_lines = [encode(record) for record in records]
+            lines.extend(record_lines)
+            lines.append(encode({
+                'type': 'section_end', 'name': name, 'count': len(record_lines),
+                'sha256': hashlib.sha256(b''.join(record_lines)).hexdigest(),
+            }))
+        lines.append(encode({'type': 'manifest', 'sections': {}, 'total_records': 0}))
+        path = os.path.join(self.backup_dir.name, 'crafted.ndjson')
+        with open(path, 'wb') as backup_file:
+            backup_file.writelines(lines)
+        return path
+
+    def test_full_and_incremental_chain_round_trip(self):
+        tickets = {
+            placa: ParkingTicket.objects.create(parking_lot=self.parking_lot, category=self.category, placa=placa)
+            for placa in ('SAL001', 'BOR002', 'EDI003')
+        }
+        full = self.write_backup('full.ndjson.gz')
+
+        self.pay_ticket('PAG004')
+        TicketService.register_exit(tickets['SAL001'])
+        tickets['BOR002'].delete()
+        tickets['EDI003'].color = 'Rojo'
+        tickets['EDI003'].save()
+        incremental = self.write_backup('incremental.ndjson.gz', since=self.watermark(full))
+        expected = list(ParkingTicket.objects.order_by('id').values_list('placa', 'color', 'exit_time', 'amount_paid'))
+
+        self.restore(full, incremental)
+        self.assertEqual(
+            list(ParkingTicket.objects.order_by('id').values_list('placa', 'color', 'exit_time', 'amount_paid')),
+            expected,
+        )
+        self.assertFalse(ParkingTicket.objects.filter(placa='BOR002').exists())
+        # El libro de caja se reconstruye desde los pagos restaurados
+        self.assertEqual(CashMovement.objects.filter(parking_lot=self.parking_lot).count(), 2)
+
+    def test_archiving_leaves_one_marker_that_the_incremental_replays(self):
+        from .archive_service import TicketArchiveService
+
+        for placa in ('ARC001', 'ARC002', 'ARC003', 'ACT004'):
+            self.pay_ticket(placa)
+        ParkingTicket.objects.exclude(placa='ACT004').update(exit_time=timezone.now() - timedelta(days=400))
+        full = self.write_backup('full.ndjson.gz')
+
+        result = TicketArchiveService.archive_parking_lot(self.parking_lot.id, batch_size=2)
+        self.assertEqual(result['archived'], 3)
+        marker, = DeletedRecord.objects.filter(parking_lot_id=self.parking_lot.id)
+        self.assertEqual((marker.object_pk, marker.archived_before), (None, result['cutoff']))
+        incremental = self.write_backup('incremental.ndjson.gz', since=self.watermark(full))
+
+        self.restore(full, incremental)
+        self.assertEqual(list(ParkingTicket.objects.values_list('placa', flat=True)), ['ACT004'])
+        self.assertEqual(set(ArchivedTicket.objects.values_list('placa', flat=True)), {'ARC001', 'ARC002', 'ARC003'})
+
+    def test_retention_prunes_tombstones_below_the_oldest_retained_watermark(self):
+        other_lot = self.create_parking_lot(User.objects.create_user('otro'), 'Parqueadero Norte')
+        today = timezone.localdate()
+        paths = {}
+        for days_ago in (2, 0):
+            run_dir = backup_runner.get_run_dir(self.backup_dir.name, today - timedelta(days=days_ago))
+            os.makedirs(run_dir)
+            paths[days_ago] = os.path.relpath(backup_runner.get_backup_path(run_dir, self.parking_lot.id),
+                                              self.backup_dir.name)
+            with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(days=days_ago)):
+                paths[days_ago] = self.write_backup(paths[days_ago])
+        kept_from = self.watermark(paths[0])
+
+        def tombstone(parking_lot, deleted_at):
+            return DeletedRecord.objects.create(parking_lot=parking_lot, model='parking.parkingticket', object_pk=1,
+                                                deleted_at=deleted_at)
+
+        stale = tombstone(self.parking_lot, kept_from - timedelta(days=1))
+        recent = tombstone(self.parking_lot, kept_from - timedelta(minutes=1))
+        unbacked = tombstone(other_lot, kept_from - timedelta(days=1))
+
+        # Con ambos backups conservados, el más antiguo todavía necesita las marcas
+        self.assertEqual(backup_runner.prune_tombstones(self.backup_dir.name), 0)
+        backup_runner.apply_retention(self.backup_dir.name, keep_daily=1, keep_weekly=0, today=today)
+        self.assertEqual(backup_runner.prune_tombstones(self.backup_dir.name), 1)
+        self.assertEqual(set(DeletedRecord.objects.values_list('pk', flat=True)), {recent.pk, unbacked.pk})
+        self.assertFalse(DeletedRecord.objects.filter(pk=stale.pk).exists())
+
+    def test_damaged_file_is_rejected(self):
+        ParkingTicket.objects.create(parking_lot=self.parking_lot, category=self.category, placa='ABC123')
+        full = self.write_backup('full.ndjson.gz')
+        with gzip.open(full, 'rb') as backup_file:
+            content = backup_file.read()
+        with open(full, 'wb') as backup_file:
+            backup_file.write(content.replace(b'ABC123', b'ABC124'))
+
+        with self.assertRaisesMessage(CommandError, 'checksum'):
+            self.restore(full)
+        self.assertTrue(ParkingTicket.objects.filter(placa='ABC123').exists())
+
+    def test_incremental_cannot_touch_other_models_or_parking_lots(self):
+        other_lot = self.create_parking_lot(User.objects.create_user('otro', 'otro@example.com', 'x'), 'Otro')
+        other_category = VehicleCategory.objects.create(parking_lot=other_lot, name='Moto')
+        other_ticket = ParkingTicket.objects.create(parking_lot=other_lot, category=other_category, placa='AJE001')
+        full = self.write_backup('full.ndjson.gz')
+        since = self.watermark(full)
+
+        def tombstone(model, object_pk, parking_lot_id=self.parking_lot.id):
+            return {'model': 'parking.deletedrecord', 'pk': 1, 'fields': {
+                'parking_lot': parking_lot_id, 'model': model, 'object_pk': object_pk,
+                'deleted_at': timezone.now().isoformat(),
+            }}
+        foreign_ticket, = serializers.serialize('python', [other_ticket])
+        hijacked_ticket = dict(foreign_ticket, fields=dict(foreign_ticket['fields'], parking_lot=self.parking_lot.id))
+        crafted = [
+            [('tombstones', DeletedRecord, [tombstone('auth.user', self.owner.id)])],
+            [('tombstones', DeletedRecord, [tombstone('parking.parkingticket', other_ticket.id, other_lot.id)])],
+            [('tickets', ParkingTicket, [foreign_ticket])],
+            [('tickets', ParkingTicket, [hijacked_ticket])],
+        ]
+        for sections in crafted:
+            with self.subTest(sections=sections[0][2][0]['fields'].get('model', 'ticket')):
+                with self.assertRaisesMessage(CommandError, 'El backup'):
+                    self.restore(full, self.crafted_incremental(since, sections))
+
+        # Una marca con el id de un registro ajeno no borra nada fuera del parqueadero
+        self.restore(full, self.crafted_incremental(since, [
+            ('tombstones', DeletedRecord, [tombstone('parking.parkingticket', other_ticket.id)]),
+        ]))
+        self.assertTrue(User.objects.filter(id=self.owner.id).exists())
+        other_ticket.refresh_from_db()
+        self.assertEqual((other_ticket.parking_lot_id, other_ticket.placa), (other_lot.id, 'AJE001'))
+
+
+class ReportTests(TenantTestCase):
+    """ReportView: snapshot columnar, consultas en vivo y tickets archivados sobre los mismos días locales"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.owner)
+        self.addCleanup(drop_snapshot, self.parking_lot.id)
+
+    def closed_ticket(self, placa, exit_time, model=ParkingTicket):
+        ticket = model.objects.create(
+            parking_lot=self.parking_lot, category=self.category, placa=placa,
+            entry_time=exit_time - timedelta(hours=1), exit_time=exit_time, amount_paid=3000,
+        )
+        # entry_time es auto_now_add en ParkingTicket: se fija de nuevo después de crear
+        model.objects.filter(pk=ticket.pk).update(entry_time=exit_time - timedelta(hours=1))
+        return ticket
+
+    def total_vehicles(self, **params):
+        return self.client.get(reverse('reports'), params).context['summary']['total_vehicles']
+
+    def test_snapshot_and_live_paths_use_the_same_local_days(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        for placa, hour in (('TEM001', time(0, 30)), ('TAR002', time(23, 30))):
+            self.closed_ticket(placa, timezone.make_aware(datetime.combine(yesterday, hour)))
+        self.closed_ticket('ANT003', timezone.make_aware(datetime.combine(yesterday, time(23, 59))) - timedelta(days=1))
+
+        self.assertEqual(self.total_vehicles(filter_type='yesterday'), 2)
+        TicketSnapshotBuilder(self.parking_lot.id).build()
+        self.assertIsNotNone(TicketSnapshot.open(self.parking_lot.id))
+        self.assertEqual(self.total_vehicles(filter_type='yesterday'), 2)
+        day = yesterday.isoformat()
+        self.assertEqual(self.total_vehicles(filter_type='custom', start_date=day, end_date=day), 2)
+
+    def test_archived_tickets_are_counted_and_exported_in_exit_order(self):
+        from . import reports
+        from .archive_service import TicketArchiveService
+
+        start = timezone.localdate() - timedelta(days=10)
+        noon = lambda days: timezone.make_aware(datetime.combine(start + timedelta(days=days), time(12)))
+        for placa, days in (('ARC001', 1), ('ARC003', 3)):
+            self.closed_ticket(placa, noon(days))
+        TicketArchiveService.archive_parking_lot(self.parking_lot.id, older_than_days=0)
+        for placa, days in (('ACT002', 2), ('ACT004', 4)):
+            self.closed_ticket(placa, noon(days))
+
+        params = {'filter_type': 'custom', 'start_date': start.isoformat(),
+                  'end_date': (start + timedelta(days=5)).isoformat()}
+        self.assertEqual(self.total_vehicles(**params), 4)
+
+        exported = []
+        original_export = reports.export_to_excel
+
+        def export_to_excel(parking_lot, start_date, end_date, tickets, *args):
+            exported.extend(tickets)
+            return original_export(parking_lot, start_date, end_date, exported, *args)
+
+        with mock.patch.object(reports, 'export_to_excel', side_effect=export_to_excel):
+            response = self.client.get(reverse('reports'), {**params, 'export': 'excel'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([ticket.placa for ticket in exported], ['ARC001', 'ACT002', 'ARC003', 'ACT004'])
+        response = self.client.get(reverse('reports'), {**params, 'export': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_archived_stats_are_aggregated_in_sql_like_the_snapshot(self):
+        from .analytics import report_stats_from_database
+        from .archive_service import TicketArchiveService
+
+        start = timezone.localdate() - timedelta(days=10)
+        at = lambda days, hour: timezone.make_aware(datetime.combine(start + timedelta(days=days), time(hour)))
+        for placa, days, hour in (('ARC001', 1, 9), ('ARC001', 2, 23), ('ARC002', 2, 12)):
+            self.closed_ticket(placa, at(days, hour))
+        TicketArchiveService.archive_parking_lot(self.parking_lot.id, older_than_days=0)
+        for placa, days, hour in (('ARC001', 3, 0), ('ACT003', 3, 15)):
+            self.closed_ticket(placa, at(days, hour))
+        nequi = PaymentMethod.objects.create(parking_lot=self.parking_lot, nombre='Nequi')
+        ParkingTicket.objects.filter(placa='ACT003').update(amount_paid=4500, payment_method=nequi)
+
+        start_date = at(0, 0)
+        end_date = at(5, 0)
+        get_reference_data(self.parking_lot.id)
+        with CaptureQueriesContext(connection) as queries:
+            stats = report_stats_from_database(self.parking_lot, start_date, end_date)
+        # Solo consultas agregadas: ninguna lee los tickets fila por fila
+        for query in queries:
+            self.assertIn('COUNT(', query['sql'])
+
+        TicketSnapshotBuilder(self.parking_lot.id).build()
+        expected = TicketSnapshot.open(self.parking_lot.id).report_stats(self.parking_lot, start_date, end_date)
+        self.assertEqual(stats['summary'], expected['summary'])
+        for key in ('category_stats', 'daily_stats', 'payment_summary', 'chart_data'):
+            self.assertEqual(stats[key], expected[key], key)
+        self.assertEqual(stats['frequent_vehicles'][0],
+                         {'placa': 'ARC001', 'visits': 3, 'total_spent': Decimal('9000.00')})
+        self.assertEqual(len(stats['frequent_vehicles']), 3)
+
+    def test_simulator_bills_a_sub_second_extra_stay_like_calculate_fee(self):
+        from .analytics import TariffSimulator
+
+        # Entrada en segundo exacto y salida 1 h + 500 ms después
+        day = timezone.localdate() - timedelta(days=2)
+        exit_time = timezone.make_aware(datetime.combine(day, time(12, 0, 0, 500000)))
+        ticket = self.closed_ticket('SEG001', exit_time)
+        ParkingTicket.objects.filter(pk=ticket.pk).update(entry_time=exit_time - timedelta(hours=1, milliseconds=500))
+        ticket.refresh_from_db()
+        expected = Decimal(str(ticket.calculate_fee()))
+        self.assertEqual(expected, self.category.first_hour_rate + self.category.additional_hour_rate)
+
+        simulator = TariffSimulator(self.parking_lot, day, day)
+        self.assertEqual(simulator.source, 'database')
+        self.assertEqual(simulator.simulate({'actual': {}})['actual']['baseline'], expected)
+
+        TicketSnapshotBuilder(self.parking_lot.id).build()
+        simulator = TariffSimulator(self.parking_lot, day, day)
+        self.assertEqual(simulator.source, 'snapshot')
+        self.assertEqual(simulator.simulate({'actual': {}})['actual']['baseline'], expected)
+
+    def test_restore_drops_the_snapshot(self):
+        self.closed_ticket('ABC123', timezone.now() - timedelta(days=2))
+        TicketSnapshotBuilder(self.parking_lot.id).build()
+        backup = io.BytesIO(b''.join(BackupService.iter_backup_lines(self.parking_lot)))
+        with self.captureOnCommitCallbacks(execute=True):
+            result = BackupService.restore_parking_lot_data(backup, overwrite=True)
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertIsNone(TicketSnapshot.open(self.parking_lot.id))
+
+
+class ProfilingTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        self.settings_override = override_settings(PROFILE_DIR=self.profile_dir.name, PROFILE_RETENTION=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.superuser = User.objects.create_superuser('root', 'root@example.com', 'clave-segura-123')
+
+    def saved_profiles(self):
+        return sorted(os.listdir(self.profile_dir.name))
+
+    def test_flag_is_ignored_for_regular_users(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('dashboard'), {'_profile': '1'})
+        self.assertNotIn('X-Parking-Profile-Id', response)
+        self.assertEqual(self.saved_profiles(), [])
+
+    def test_superuser_profile_is_saved_and_listed(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('superadmin_dashboard'), HTTP_X_PARKING_PROFILE='1')
+        profile_id = response['X-Parking-Profile-Id']
+        self.assertEqual(self.saved_profiles(), [f'{profile_id}.json', f'{profile_id}.prof'])
+
+        response = self.client.get(reverse('profile_detail', args=[profile_id]))
+        self.assertEqual(response.context['profile']['view'], 'superadmin_dashboard')
+        self.assertTrue(response.context['profile']['sql'])
+        self.assertContains(response, 'function calls')
+
+    def test_token_enables_profiling_from_a_tenant_session(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('dashboard'), {'_profile': make_token(self.superuser, self.owner)})
+        self.assertIn('X-Parking-Profile-Id', response)
+
+    def test_token_is_ignored_outside_the_session_it_was_issued_for(self):
+        token = make_token(self.superuser, self.owner)
+        response = self.client.get(reverse('login'), {'_profile': token})
+        self.assertNotIn('X-Parking-Profile-Id', response)
+
+        self.client.force_login(User.objects.create_user('otro', 'otro@example.com', 'clave-segura-123'))
+        response = self.client.get(reverse('dashboard'), {'_profile': token})
+        self.assertNotIn('X-Parking-Profile-Id', response)
+        self.assertEqual(self.saved_profiles(), [])
+
+    def test_superuser_issues_a_token_for_a_given_user(self):
+        self.client.force_login(self.superuser)
+        response = self.client.post(reverse('profile_list'), {'username': self.owner.username})
+        token = response.context['token']
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('dashboard'), {'_profile': token})
+        self.assertIn('X-Parking-Profile-Id', response)
+
+        self.client.force_login(self.superuser)
+        response = self.client.post(reverse('profile_list'), {'username': 'no-existe'})
+        self.assertIsNone(response.context['token'])
+
+    def test_retention_keeps_the_latest_profiles(self):
+        self.client.force_login(self.superuser)
+        profile_ids = [
+            self.client.get(reverse('superadmin_dashboard'), {'_profile': '1'})['X-Parking-Profile-Id']
+            for _ in range(3)
+        ]
+        self.assertEqual(len(self.saved_profiles()), 4)
+        self.assertNotIn(f'{profile_ids[0]}.json', self.saved_profiles())
+
+
+class LoadDataGeneratorTests(ParkingTestCase):
+    def test_seeded_tenant_has_history_and_unique_open_plates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            parking_lot, = loadgen.seed_tenants(1, categories=5, clientes=10, tickets=300, years=1, open_tickets=15)
+        tickets = ParkingTicket.objects.filter(parking_lot=parking_lot)
+        self.assertEqual(tickets.count(), 315)
+        history = tickets.filter(exit_time__isnull=False, entry_time__lt=timezone.now() - timedelta(days=30))
+        self.assertGreater(history.count(), 200)
+        open_plates = list(tickets.filter(exit_time__isnull=True).values_list('placa', flat=True))
+        self.assertEqual(len(open_plates), len(set(open_plates)))
+        self.assertFalse(tickets.exclude(barcode='').exists())
+
+
+class QueryBudgetTests(ParkingTestCase):
+    """El presupuesto de consultas de parking/perf_baseline.json (sin tiempos)"""
+
+    def test_views_stay_within_query_budget(self):
+        vendor_baseline = perf_budget.load_baseline()['vendors'].get(connection.vendor)
+        if vendor_baseline is None:
+            self.skipTest(f'Sin línea base para {connection.vendor}')
+        results = perf_budget.run(include_functions=False)
+        rows = perf_budget.compare(results, vendor_baseline, check_time=False)
+        over_budget = [
+            f'{name}: {current["queries"]} > {base["queries"]}'
+            for _, name, current, base, status in rows if status == 'regresión'
+        ]
+        self.assertEqual(over_budget, [])
@@ -49,9 +49,16 @@ def validate_parking_lot_ownership(user, obj):
     if user.is_superuser:
         return True
     
-    if not hasattr(obj, 'parking_lot'):
+    if not hasattr(obj, 'parking_lot_id'):
         raise PermissionDenied("El objeto no tiene parqueadero asociado")
     
+    # Con el principal de la sesión la verificación es una comparación de ids
+    principal = getattr(user, 'principal', None)
+    if principal is not None:
+        if not principal.owns(obj.parking_lot_id):
+            raise PermissionDenied("No tienes permiso para acceder a este recurso")
+        return True
+    
     # Obtener el parqueadero del usuario
     user_parking_lot = None
     if hasattr(user, 'parking_lot'):
@@ -62,7 +69,7 @@ def validate_parking_lot_ownership(user, obj):
         if assignment:
             user_parking_lot = assignment.parking_lot
     
-    if not user_parking_lot or obj.parking_lot != user_parking_lot:
+    if not user_parking_lot or obj.parking_lot_id != user_parking_lot.pk:
         raise PermissionDenied("No tienes permiso para acceder a este recurso")
     
     return True
@@ -1,17 +1,20 @@
 # Python standard library
+import heapq
 from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import chain
+from operator import attrgetter
 
 # Django core
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
-from django.db import IntegrityError, models, transaction
-from django.http import JsonResponse, HttpResponse
+from django.db import IntegrityError, OperationalError, models, transaction
+from django.http import Http404, JsonResponse, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
-from django.utils.timezone import now
 
 # Django database
 from django.db.models import Avg, Count, F, Q, Sum
@@ -22,8 +25,13 @@ from django.views.generic import CreateView, ListView, TemplateView, UpdateView
 from django.views.generic.edit import DeleteView
 
 # Local imports
+from . import business_metrics, reference_cache, roles
 from .forms import CategoryForm, ParkingLotForm, ParkingTicketForm
-from .models import ParkingLot, ParkingTicket, VehicleCategory, Caja, Cliente, Mensualidad, PaymentMethod
+from .models import (
+    ArchivedTicket, ParkingLot, ParkingTicket, VehicleCategory, CashBalance, CashMovement, CashSession, Cliente,
+    Mensualidad,
+)
+from .ratelimit import rate_limit
 from .services import ReportService, TicketService, CashRegisterService, SecurityService
 from .utils import require_parking_lot, require_active_subscription, sanitize_plate
 
@@ -89,10 +97,12 @@ class VehicleEntryView(CreateView):
 
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
-        # Filtrar categorías por el parqueadero actual
-        if self.request.current_parking_lot:
-            form.fields['category'].queryset = VehicleCategory.objects.filter(
-                parking_lot=self.request.current_parking_lot
+        # Categorías del parqueadero actual, desde los datos de referencia en caché
+        parking_lot = self.request.current_parking_lot
+        if parking_lot:
+            form.fields['category'].set_references(
+                reference_cache.get_reference_data(parking_lot.id).categories,
+                lambda category: f'{parking_lot.empresa} - {category.name}',
             )
         return form
 
@@ -109,6 +119,7 @@ class VehicleEntryView(CreateView):
                 form.instance.cascos = int(cascos)
             response = super().form_valid(form)
             self.request.session['ticket_id'] = str(self.object.id)
+            business_metrics.record_entry(self.object.parking_lot_id)
             
             # Si es una petición AJAX, devolver JSON
             if self.request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -203,8 +214,8 @@ def vehicle_exit(request):
     # Para solicitudes GET
     placa = request.GET.get('placa', '').strip()
     
-    # OPTIMIZACIÓN: Obtener medios de pago activos
-    payment_methods = parking_lot.payment_methods.filter(is_active=True).order_by('orden', 'nombre')
+    # Medios de pago activos, desde los datos de referencia en caché
+    payment_methods = reference_cache.get_reference_data(parking_lot.id).active_payment_methods()
     
     return render(request, 'parking/vehicle_exit.html', {
         'placa': placa,
@@ -264,21 +275,31 @@ def print_exit_ticket(request):
             return redirect('vehicle-exit')
         
         # SEGURIDAD: Usar transaction.atomic para garantizar consistencia
-        with transaction.atomic():
-            # SEGURIDAD: Verificar que el ticket pertenece al parqueadero del usuario
-            # Usar select_for_update para evitar race conditions
-            ticket = ParkingTicket.objects.select_for_update().select_related('category', 'parking_lot').get(
-                id=ticket_id,
-                parking_lot=request.current_parking_lot,
-                exit_time__isnull=True  # Asegurar que no tenga salida registrada
-            )
-            
-            # Usar el servicio para registrar la salida
-            ticket = TicketService.register_exit(ticket, payment_method_id)
-            
-            # Calcular el cambio
-            amount_paid = float(ticket.amount_paid)
-            change = amount_received_decimal - amount_paid
+        try:
+            with transaction.atomic():
+                # SEGURIDAD: Verificar que el ticket pertenece al parqueadero del usuario
+                # Usar select_for_update para evitar race conditions
+                ticket = ParkingTicket.objects.select_for_update().select_related('category', 'parking_lot').get(
+                    id=ticket_id,
+                    parking_lot=request.current_parking_lot,
+                    exit_time__isnull=True  # Asegurar que no tenga salida registrada
+                )
+                
+                # Usar el servicio para registrar la salida
+                ticket = TicketService.register_exit(ticket, payment_method_id, request.user)
+                
+                # Calcular el cambio
+                amount_paid = float(ticket.amount_paid)
+                change = amount_received_decimal - amount_paid
+        except OperationalError:
+            # Otro cajero cobró el ticket mientras se esperaba el bloqueo: en PostgreSQL
+            # la fila ya pasó a otra partición (SerializationFailure) y en SQLite la
+            # escritura concurrente falla con "database is locked"
+            if not ParkingTicket.objects.filter(
+                id=ticket_id, parking_lot=request.current_parking_lot, exit_time__isnull=False
+            ).exists():
+                raise
+            raise ParkingTicket.DoesNotExist
 
         # Si es una petición AJAX, devolver JSON
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -508,37 +529,10 @@ class ReportView(TemplateView):
         
         parking_lot = request.current_parking_lot
         
-        # Obtener fechas del filtro
-        filter_type = request.GET.get('filter_type', 'custom')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        
-        today = now()
-        
-        # Aplicar filtros predefinidos
-        if filter_type == 'today':
-            start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'yesterday':
-            yesterday = today - timedelta(days=1)
-            start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'week':
-            start_date = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'month':
-            start_date = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'year':
-            start_date = today.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'custom':
-            if not start_date or not end_date:
-                start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-            else:
-                start_date = datetime.strptime(f"{start_date} 00:00:00", '%Y-%m-%d %H:%M:%S')
-                end_date = datetime.strptime(f"{end_date} 23:59:59", '%Y-%m-%d %H:%M:%S')
+        # Obtener fechas del filtro (días locales)
+        start_date, end_date = ReportService.get_date_range(
+            request.GET.get('filter_type', 'custom'), request.GET.get('start_date'), request.GET.get('end_date')
+        )
         
         # Obtener tickets
         tickets = ParkingTicket.objects.filter(
@@ -554,11 +548,37 @@ class ReportView(TemplateView):
             estado='PAGADO'
         ).select_related('cliente', 'category', 'payment_method')
         
-        # Resumen por medio de pago (tickets)
-        payment_summary_tickets = tickets.values('payment_method__nombre').annotate(
-            count=Count('id'),
-            total=Sum('amount_paid')
-        )
+        # Tickets archivados del período (almacenamiento frío)
+        archived_tickets = ArchivedTicket.objects.filter(
+            parking_lot=parking_lot,
+            exit_time__range=(start_date, end_date)
+        ).exclude(amount_paid__isnull=True).select_related('category', 'payment_method')
+        
+        if archived_tickets.exists():
+            from parking.analytics import report_stats_from_database
+            ticket_stats = report_stats_from_database(parking_lot, start_date, end_date)
+            payment_summary_tickets = ticket_stats['payment_summary']
+            category_stats = ticket_stats['category_stats']
+            ticket_count = ticket_stats['summary']['total_vehicles']
+            # Ambas tablas se leen por lotes, ordenadas por salida, y se intercalan sin cargarlas completas
+            tickets = heapq.merge(
+                archived_tickets.order_by('exit_time').iterator(),
+                tickets.order_by('exit_time').iterator(),
+                key=attrgetter('exit_time'),
+            )
+        else:
+            ticket_count = None
+            # Resumen por medio de pago (tickets)
+            payment_summary_tickets = tickets.values('payment_method__nombre').annotate(
+                count=Count('id'),
+                total=Sum('amount_paid')
+            )
+            
+            # Estadísticas por categoría
+            category_stats = tickets.values('category__name').annotate(
+                count=Count('id'),
+                revenue=Sum('amount_paid')
+            ).order_by('-count')
         
         # Resumen por medio de pago (mensualidades)
         payment_summary_mensualidades = mensualidades.values('payment_method__nombre').annotate(
@@ -590,12 +610,6 @@ class ReportView(TemplateView):
         
         payment_summary = sorted(payment_summary_dict.values(), key=lambda x: x['total'], reverse=True)
         
-        # Estadísticas por categoría
-        category_stats = tickets.values('category__name').annotate(
-            count=Count('id'),
-            revenue=Sum('amount_paid')
-        ).order_by('-count')
-        
         # Generar archivo
         if format_type == 'excel':
             output = export_to_excel(parking_lot, start_date, end_date, tickets, payment_summary, category_stats, mensualidades)
@@ -608,90 +622,22 @@ class ReportView(TemplateView):
             return response
         
         elif format_type == 'pdf':
-            output = export_to_pdf(parking_lot, start_date, end_date, tickets, payment_summary, category_stats, mensualidades)
+            output = export_to_pdf(parking_lot, start_date, end_date, tickets, payment_summary, category_stats, mensualidades,
+                                   ticket_count=ticket_count)
             response = HttpResponse(output.read(), content_type='application/pdf')
             filename = f'reporte_{parking_lot.empresa}_{start_date.strftime("%Y%m%d")}_{end_date.strftime("%Y%m%d")}.pdf'
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
             return response
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        
-        if not self.request.current_parking_lot:
-            return context
-
-        parking_lot = self.request.current_parking_lot
-
-        # Manejo de filtros
-        filter_type = self.request.GET.get('filter_type', 'custom')
-        start_date = self.request.GET.get('start_date')
-        end_date = self.request.GET.get('end_date')
-        
-        today = now()
-        
-        # Aplicar filtros predefinidos
-        if filter_type == 'today':
-            start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'yesterday':
-            yesterday = today - timedelta(days=1)
-            start_date = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = yesterday.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'week':
-            start_date = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'month':
-            start_date = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'year':
-            start_date = today.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        elif filter_type == 'custom':
-            if not start_date or not end_date:
-                start_date = today.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-            else:
-                start_date = datetime.strptime(f"{start_date} 00:00:00", '%Y-%m-%d %H:%M:%S')
-                end_date = datetime.strptime(f"{end_date} 23:59:59", '%Y-%m-%d %H:%M:%S')
-
-        # Obtener tickets completados (filtrado por parqueadero)
-        tickets = ParkingTicket.objects.filter(
-            parking_lot=parking_lot,
-            exit_time__isnull=False,
-            exit_time__range=(start_date, end_date)
-        ).exclude(amount_paid__isnull=True)
-        
-        # Obtener mensualidades pagadas en el período
-        mensualidades = Mensualidad.objects.filter(
-            parking_lot=parking_lot,
-            fecha_pago__range=(start_date, end_date),
-            estado='PAGADO'
-        )
-
+    def get_live_ticket_stats(self, tickets, start_date, end_date):
+        """Estadísticas de tickets calculadas en vivo sobre la base de datos"""
         # Resumen general (tickets)
-        summary_tickets = tickets.aggregate(
+        summary = tickets.aggregate(
             total_vehicles=Count('id'),
             total_revenue=Sum('amount_paid'),
             avg_duration=Avg(F('exit_time') - F('entry_time')),
             avg_revenue=Avg('amount_paid')
         )
-        
-        # Resumen general (mensualidades)
-        summary_mensualidades = mensualidades.aggregate(
-            total_mensualidades=Count('id'),
-            total_revenue_mensualidades=Sum('monto')
-        )
-        
-        # Combinar resúmenes
-        summary = {
-            'total_vehicles': summary_tickets['total_vehicles'] or 0,
-            'total_mensualidades': summary_mensualidades['total_mensualidades'] or 0,
-            'total_revenue': (summary_tickets['total_revenue'] or 0) + (summary_mensualidades['total_revenue_mensualidades'] or 0),
-            'total_revenue_tickets': summary_tickets['total_revenue'] or 0,
-            'total_revenue_mensualidades': summary_mensualidades['total_revenue_mensualidades'] or 0,
-            'avg_duration': summary_tickets['avg_duration'],
-            'avg_revenue': summary_tickets['avg_revenue']
-        }
 
         if summary['avg_duration'] is not None:
             summary['avg_duration'] = summary['avg_duration'].total_seconds() / 3600
@@ -727,10 +673,94 @@ class ReportView(TemplateView):
         ).order_by('-visits')[:10]
 
         # Resumen por medio de pago (tickets)
-        payment_summary_tickets = tickets.values('payment_method__nombre').annotate(
+        payment_summary = tickets.values('payment_method__nombre').annotate(
             count=Count('id'),
             total=Sum('amount_paid')
         )
+
+        # Datos para gráficos avanzados
+        from parking.reports import generate_chart_data
+        chart_data = generate_chart_data(tickets.select_related('category', 'payment_method'), start_date, end_date)
+
+        return {
+            'summary': summary,
+            'category_stats': category_stats,
+            'daily_stats': daily_stats,
+            'frequent_vehicles': frequent_vehicles,
+            'payment_summary': payment_summary,
+            'chart_data': chart_data,
+        }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        
+        if not self.request.current_parking_lot:
+            return context
+
+        parking_lot = self.request.current_parking_lot
+
+        # Manejo de filtros: días locales, los mismos que usa el snapshot
+        filter_type = self.request.GET.get('filter_type', 'custom')
+        start_date, end_date = ReportService.get_date_range(
+            filter_type, self.request.GET.get('start_date'), self.request.GET.get('end_date')
+        )
+
+        # Obtener tickets completados (filtrado por parqueadero)
+        tickets = ParkingTicket.objects.filter(
+            parking_lot=parking_lot,
+            exit_time__isnull=False,
+            exit_time__range=(start_date, end_date)
+        ).exclude(amount_paid__isnull=True)
+        
+        # Obtener mensualidades pagadas en el período
+        mensualidades = Mensualidad.objects.filter(
+            parking_lot=parking_lot,
+            fecha_pago__range=(start_date, end_date),
+            estado='PAGADO'
+        )
+
+        # Tickets archivados del período (almacenamiento frío)
+        archived_tickets = ArchivedTicket.objects.filter(
+            parking_lot=parking_lot,
+            exit_time__range=(start_date, end_date)
+        ).exclude(amount_paid__isnull=True)
+        has_archived = archived_tickets.exists()
+
+        # Estadísticas de tickets: los rangos ya cerrados se leen del snapshot columnar
+        # (si existe); si el rango incluye tickets archivados se leen ambas tablas y
+        # el resto se calcula en vivo sobre la base de datos
+        from parking.analytics import TicketSnapshot, report_stats_from_database
+        snapshot = TicketSnapshot.open(parking_lot.id)
+        if snapshot is not None and snapshot.covers(start_date, end_date):
+            ticket_stats = snapshot.report_stats(parking_lot, start_date, end_date)
+        elif has_archived:
+            ticket_stats = report_stats_from_database(parking_lot, start_date, end_date)
+        else:
+            ticket_stats = self.get_live_ticket_stats(tickets, start_date, end_date)
+
+        summary_tickets = ticket_stats['summary']
+        category_stats = ticket_stats['category_stats']
+        daily_stats = ticket_stats['daily_stats']
+        frequent_vehicles = ticket_stats['frequent_vehicles']
+        payment_summary_tickets = ticket_stats['payment_summary']
+        chart_data = ticket_stats['chart_data']
+        
+        # Resumen general (mensualidades)
+        summary_mensualidades = mensualidades.aggregate(
+            total_mensualidades=Count('id'),
+            total_revenue_mensualidades=Sum('monto')
+        )
+        
+        # Combinar resúmenes
+        summary = {
+            'total_vehicles': summary_tickets['total_vehicles'] or 0,
+            'total_mensualidades': summary_mensualidades['total_mensualidades'] or 0,
+            'total_revenue': (summary_tickets['total_revenue'] or 0) + (summary_mensualidades['total_revenue_mensualidades'] or 0),
+            'total_revenue_tickets': summary_tickets['total_revenue'] or 0,
+            'total_revenue_mensualidades': summary_mensualidades['total_revenue_mensualidades'] or 0,
+            'avg_duration': summary_tickets['avg_duration'],
+            'avg_revenue': summary_tickets['avg_revenue']
+        }
         
         # Resumen por medio de pago (mensualidades)
         payment_summary_mensualidades = mensualidades.values('payment_method__nombre').annotate(
@@ -762,12 +792,14 @@ class ReportView(TemplateView):
         
         payment_summary = sorted(payment_summary_dict.values(), key=lambda x: x['total'], reverse=True)
 
-        # Datos para gráficos avanzados
-        from parking.reports import generate_chart_data
-        chart_data = generate_chart_data(tickets, start_date, end_date)
-        
         # Registros recientes para la tabla
         recent_records = tickets.select_related('category', 'payment_method').order_by('-exit_time')[:50]
+        if has_archived:
+            recent_records = sorted(
+                chain(recent_records, archived_tickets.select_related('category', 'payment_method').order_by('-exit_time')[:50]),
+                key=lambda ticket: ticket.exit_time,
+                reverse=True
+            )[:50]
 
         context.update({
             'filter_type': filter_type,
@@ -841,6 +873,7 @@ def category_edit(request, pk):
     })
 
 
+@rate_limit('validate_plate')
 def validate_plate(request, plate):
     if not request.current_parking_lot:
         return JsonResponse({'exists': False})
@@ -875,106 +908,43 @@ def cash_register(request):
     parking_lot = request.current_parking_lot
     
     # Determinar si el usuario es vendedor
-    is_vendedor = request.user.groups.filter(name='Vendedor').exists()
+    is_vendedor = roles.is_vendedor(request.user)
 
-    # Manejo de fechas usando el servicio (en hora local)
-    today = timezone.localtime(timezone.now()).date()
+    # Manejo de fechas (en hora local); el rango incluye ambos días
+    today = timezone.localdate()
+    start_day = end_day = today
 
-    if is_vendedor:
-        # Vendedores solo ven el día actual
-        start_date = timezone.make_aware(datetime.combine(today, datetime.min.time()))
-        end_date = start_date + timedelta(days=1)
-    else:
-        # Administradores pueden filtrar por fechas
+    if not is_vendedor:
+        # Administradores pueden filtrar por fechas; los vendedores solo ven el día actual
         start_date_str = request.GET.get('start_date')
         end_date_str = request.GET.get('end_date')
 
         if start_date_str and end_date_str:
             try:
-                start_date = timezone.make_aware(datetime.strptime(f"{start_date_str} 00:00:00", '%Y-%m-%d %H:%M:%S'))
-                end_date = timezone.make_aware(datetime.strptime(f"{end_date_str} 23:59:59", '%Y-%m-%d %H:%M:%S'))
+                start_day = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+                end_day = datetime.strptime(end_date_str, '%Y-%m-%d').date()
             except ValueError:
                 # Si las fechas no son válidas, usar el día actual
-                start_date = timezone.make_aware(datetime.combine(today, datetime.min.time()))
-                end_date = start_date + timedelta(days=1)
-        else:
-            # Si no se proporcionan fechas, usar el día actual
-            start_date = timezone.make_aware(datetime.combine(today, datetime.min.time()))
-            end_date = start_date + timedelta(days=1)
-
-    # OPTIMIZACIÓN: Usar agregaciones de base de datos en lugar de Python
-    all_tickets = ParkingTicket.objects.filter(
-        parking_lot=parking_lot,
-        exit_time__gte=start_date,
-        exit_time__lt=end_date,
-        exit_time__isnull=False,
-        amount_paid__isnull=False
-    ).select_related('payment_method')
-    
-    mensualidades_pagadas = Mensualidad.objects.filter(
-        parking_lot=parking_lot,
-        fecha_pago__gte=start_date,
-        fecha_pago__lt=end_date,
-        estado='PAGADO'
-    ).select_related('payment_method')
-    
-    # Calcular totales usando agregaciones
-    tickets_aggregates = all_tickets.aggregate(total=Sum('amount_paid'))
-    mensualidades_aggregates = mensualidades_pagadas.aggregate(total=Sum('monto'))
-    
-    total_tickets = tickets_aggregates['total'] or 0
-    total_mensualidades = mensualidades_aggregates['total'] or 0
-    total_general = total_tickets + total_mensualidades
-    
-    # Usar el servicio para calcular el total en efectivo
-    total_efectivo = CashRegisterService.calculate_cash_total(parking_lot, start_date, end_date)
-    
-    # Obtener el medio de pago "Efectivo" para filtrar
-    efectivo_method = PaymentMethod.objects.filter(
-        parking_lot=parking_lot,
-        nombre__iexact='efectivo'
-    ).first()
-    
-    # Filtrar tickets y mensualidades de efectivo
-    tickets_efectivo = all_tickets.filter(payment_method=efectivo_method)
-    mensualidades_efectivo = mensualidades_pagadas.filter(payment_method=efectivo_method)
-    
-    # Usar el servicio para obtener el resumen por medio de pago
-    payment_summary_list = ReportService.get_payment_method_summary(parking_lot, start_date, end_date)
-    
-    # Agregar información de si es efectivo
-    for payment in payment_summary_list:
-        payment['is_efectivo'] = payment['nombre'] and payment['nombre'].lower() == 'efectivo'
-        payment['payment_method__nombre'] = payment['nombre']
-        payment['payment_method__icono'] = payment['icono']
-
-    # Usar el servicio para obtener o crear la caja
-    caja_date = start_date.date()
-    caja = CashRegisterService.get_or_create_caja(parking_lot, caja_date)
-    
-    # Actualizar el monto con el total de efectivo
-    caja.monto = total_efectivo
-    caja.descripcion = f'Ingresos en efectivo del período {start_date.date()} a {end_date.date()}'
-    caja.save()
-
-    # Calcular el dinero esperado (dinero_inicial + total_efectivo)
-    dinero_esperado = float(caja.dinero_inicial) + float(total_efectivo)
+                start_day = end_day = today
 
-    # Manejar el formulario para establecer el dinero inicial (base para vueltos)
-    if request.method == 'POST' and 'set_dinero_inicial' in request.POST:
+    # Abrir la sesión de caja del cajero con su base para vueltos
+    if request.method == 'POST' and 'abrir_sesion' in request.POST:
         try:
             dinero_inicial = float(request.POST.get('dinero_inicial', 0))
             if dinero_inicial < 0:
                 messages.error(request, 'El dinero inicial no puede ser negativo.')
             else:
-                caja.dinero_inicial = dinero_inicial
-                caja.save()
-                messages.success(request, 'Dinero inicial establecido correctamente.')
+                puesto = request.POST.get('puesto', '').strip()[:50]
+                sesion, created = CashRegisterService.open_session(parking_lot, request.user, dinero_inicial, puesto)
+                if created:
+                    messages.success(request, 'Sesión de caja abierta correctamente.')
+                else:
+                    messages.error(request, 'Ya tienes una sesión de caja abierta.')
             return redirect('cash_register')
         except ValueError:
             messages.error(request, 'Por favor, ingrese un valor numérico válido para el dinero inicial.')
 
-    # Manejar el formulario para el cuadre de caja
+    # Cuadre y cierre de la sesión abierta del cajero
     if request.method == 'POST' and 'realizar_cuadre' in request.POST:
         try:
             dinero_final = float(request.POST.get('dinero_final', 0))
@@ -982,8 +952,11 @@ def cash_register(request):
                 messages.error(request, 'El dinero final no puede ser negativo.')
                 return redirect('cash_register')
 
-            # Usar el servicio para realizar el cuadre
-            result = CashRegisterService.realizar_cuadre(caja, dinero_final)
+            sesion = CashRegisterService.get_open_session(parking_lot, request.user)
+            if sesion is None:
+                messages.error(request, 'No tienes una sesión de caja abierta.')
+                return redirect('cash_register')
+            result = CashRegisterService.realizar_cuadre(sesion, dinero_final)
             
             if result['success']:
                 messages.success(request, 'Cuadre de caja realizado con éxito.')
@@ -994,17 +967,79 @@ def cash_register(request):
         except ValueError:
             messages.error(request, 'Por favor, ingrese un valor numérico válido para el dinero final.')
 
-    # Calcular diferencia si el cuadre ya fue realizado
+    # Los totales salen de los saldos que mantiene cada pago (CashRegisterService.record_movement):
+    # los del período son la suma de los saldos de todas las sesiones, en una sola consulta indexada
+    references = reference_cache.get_reference_data(parking_lot.id)
+    balances = CashRegisterService.get_balances(parking_lot, start_day, end_day)
+    payment_summary_list = CashRegisterService.summarize_by_payment_method(balances, references)
+    session_totals = CashRegisterService.summarize_by_session(balances, references)
+    
+    total_tickets = sum(payment['tickets_total'] for payment in payment_summary_list)
+    total_mensualidades = sum(payment['mensualidades_total'] for payment in payment_summary_list)
+    total_general = total_tickets + total_mensualidades
+    
+    # El resumen ya indica si el medio de pago es efectivo
+    efectivo_ids = []
+    for payment in payment_summary_list:
+        payment['payment_method__nombre'] = payment['nombre']
+        payment['payment_method__icono'] = payment['icono']
+        if payment['is_efectivo']:
+            efectivo_ids.append(payment['payment_method_id'])
+    total_efectivo = sum(
+        (payment['total'] for payment in payment_summary_list if payment['is_efectivo']), Decimal('0.00')
+    )
+    
+    # Detalle de los pagos en efectivo (solo si hubo alguno en el período)
+    tickets_efectivo = []
+    mensualidades_efectivo = []
+    if efectivo_ids:
+        movements = CashMovement.objects.filter(
+            parking_lot=parking_lot, fecha__range=(start_day, end_day), payment_method_id__in=efectivo_ids
+        ).order_by('occurred_at')
+        for movement in movements:
+            if movement.source == 'ticket':
+                tickets_efectivo.append(movement)
+            else:
+                mensualidades_efectivo.append(movement)
+
+    # Sesiones del período y las que siguen abiertas; ningún GET escribe
+    sesiones = list(CashSession.objects.filter(
+        Q(fecha__range=(start_day, end_day)) | Q(closed_at__isnull=True), parking_lot=parking_lot
+    ).select_related('user').order_by('opened_at'))
+    empty_totals = {'count': 0, 'total': Decimal('0.00'), 'efectivo': Decimal('0.00')}
+    for sesion_item in sesiones:
+        totals = session_totals.get(sesion_item.id, empty_totals)
+        sesion_item.cobros = totals['count']
+        sesion_item.total_cobrado = totals['total']
+        sesion_item.efectivo = sesion_item.monto if sesion_item.cuadre_realizado else totals['efectivo']
+    
+    # La sesión del cajero: la abierta o, si ya la cerró, la última del período
+    mis_sesiones = [sesion_item for sesion_item in sesiones if sesion_item.user_id == request.user.id]
+    sesion = next((sesion_item for sesion_item in mis_sesiones if not sesion_item.cuadre_realizado), None)
+    if sesion is not None:
+        # Incluye lo cobrado fuera del período si la sesión viene de otro día
+        sesion.efectivo = CashRegisterService.session_cash_total(sesion)
+    elif mis_sesiones:
+        sesion = mis_sesiones[-1]
+
+    dinero_inicial_total = sum((sesion_item.dinero_inicial for sesion_item in sesiones), Decimal('0.00'))
+    # Calcular el dinero esperado (dinero_inicial + total_efectivo)
+    dinero_esperado = float(dinero_inicial_total) + float(total_efectivo)
+
+    # Calcular diferencia si el cuadre de la sesión ya fue realizado
+    sesion_esperado = None
     diferencia = None
     diferencia_abs = None
-    if caja.cuadre_realizado:
-        diferencia = (caja.dinero_final - caja.dinero_inicial) - total_efectivo
-        diferencia_abs = abs(diferencia)  # Calcular el valor absoluto
+    if sesion is not None:
+        sesion_esperado = sesion.dinero_inicial + sesion.efectivo
+        if sesion.cuadre_realizado:
+            diferencia = (sesion.dinero_final - sesion.dinero_inicial) - sesion.monto
+            diferencia_abs = abs(diferencia)  # Calcular el valor absoluto
 
     context = {
         'today': today,
-        'start_date': start_date.date(),
-        'end_date': (end_date - timedelta(days=1)).date(),
+        'start_date': start_day,
+        'end_date': end_day,
         'tickets': tickets_efectivo,
         'mensualidades': mensualidades_efectivo,
         'total_tickets': total_tickets,
@@ -1012,7 +1047,10 @@ def cash_register(request):
         'total_income': total_efectivo,
         'total_general': total_general,
         'payment_summary': payment_summary_list,
-        'caja': caja,
+        'sesiones': sesiones,
+        'sesion': sesion,
+        'sesion_esperado': sesion_esperado,
+        'dinero_inicial_total': dinero_inicial_total,
         'dinero_esperado': dinero_esperado,
         'diferencia': diferencia,
         'diferencia_abs': diferencia_abs,
@@ -1149,7 +1187,7 @@ def mensualidad_list(request):
         parking_lot=request.current_parking_lot,
         fecha_vencimiento__lt=today,
         estado='PENDIENTE'
-    ).update(estado='VENCIDO')
+    ).update(estado='VENCIDO', updated_at=timezone.now())
     
     # Refrescar el queryset después de la actualización
     mensualidades = mensualidades.all()
@@ -1164,7 +1202,8 @@ def mensualidad_create(request):
         return redirect('login')
     
     clientes = Cliente.objects.filter(parking_lot=request.current_parking_lot, is_active=True)
-    categories = VehicleCategory.objects.filter(parking_lot=request.current_parking_lot, is_monthly=True)
+    references = reference_cache.get_reference_data(request.current_parking_lot.id)
+    categories = references.monthly_categories()
     
     if request.method == 'POST':
         cliente_id = request.POST.get('cliente')
@@ -1173,26 +1212,32 @@ def mensualidad_create(request):
         estado = request.POST.get('estado', 'PENDIENTE')
         
         cliente = get_object_or_404(Cliente, pk=cliente_id, parking_lot=request.current_parking_lot)
-        category = get_object_or_404(VehicleCategory, pk=category_id, parking_lot=request.current_parking_lot)
+        category = references.category(category_id)
+        if category is None:
+            raise Http404('Categoría no encontrada')
+        category = category.to_model()
         
         # Calcular fecha de vencimiento (30 días después)
         fecha_inicio_dt = timezone.datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
         fecha_vencimiento = fecha_inicio_dt + timedelta(days=30)
         
-        mensualidad = Mensualidad.objects.create(
-            parking_lot=request.current_parking_lot,
-            cliente=cliente,
-            category=category,
-            fecha_inicio=fecha_inicio_dt,
-            fecha_vencimiento=fecha_vencimiento,
-            monto=category.monthly_rate,
-            estado=estado
-        )
-        
-        # Si se marca como pagado, registrar la fecha de pago
-        if estado == 'PAGADO':
-            mensualidad.fecha_pago = timezone.now()
-            mensualidad.save()
+        with transaction.atomic():
+            mensualidad = Mensualidad.objects.create(
+                parking_lot=request.current_parking_lot,
+                cliente=cliente,
+                category=category,
+                fecha_inicio=fecha_inicio_dt,
+                fecha_vencimiento=fecha_vencimiento,
+                monto=category.monthly_rate,
+                estado=estado
+            )
+            
+            # Si se marca como pagado, registrar la fecha de pago y el movimiento de caja
+            if estado == 'PAGADO':
+                mensualidad.fecha_pago = timezone.now()
+                mensualidad.save()
+                CashRegisterService.record_mensualidad_payment(mensualidad, request.user)
+                business_metrics.record_mensualidad_payment(mensualidad.parking_lot_id, mensualidad.monto)
         
         messages.success(request, 'Mensualidad creada exitosamente.')
         return redirect('mensualidad-list')
@@ -1211,31 +1256,37 @@ def mensualidad_pagar(request, pk):
     
     mensualidad = get_object_or_404(Mensualidad, pk=pk, parking_lot=request.current_parking_lot)
     
-    # Obtener medios de pago activos
-    payment_methods = PaymentMethod.objects.filter(
-        parking_lot=request.current_parking_lot,
-        is_active=True
-    ).order_by('orden', 'nombre')
+    # Medios de pago activos, desde los datos de referencia en caché
+    references = reference_cache.get_reference_data(request.current_parking_lot.id)
+    payment_methods = references.active_payment_methods()
     
     if request.method == 'POST':
         payment_method_id = request.POST.get('payment_method')
         
         # Obtener el medio de pago seleccionado
+        payment_method = None
         if payment_method_id:
-            try:
-                payment_method = PaymentMethod.objects.get(
-                    id=payment_method_id,
-                    parking_lot=request.current_parking_lot
-                )
-                mensualidad.payment_method = payment_method
-            except PaymentMethod.DoesNotExist:
+            payment_method = references.payment_method(payment_method_id)
+            if payment_method is None:
                 messages.error(request, 'Medio de pago no válido.')
                 return redirect('mensualidad-pagar', pk=pk)
         
-        # Marcar como pagado (esto establece estado='PAGADO' y fecha_pago=now())
-        mensualidad.estado = 'PAGADO'
-        mensualidad.fecha_pago = timezone.now()
-        mensualidad.save()
+        # La fila bloqueada serializa los cobros simultáneos: solo el primero la
+        # marca como pagada y registra el movimiento de caja
+        with transaction.atomic():
+            mensualidad = Mensualidad.objects.select_for_update().select_related('cliente', 'category').get(
+                pk=mensualidad.pk
+            )
+            if mensualidad.estado == 'PAGADO':
+                messages.warning(request, 'La mensualidad ya estaba pagada.')
+                return redirect('mensualidad-list')
+            if payment_method is not None:
+                mensualidad.payment_method = payment_method.to_model()
+            mensualidad.estado = 'PAGADO'
+            mensualidad.fecha_pago = timezone.now()
+            mensualidad.save()
+            CashRegisterService.record_mensualidad_payment(mensualidad, request.user)
+        business_metrics.record_mensualidad_payment(mensualidad.parking_lot_id, mensualidad.monto)
         
         messages.success(request, 'Mensualidad marcada como pagada.')
         return redirect('mensualidad-list')
@@ -1378,8 +1429,10 @@ def payment_method_delete(request, pk):
     from .models import PaymentMethod
     payment_method = get_object_or_404(PaymentMethod, pk=pk, parking_lot=request.current_parking_lot)
     
-    # Verificar si el medio de pago está siendo usado
-    if payment_method.parkingticket_set.exists() or payment_method.mensualidad_set.exists():
+    # Verificar si el medio de pago está siendo usado (también en tickets archivados y en el libro de caja)
+    if (payment_method.parkingticket_set.exists() or payment_method.mensualidad_set.exists()
+            or ArchivedTicket.objects.filter(payment_method=payment_method).exists()
+            or CashBalance.objects.filter(payment_method=payment_method).exists()):
         messages.error(request, 'No se puede eliminar este medio de pago porque está siendo utilizado en transacciones.')
         return redirect('payment-method-list')
     
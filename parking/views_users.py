@@ -10,11 +10,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.db.models import Q
 
 from .forms_users import UserCreateForm, UserEditForm
-
-
-def is_admin(user):
-    """Verifica si el usuario es administrador"""
-    return user.is_superuser or user.groups.filter(name__in=['Admin', 'Administrador']).exists() or user.is_staff
+from .roles import is_admin
 
 
 @login_required
@@ -73,12 +73,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'parking.metrics.QueryMetricsMiddleware',  # Consultas y tiempos por vista (/metrics)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'parking.middleware.PrincipalMiddleware',  # Usuario desde el principal firmado de la sesión
+    'parking.profiling.ProfilingMiddleware',  # Perfilado bajo demanda (superusuarios)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'parking.middleware.TenantMiddleware',  # Middleware para multitenant
@@ -120,6 +123,14 @@ if DATABASE_ENGINE == 'django.db.backends.sqlite3':
         'default': {
             'ENGINE': DATABASE_ENGINE,
             'NAME': BASE_DIR / os.environ.get('DATABASE_NAME', 'db.sqlite3'),
+            'OPTIONS': {
+                # WAL: los lectores (incluidos los snapshots de backup) no bloquean a los escritores
+                'init_command': 'PRAGMA journal_mode=WAL;',
+                # Las transacciones toman el bloqueo de escritura al empezar: SQLite
+                # ignora select_for_update y, sin esto, dos salidas concurrentes del
+                # mismo ticket fallan con "database is locked" (ver gate_stress)
+                'transaction_mode': 'IMMEDIATE',
+            },
         }
     }
 else:
@@ -193,6 +204,16 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Snapshots columnares de tickets para analítica (ver parking/analytics.py)
+ANALYTICS_SNAPSHOT_DIR = os.environ.get('ANALYTICS_SNAPSHOT_DIR', str(BASE_DIR / 'snapshots'))
+
+# Antigüedad (días desde la salida) a partir de la cual se archivan los tickets cerrados
+TICKET_ARCHIVE_AFTER_DAYS = int(os.environ.get('TICKET_ARCHIVE_AFTER_DAYS', '365'))
+
+# Meses futuros con partición creada de antemano si la tabla de tickets está
+# particionada (PostgreSQL, ver parking/partitioning.py)
+TICKET_PARTITION_MONTHS_AHEAD = int(os.environ.get('TICKET_PARTITION_MONTHS_AHEAD', '3'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -206,9 +227,34 @@ LOGOUT_REDIRECT_URL = 'login'
 SESSION_COOKIE_AGE = 1209600  # 2 semanas en segundos
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # No expirar la sesión al cerrar el navegador
 SESSION_SAVE_EVERY_REQUEST = True  # Guardar la sesión en cada solicitud para actualizar el tiempo de expiración
+# Sesiones leídas del caché; la renovación del vencimiento se escribe en la base de datos
+# como máximo cada SESSION_TOUCH_INTERVAL segundos (ver parking/session_backend.py).
+# Con varios procesos de gunicorn requiere un caché compartido (REDIS_URL).
+SESSION_ENGINE = 'parking.session_backend'
+SESSION_TOUCH_INTERVAL = int(os.environ.get('SESSION_TOUCH_INTERVAL', '300'))
 SESSION_COOKIE_HTTPONLY = True  # Prevenir acceso JavaScript a cookies de sesión
 SESSION_COOKIE_SAMESITE = 'Lax'  # Protección CSRF adicional
 
+# Métricas por vista y log de requests lentos (ver parking/metrics.py)
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', '1000'))
+SLOW_REQUEST_TOP_SQL = int(os.environ.get('SLOW_REQUEST_TOP_SQL', '5'))
+# Token opcional para que Prometheus lea /metrics sin sesión de superusuario
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Perfiles de requests bajo demanda (ver parking/profiling.py)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_RETENTION = int(os.environ.get('PROFILE_RETENTION', '50'))
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', '3600'))
+
+# Límites de peticiones {nombre: (límite, segundos)} (ver parking/ratelimit.py)
+RATE_LIMITS = {
+    'login': (5, 300),  # Intentos fallidos por usuario e IP
+    'login_ip': (50, 300),  # Intentos fallidos por IP (cualquier usuario)
+    # Validación de placa en la entrada (una petición por tecla)
+    'validate_plate_ip': (300, 60),
+    'validate_plate_tenant': (1200, 60),
+}
+
 # Configuración de seguridad adicional
 X_FRAME_OPTIONS = 'DENY'  # Prevenir clickjacking
 SECURE_REFERRER_POLICY = 'same-origin'  # Política de referrer
@@ -239,6 +285,13 @@ else:
         }
     }
 
+# Duración de las versiones y entradas de los cachés de contexto: parqueadero,
+# datos de referencia, principal de la sesión y roles (ver parking/tenant_cache.py).
+# Con Redis las invalidaciones llegan a todos los procesos; con LocMemCache cada
+# proceso de gunicorn tiene su propio caché y solo ve los cambios hechos en otro
+# proceso cuando sus entradas vencen.
+CONTEXT_CACHE_TIMEOUT = int(os.environ.get('CONTEXT_CACHE_TIMEOUT', 24 * 60 * 60 if REDIS_URL else 60))
+
 # Configuración de mensajes para usar clases de Tailwind
 MESSAGE_TAGS = {
     messages.DEBUG: 'bg-gray-500 text-white p-4 rounded-lg',
@@ -23,6 +23,7 @@ urlpatterns = [
     path('superadmin/parking-lots/<int:pk>/renew/', admin_views.renew_subscription, name='renew_subscription'),
     path('superadmin/parking-lots/<int:pk>/toggle/', admin_views.toggle_parking_lot_status, name='toggle_parking_lot_status'),
     path('superadmin/parking-lots/<int:pk>/delete/', admin_views.delete_parking_lot, name='delete_parking_lot'),
+    path('superadmin/parking-lots/deletions/<int:pk>/', admin_views.parking_lot_deletion_progress, name='parking_lot_deletion_progress'),
     
     # Rutas de Gestión de Pagos
     path('superadmin/payments/', admin_views.payment_management, name='payment_management'),
@@ -37,6 +38,14 @@ urlpatterns = [
     path('superadmin/backups/restore/', admin_views.restore_parking_lot, name='restore_parking_lot'),
     path('superadmin/backups/restore-full/', admin_views.restore_full_database, name='restore_full_database'),
     
+    # Perfiles de requests
+    path('superadmin/profiles/', admin_views.profile_list, name='profile_list'),
+    path('superadmin/profiles/<str:profile_id>/', admin_views.profile_detail, name='profile_detail'),
+    path('superadmin/profiles/<str:profile_id>/download/', admin_views.profile_download, name='profile_download'),
+    
+    # Métricas de rendimiento (Prometheus)
+    path('metrics', admin_views.metrics, name='metrics'),
+    
     # Rutas de usuarios normales (clientes)
     path('dashboard/', views.dashboard, name='dashboard'),
     path('entry/', VehicleEntryView.as_view(), name='vehicle-entry'),